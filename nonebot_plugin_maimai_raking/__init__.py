@@ -10,18 +10,30 @@ from nonebot.permission import SUPERUSER
 from nonebot.params import CommandArg
 from nonebot.adapters.onebot.v11.permission import GROUP_ADMIN, GROUP_OWNER
 from nonebot.message import event_preprocessor
+from nonebot.drivers import HTTPServerSetup, Request, Response, URL
 from nonebot.log import logger
 from nonebot.adapters.onebot.v11 import Message
 from nonebot.typing import T_State
+from nonebot.matcher import Matcher
 from datetime import datetime
+from typing import Awaitable, Dict, List, Optional, Tuple, Type, TypeVar
+import asyncio
+import time
 
 require("nonebot_plugin_apscheduler")
 from nonebot_plugin_apscheduler import scheduler
 
+from . import codec
 from .config import Config
 from .database import Database
 from .api import MaimaiAPI
-from .render import render_ranking_image
+from .cache import BoundedCache, get_all_stats as get_cache_stats
+from .scheduling import AdaptiveRefreshPolicy, ShardedRefresher, offset_time
+from .refresh_queue import RefreshQueue, PRIORITY_MANUAL, PRIORITY_GROUP, PRIORITY_NIGHTLY
+from .routing import GroupRouter
+from .leader import LeaderLock
+from .image_store import ImageStore
+from .group_index import GroupRankIndex, GroupScoreMatrix
 
 __plugin_meta__ = PluginMetadata(
     name="舞萌排行榜",
@@ -32,6 +44,8 @@ __plugin_meta__ = PluginMetadata(
     - 重置刷新次数 <QQ号/@用户>
     - 更新歌曲数据
     - 清理数据库
+    - 舞萌状态
+    - 全局排行榜 <歌曲名/别名/ID> [难度] / 全局排行榜 rating
     
     管理员命令：
     - 开启舞萌排行榜
@@ -49,6 +63,9 @@ __plugin_meta__ = PluginMetadata(
     - wmbm <歌曲名/别名/ID>
     - wmrt [分段] - 查看本群 Rating 排行榜
       例如：wmrt 查询全部，wmrt5 查询15000分段
+    - wmpm - 查看自己在本群所有已游玩谱面的名次
+    - wmtj [歌曲名/别名/ID] [难度] - 查看本群成绩统计
+    - wmds <定数下限> [定数上限] - 查看本群定数区间排行榜（按 SSS+ 数量）
     """,
     type="application",
     homepage="https://github.com/yourusername/nonebot-plugin-maimai-raking",
@@ -60,12 +77,186 @@ __plugin_meta__ = PluginMetadata(
 driver = get_driver()
 config = get_plugin_config(Config)
 
+# 选择 JSON 后端（成绩数据、别名缓存和 HTTP 响应都经过 codec 编解码）
+codec.set_backend(config.maimai_json_backend)
+
 # 初始化数据库和 API
-db = Database(config.maimai_data_path)
-api = MaimaiAPI(config.maimai_developer_token)
+db = Database(
+    config.maimai_data_path,
+    config.maimai_db_busy_timeout,
+    config.maimai_leaderboard_size,
+    config.maimai_records_compression,
+)
+api = MaimaiAPI(config.maimai_developer_token, config)
+
+# 渲染模块（PIL、字体和图标）在第一次渲染时才导入
+_render = None
+
+
+def get_renderer():
+    """导入渲染模块，并按配置调整渲染缓存的内存上限（只在第一次调用时执行）"""
+    global _render
+    if _render is None:
+        from . import render
+        render.configure_caches(
+            int(config.maimai_cache_cover_mb * 1024 * 1024),
+            int(config.maimai_cache_header_mb * 1024 * 1024),
+            int(config.maimai_cache_nickname_tile_mb * 1024 * 1024),
+        )
+        _render = render
+    return _render
+
+
+def invalidate_headers():
+    """清空页眉图层缓存（渲染模块尚未导入时没有缓存，无需处理）"""
+    if _render is not None:
+        _render.invalidate_headers()
+
+# 群昵称缓存（"群号_QQ" -> 昵称）
+group_nickname_cache = BoundedCache(
+    "group_nickname",
+    max_items=config.maimai_cache_group_nickname_size,
+    ttl=config.maimai_cache_group_nickname_ttl or None,
+)
+
+# 群内各谱面的有序成绩索引（群成员或成绩变化时自动重建）
+rank_index = GroupRankIndex(db)
+# 群成绩矩阵（成员 × 谱面），用于群内统计，只缓存最近活跃的群
+score_matrix = GroupScoreMatrix(db)
+
+# 多进程共享数据目录时，只有持有锁的主进程执行成绩刷新和别名更新
+leader = LeaderLock(config.maimai_data_path / "leader.lock")
+
+# 本进程已同步的缓存版本（用于感知其他进程的修改）
+_seen_cache_versions: dict = {}
+
+# 群 -> Bot 路由（多账号部署时每个群只由一个 Bot 处理）
+group_router = GroupRouter()
+
+# 每日成绩刷新（按 QQ 分片摊开到刷新窗口内）
+refresher = ShardedRefresher(config.maimai_refresh_window, config.maimai_refresh_slices)
+# 不活跃玩家的刷新退避策略
+refresh_policy = AdaptiveRefreshPolicy(config.maimai_adaptive_grace, config.maimai_adaptive_max_interval)
+
+
+async def process_refresh_job(qq: str, reason: str) -> Optional[bool]:
+    """处理一个成绩刷新任务，返回 True 成功、False 失败、None 跳过"""
+    if reason == "nightly":
+        # 如果当日已有手动刷新记录，则跳过自动更新
+        today = datetime.now().strftime("%Y-%m-%d")
+        if db.get_daily_refresh_count(qq, today) > 0:
+            logger.info(f"用户 {qq} 当日已有手动刷新记录，跳过自动更新")
+            return None
+        # 不活跃玩家按退避间隔刷新
+        if config.maimai_adaptive_refresh and not refresh_policy.is_due(db.get_refresh_state(qq)):
+            logger.debug(f"用户 {qq} 近期成绩无变化，本次跳过自动更新")
+            return None
+    
+    records = await api.get_player_records(qq)
+    if records:
+        db.update_user_records(qq, records)
+        return True
+    logger.warning(f"获取用户 {qq} 的成绩失败")
+    return False
+
+
+# 渲染图片的文件缓存（图片以文件路径或 URL 发送时使用）
+image_store = ImageStore(config.maimai_data_path / "images", config.maimai_image_base_url)
+
+
+async def _serve_cached_image(request: Request) -> Response:
+    """通过 NoneBot HTTP 服务提供缓存的图片"""
+    path = image_store.resolve(request.url.query.get("name", ""))
+    if path is None:
+        return Response(404, content="Not Found")
+    content_type = ImageStore.CONTENT_TYPES.get(path.suffix, "application/octet-stream")
+    return Response(
+        200,
+        headers={"Content-Type": content_type, "Cache-Control": "public, max-age=86400"},
+        content=path.read_bytes(),
+    )
 
-# 群昵称缓存
-group_nickname_cache: dict = {}
+
+if config.maimai_image_transport == "http":
+    if hasattr(driver, "setup_http_server") and config.maimai_image_base_url:
+        driver.setup_http_server(
+            HTTPServerSetup(
+                URL(ImageStore.ROUTE_PREFIX),
+                "GET",
+                "maimai_raking_images",
+                _serve_cached_image,
+            )
+        )
+    else:
+        logger.warning("当前驱动器不支持 HTTP 服务或未配置 maimai_image_base_url，图片将以 base64 发送")
+
+
+def build_image_segment(image_bytes: bytes) -> MessageSegment:
+    """根据配置的发送方式构造图片消息段"""
+    transport = config.maimai_image_transport
+    if transport == "http" and not config.maimai_image_base_url:
+        transport = "bytes"
+    if transport in ("file", "http"):
+        try:
+            path = image_store.put(image_bytes)
+        except OSError as e:
+            logger.warning(f"写入图片缓存失败，改为直接发送: {e}")
+            return MessageSegment.image(image_bytes)
+        if transport == "file":
+            return MessageSegment.image(path)
+        return MessageSegment.image(image_store.url_for(path))
+    return MessageSegment.image(image_bytes)
+
+
+# 持久化的成绩刷新队列（重启后继续处理未完成的任务）
+refresh_queue = RefreshQueue(
+    db,
+    process_refresh_job,
+    workers=config.maimai_refresh_workers,
+    max_attempts=config.maimai_refresh_max_attempts,
+    retry_delay=config.maimai_refresh_retry_delay,
+    wait_timeout=config.maimai_refresh_wait_timeout,
+)
+
+
+def _recompute_all_ratings(ds_table: dict, new_songs: set) -> int:
+    """按新的定数表分批重新计算所有玩家的成绩，返回写回的玩家数"""
+    from .rating import recompute_ratings
+    
+    total = 0
+    after_qq = ""
+    while True:
+        batch = db.get_records_batch(after_qq)
+        if not batch:
+            break
+        after_qq = batch[-1][0]
+        updated_at = {qq: timestamp for qq, _, timestamp in batch}
+        changed = recompute_ratings([(qq, data) for qq, data, _ in batch], ds_table, new_songs)
+        total += db.update_recomputed_records(
+            (qq, data, updated_at[qq]) for qq, data in changed
+        )
+    return total
+
+
+async def apply_ds_changes():
+    """定数表变化后在本地重新计算所有玩家的单曲 Rating 和 DX Rating（仅主进程）"""
+    invalidate_headers()
+    if not leader.is_leader:
+        return
+    fingerprint = api.ds_fingerprint
+    if db.get_meta("ds_fingerprint") == fingerprint:
+        return
+    
+    logger.info("检测到定数表变化，开始在本地重新计算玩家 Rating...")
+    loop = asyncio.get_running_loop()
+    updated = await loop.run_in_executor(
+        None, _recompute_all_ratings, api.get_ds_table(), api.get_new_song_ids()
+    )
+    db.set_meta("ds_fingerprint", fingerprint)
+    logger.info(f"Rating 重新计算完成，更新了 {updated} 名玩家的成绩")
+
+
+api.add_music_listener(apply_ds_changes)
 
 
 def refresh_custom_alias_cache():
@@ -74,6 +265,12 @@ def refresh_custom_alias_cache():
     api.set_custom_aliases(custom_aliases)
 
 
+async def wait_catalogue(matcher: Type[Matcher]):
+    """等待歌曲数据加载完成，启动加载超时仍未完成时提示稍后再试并结束事件处理"""
+    if not await api.wait_catalogue(config.maimai_startup_wait) and api.catalogue_loading:
+        await matcher.finish("⏳ 歌曲数据正在加载中，请稍后再试！")
+
+
 def _equals_ignore_case(a: str, b: str) -> bool:
     return a.lower() == b.lower()
 
@@ -103,7 +300,7 @@ async def update_group_nicknames(bot: Bot, group_id: str):
                 
                 # 更新缓存
                 cache_key = f"{group_id}_{qq}"
-                group_nickname_cache[cache_key] = nickname
+                group_nickname_cache.set(cache_key, nickname)
                 success_count += 1
             except Exception as e:
                 logger.warning(f"更新群 {group_id} 中用户 {qq} 的昵称失败: {e}")
@@ -112,7 +309,7 @@ async def update_group_nicknames(bot: Bot, group_id: str):
                     info = await bot.get_stranger_info(user_id=int(qq))
                     nickname = info.get("nickname", qq)
                     cache_key = f"{group_id}_{qq}"
-                    group_nickname_cache[cache_key] = nickname
+                    group_nickname_cache.set(cache_key, nickname)
                     success_count += 1
                 except Exception as e2:
                     logger.warning(f"获取QQ {qq} 昵称也失败: {e2}")
@@ -176,21 +373,10 @@ async def _(bot: Bot, event: GroupMessageEvent):
         await refresh_ranking.finish("本群暂无用户加入排行榜！")
         return
     
-    success_count = 0
-    fail_count = 0
-    
-    for qq in users:
-        try:
-            records = await api.get_player_records(qq)
-            if records:
-                db.update_user_records(qq, records)
-                success_count += 1
-            else:
-                fail_count += 1
-                logger.warning(f"获取用户 {qq} 的成绩失败")
-        except Exception as e:
-            fail_count += 1
-            logger.error(f"获取用户 {qq} 的成绩时出错: {e}")
+    # 以整群刷新的优先级加入刷新队列，失败的用户会在稍后自动重试
+    results = await refresh_queue.submit_many(users, "group", PRIORITY_GROUP)
+    success_count = sum(1 for result in results if result)
+    fail_count = len(results) - success_count
     
     msg = f"刷新完成！\n成功: {success_count} 人\n失败: {fail_count} 人"
     await refresh_ranking.finish(msg)
@@ -329,6 +515,8 @@ async def _(bot: Bot, event: GroupMessageEvent):
     
     try:
         await api.load_music_data()
+        # 定数和标题可能变化，重新绘制页眉
+        invalidate_headers()
         
         # 检查是否成功加载
         if api.music_data:
@@ -381,8 +569,9 @@ async def _(bot: Bot, event: GroupMessageEvent):
     await refresh_records.send("正在刷新你的成绩数据，请稍候...")
     
     try:
-        # 获取最新成绩
-        records = await api.get_player_records(user_id)
+        # 以最高优先级加入刷新队列并等待结果
+        refreshed = await refresh_queue.submit(user_id, "manual", PRIORITY_MANUAL)
+        records = db.get_user_records(user_id) if refreshed else None
         if not records:
             await refresh_records.finish(
                 "❌ 无法获取你的成绩数据！\n"
@@ -393,8 +582,8 @@ async def _(bot: Bot, event: GroupMessageEvent):
             )
             return
         
-        # 更新成绩
-        db.update_user_records(user_id, records)
+        # 手动刷新说明玩家仍在活跃，恢复每日自动刷新
+        db.reset_refresh_backoff(user_id)
         
         # 记录刷新操作
         db.log_refresh(user_id, today)
@@ -782,6 +971,7 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         song_query = query
     
     # 获取歌曲信息
+    await wait_catalogue(query_ranking)
     try:
         song = await api.find_song(song_query)
     except Exception as e:
@@ -802,61 +992,38 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         await query_ranking.finish("本群暂无用户加入排行榜！")
         return
     
-    # 收集成绩数据
-    ranking_data = []
-    for qq in users:
-        records = db.get_user_records(qq)
-        if not records or "records" not in records:
-            continue
-        
-        # 查找该歌曲的成绩
-        for record in records["records"]:
-            if record.get("song_id") == song_id:
-                # 获取群内昵称
-                group_nickname = await get_group_nickname(bot, qq, group_id)
-                ranking_data.append({
-                    "qq": qq,
-                    "nickname": group_nickname,  # 使用群内昵称
-                    "achievements": record.get("achievements", 0),
-                    "fc": record.get("fc", ""),
-                    "fs": record.get("fs", ""),
-                    "level_label": record.get("level_label", ""),
-                    "level_index": record.get("level_index", 0),
-                    "ds": record.get("ds", 0),
-                    "rate": record.get("rate", ""),
-                })
-    
-    if not ranking_data:
-        await query_ranking.finish(f"本群暂无人游玩过《{song_title}》！")
-        return
-    
-    # 如果指定了难度，只显示该难度的成绩
-    if target_difficulty is not None:
-        ranking_data = [r for r in ranking_data if r["level_index"] == target_difficulty]
-        if not ranking_data:
+    # 从群排行榜表读取（未指定难度时取群内有人游玩过的最高难度），已按成绩降序排列
+    leaderboard = db.get_group_leaderboard(group_id, song_id, target_difficulty)
+    if not leaderboard:
+        if target_difficulty is not None and db.get_group_leaderboard(group_id, song_id):
             difficulty_names = ["绿", "黄", "红", "紫", "白"]
             await query_ranking.finish(f"本群暂无人游玩过《{song_title}》的 {difficulty_names[target_difficulty]} 难度！")
-            return
-    else:
-        # 默认：只显示最高难度的成绩
-        max_difficulty = max(r["level_index"] for r in ranking_data)
-        ranking_data = [r for r in ranking_data if r["level_index"] == max_difficulty]
-    
-    # 按成绩排序（降序）
-    ranking_data.sort(key=lambda x: -x["achievements"])
+        else:
+            await query_ranking.finish(f"本群暂无人游玩过《{song_title}》！")
+        return
     
     # 限制显示前20名
-    ranking_data = ranking_data[:20]
+    ranking_data = []
+    for entry in leaderboard[:20]:
+        # 获取群内昵称
+        group_nickname = await get_group_nickname(bot, entry["qq"], group_id)
+        ranking_data.append({**entry, "nickname": group_nickname})
     
     # 生成排行榜图片
     try:
-        image_bytes = await render_ranking_image(song, ranking_data, api)
+        image_bytes = await get_renderer().render_ranking_image(
+            song,
+            ranking_data,
+            api,
+            image_format=config.maimai_image_format,
+            quality=config.maimai_image_quality,
+        )
     except Exception as e:
         logger.error(f"生成排行榜图片时出错: {e}")
         await query_ranking.finish("❌ 生成图片失败，请稍后重试！")
         return
     
-    msg = MessageSegment.image(image_bytes)
+    msg = build_image_segment(image_bytes)
     await query_ranking.finish(msg)
 
 
@@ -869,6 +1036,7 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         return
     
     # 获取歌曲信息
+    await wait_catalogue(query_song_info)
     try:
         song = await api.find_song(query)
     except Exception as e:
@@ -946,6 +1114,7 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         await add_alias_command.finish("别名过长，请控制在40个字符以内。")
         return
 
+    await wait_catalogue(add_alias_command)
     try:
         song = await api.find_song(song_query)
     except Exception as e:
@@ -1020,6 +1189,7 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         await remove_alias_command.finish("歌曲关键词和目标别名均不能为空。")
         return
 
+    await wait_catalogue(remove_alias_command)
     try:
         song = await api.find_song(song_query)
     except Exception as e:
@@ -1133,16 +1303,9 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         await query_rating_ranking.finish("本群暂无用户加入排行榜！")
         return
     
-    # 收集用户 Rating 数据
+    # 收集用户 Rating 数据（直接读取 Rating 列，不需要解压成绩数据）
     rating_data = []
-    for qq in users:
-        records = db.get_user_records(qq)
-        if not records:
-            continue
-        
-        rating = records.get("rating", 0)
-        nickname = records.get("nickname", "未知")
-        
+    for qq, rating in db.get_group_ratings(group_id):
         # 如果指定了分段，只统计该分段的玩家
         if rating_segment is not None:
             if not (min_rating <= rating <= max_rating):
@@ -1154,7 +1317,6 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         rating_data.append({
             "qq": qq,
             "nickname": group_nickname,
-            "maimai_nickname": nickname,
             "rating": rating
         })
     
@@ -1209,6 +1371,205 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
     await query_rating_ranking.finish(result)
 
 
+query_player_ranks = on_command("wmpm", priority=10, block=True)
+
+@query_player_ranks.handle()
+async def _(event: GroupMessageEvent):
+    """查询自己在本群所有已游玩谱面的名次"""
+    group_id = str(event.group_id)
+    qq = str(event.user_id)
+    
+    if not db.is_group_enabled(group_id):
+        return
+    
+    if not db.is_user_in_group(qq, group_id):
+        await query_player_ranks.finish("你还没有加入本群排行榜！")
+        return
+    
+    ranks = rank_index.player_ranks(group_id, qq)
+    if not ranks:
+        await query_player_ranks.finish("暂无你的成绩记录，请先使用「刷新成绩」！")
+        return
+    
+    await wait_catalogue(query_player_ranks)
+    difficulty_names = ["绿", "黄", "红", "紫", "白"]
+    first_count = sum(1 for item in ranks if item["rank"] == 1)
+    
+    result = f"🏅 你在本群的谱面名次（共 {len(ranks)} 张，第一名 {first_count} 张）\n"
+    result += "=" * 30 + "\n"
+    
+    # 最多显示名次最高的 50 张谱面
+    for item in ranks[:50]:
+        song = api.get_song_by_id(item["song_id"])
+        title = song.title if song else str(item["song_id"])
+        if len(title) > 12:
+            title = title[:12] + "..."
+        level_index = item["level_index"]
+        difficulty = difficulty_names[level_index] if 0 <= level_index < len(difficulty_names) else str(level_index)
+        result += (
+            f"{item['rank']}/{item['total']} 《{title}》{difficulty} "
+            f"{item['achievements']:.4f}%\n"
+        )
+    
+    result += "=" * 30
+    if len(ranks) > 50:
+        result += "\n仅显示名次最高的 50 张谱面"
+    
+    await query_player_ranks.finish(result)
+
+
+query_ds_range = on_command("wmds", priority=10, block=True)
+query_group_stats = on_command("wmtj", priority=10, block=True)
+
+def _chart_levels() -> dict:
+    """所有非宴谱谱面的等级：(歌曲ID, 难度) -> 等级"""
+    return {
+        (song.id, level_index): level
+        for song in api.music_data
+        if not api.is_utage_chart(song.id)
+        for level_index, level in enumerate(song.level)
+    }
+
+@query_group_stats.handle()
+async def _(event: GroupMessageEvent, args: Message = CommandArg()):
+    """查看本群成绩统计：不带参数为全群概览，带歌曲为单张谱面统计"""
+    group_id = str(event.group_id)
+    
+    if not db.is_group_enabled(group_id):
+        return
+    
+    difficulty_names = ["绿", "黄", "红", "紫", "白"]
+    query = args.extract_plain_text().strip()
+    await wait_catalogue(query_group_stats)
+    
+    if not query:
+        level_stats = score_matrix.level_stats(group_id, _chart_levels())
+        if not level_stats:
+            await query_group_stats.finish("本群暂无成绩记录！")
+            return
+        
+        result = "📈 本群成绩统计\n"
+        result += "=" * 30 + "\n"
+        result += "等级  游玩  SSS+  AP\n"
+        for item in level_stats:
+            result += f"{item['level']:<5} {item['plays']:<5} {item['sss_plus']:<5} {item['ap']}\n"
+        
+        for title, order in (("🔥 游玩人数最多", "plays"), ("💀 平均达成率最低", "hardest")):
+            charts = score_matrix.top_charts(group_id, order)
+            if not charts:
+                continue
+            result += "=" * 30 + f"\n{title}\n"
+            for item in charts:
+                song = api.get_song_by_id(item["song_id"])
+                name = song.title if song else str(item["song_id"])
+                if len(name) > 12:
+                    name = name[:12] + "..."
+                difficulty = difficulty_names[item["level_index"]] if 0 <= item["level_index"] < 5 else ""
+                result += f"《{name}》{difficulty} {item['players']} 人，平均 {item['mean']:.4f}%\n"
+        
+        await query_group_stats.finish(result.strip())
+        return
+    
+    # 解析歌曲和可选难度
+    difficulty_map = {name: index for index, name in enumerate(difficulty_names)}
+    parts = query.split()
+    target_difficulty = None
+    song_query = query
+    if len(parts) > 1 and parts[-1] in difficulty_map:
+        target_difficulty = difficulty_map[parts[-1]]
+        song_query = " ".join(parts[:-1])
+    
+    try:
+        song = await api.find_song(song_query)
+    except Exception as e:
+        logger.error(f"查找歌曲时出错: {e}")
+        await query_group_stats.finish("❌ 查询失败，请稍后重试！")
+        return
+    
+    if not song:
+        await query_group_stats.finish("❌ 未找到歌曲")
+        return
+    if not song.ds:
+        await query_group_stats.finish(f"❌ 《{song.title}》暂无谱面数据")
+        return
+    
+    # 未指定难度时取最高难度
+    level_index = target_difficulty if target_difficulty is not None else len(song.ds) - 1
+    stats = score_matrix.chart_stats(group_id, song.id, level_index)
+    if not stats:
+        await query_group_stats.finish(f"本群暂无人游玩过《{song.title}》的 {difficulty_names[level_index]} 难度！")
+        return
+    
+    await query_group_stats.finish(
+        f"📈 《{song.title}》{difficulty_names[level_index]} 本群统计\n"
+        f"游玩人数: {stats['players']}\n"
+        f"最高: {stats['max']:.4f}%\n"
+        f"平均: {stats['mean']:.4f}%\n"
+        f"中位数: {stats['median']:.4f}%\n"
+        f"前 10%: {stats['p90']:.4f}% / 后 10%: {stats['p10']:.4f}%\n"
+        f"SSS+: {stats['sss_plus']} 人，AP: {stats['ap']} 人"
+    )
+
+
+@query_ds_range.handle()
+async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
+    """查看本群定数区间排行榜（按区间内 SSS+ 数量排名）"""
+    group_id = str(event.group_id)
+    
+    if not db.is_group_enabled(group_id):
+        return
+    
+    usage = "请输入定数区间！\n例如: wmds 14.0 14.6\n单个定数: wmds 14.5"
+    parts = args.extract_plain_text().replace("~", " ").replace("-", " ").split()
+    try:
+        bounds = [float(part) for part in parts]
+    except ValueError:
+        await query_ds_range.finish(usage)
+        return
+    if len(bounds) not in (1, 2):
+        await query_ds_range.finish(usage)
+        return
+    low, high = min(bounds), max(bounds)
+    
+    await wait_catalogue(query_ds_range)
+    if not api.music_data:
+        await api.load_music_data()
+    charts = api.get_charts_in_ds_range(low, high)
+    if not charts:
+        await query_ds_range.finish(f"没有定数在 {low:.1f} ~ {high:.1f} 之间的谱面！")
+        return
+    
+    summary = score_matrix.range_summary(group_id, charts)
+    if not summary:
+        await query_ds_range.finish(f"本群暂无人游玩过定数 {low:.1f} ~ {high:.1f} 的谱面！")
+        return
+    
+    # 限制显示前20名
+    rows = []
+    for item in summary[:20]:
+        rows.append({
+            "nickname": await get_group_nickname(bot, item["qq"], group_id),
+            "values": [item["sss_plus"], item["ap"], item["played"], f"{item['mean']:.2f}%"],
+        })
+    
+    range_text = f"{low:.1f}" if low == high else f"{low:.1f} ~ {high:.1f}"
+    try:
+        image_bytes = get_renderer().render_summary_image(
+            f"定数 {range_text} 排行榜",
+            f"共 {len(charts)} 张谱面 · {len(summary)} 名玩家 · 按 SSS+ 数量排名",
+            ["SSS+", "AP", "已游玩", "平均"],
+            rows,
+            image_format=config.maimai_image_format,
+            quality=config.maimai_image_quality,
+        )
+    except Exception as e:
+        logger.error(f"生成定数区间排行榜图片时出错: {e}")
+        await query_ds_range.finish("❌ 生成图片失败，请稍后重试！")
+        return
+    
+    await query_ds_range.finish(build_image_segment(image_bytes))
+
+
 # ==================== 定时任务 ====================
 
 # ==================== 超管命令 ====================
@@ -1232,12 +1593,15 @@ async def _(bot: Bot, event: GroupMessageEvent):
         return
     
     try:
-        # 获取当前机器人加入的所有群组
-        groups = await bot.get_group_list()
-        current_group_ids = [str(group["group_id"]) for group in groups]
+        # 获取所有已连接的机器人加入的群组（多账号部署时取并集）
+        for connected_bot in get_bots().values():
+            await group_router.refresh_bot(connected_bot)
+        current_group_ids = list(group_router.all_groups())
         
         # 清理数据库中已退出的群组数据
         cleaned_count = db.clean_left_groups(current_group_ids)
+        # 被清理用户的刷新任务已删除，结束正在等待这些任务的命令
+        refresh_queue.release_orphaned_waiters()
         
         if cleaned_count > 0:
             await clean_database.finish(f"✅ 清理完成！共清理了 {cleaned_count} 个已退出群组的数据。")
@@ -1259,53 +1623,407 @@ async def _(bot: Bot, event: GroupMessageEvent):
         return
 
 
-# ==================== 定时任务 ====================
+plugin_status = on_command(
+    "舞萌状态",
+    permission=SUPERUSER,
+    priority=5,
+    block=True,
+)
 
-@scheduler.scheduled_job("cron", hour=0, minute=0, id="maimai_auto_update_records")
-async def auto_update_records():
-    """每天0点自动更新所有用户的成绩"""
-    logger.info("开始自动更新舞萌排行榜数据...")
+@plugin_status.handle()
+async def _():
+    """查看插件运行状态（仅超管可用）"""
+    api_stats = api.get_stats()
+    http_stats = api_stats["http"]
+    
+    result = "📊 舞萌排行榜运行状态\n"
+    result += f"歌曲数据: {api_stats['music_count']} 首\n"
+    result += f"别名数据: {api_stats['alias_count']} 条\n"
+    result += f"HTTP/2: {'开启' if http_stats['http2'] else '关闭'}\n"
+    result += f"JSON 后端: {codec.backend}\n"
+    if startup_timings:
+        phases = "、".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items())
+        result += f"启动耗时: {phases}{'（加载中）' if api.catalogue_loading else ''}\n"
+    result += f"成绩压缩: {db.compressor.algorithm}（字典 {db.compressor.active_dict_id or '无'}）\n"
+    result += f"HTTP 请求: {http_stats['total_requests']} 次（重试 {http_stats['total_retries']} 次）\n"
+    for host, breaker in http_stats["breakers"].items():
+        result += (
+            f"熔断器 {host}: {breaker['state']}，"
+            f"连续失败 {breaker['consecutive_failures']}，"
+            f"熔断 {breaker['times_opened']} 次，"
+            f"拒绝 {breaker['total_rejected']} 次\n"
+        )
     
-    all_users = db.get_all_users()
-    success_count = 0
-    fail_count = 0
-    today = datetime.now().strftime("%Y-%m-%d")
+    queue_stats = refresh_queue.get_stats()
+    pending = queue_stats["pending"]
+    pending_display = "、".join(f"{reason} {count}" for reason, count in pending.items()) or "无"
+    result += f"刷新队列: 待处理 {pending_display}，处理中 {queue_stats['running']}\n"
+    result += (
+        f"刷新统计: 已处理 {queue_stats['processed']}，成功 {queue_stats['success']}，"
+        f"失败 {queue_stats['fail']}，跳过 {queue_stats['skipped']}\n"
+    )
     
-    for qq in all_users:
-        # 如果当日已有手动刷新记录，则跳过自动更新
-        if db.get_daily_refresh_count(qq, today) > 0:
-            logger.info(f"用户 {qq} 当日已有手动刷新记录，跳过自动更新")
-            continue
+    result += "内存缓存:"
+    for name, stats in get_cache_stats().items():
+        result += f"\n  {name}: {stats['items']} 条，{stats['bytes'] / 1024 / 1024:.1f} MB"
+        if "hits" in stats:
+            result += (
+                f"，命中率 {stats['hit_rate']:.0%}，"
+                f"淘汰 {stats['evictions']}，过期 {stats['expirations']}"
+            )
+    
+    if config.maimai_image_transport != "bytes":
+        image_stats = image_store.get_stats()
+        result += (
+            f"\n图片缓存: {image_stats['files']} 个文件，{image_stats['bytes'] / 1024 / 1024:.1f} MB，"
+            f"写入 {image_stats['writes']}，复用 {image_stats['reuses']}"
+        )
+    
+    await plugin_status.finish(result)
+
+
+encoder_benchmark = on_command(
+    "舞萌编码测试",
+    permission=SUPERUSER,
+    priority=5,
+    block=True,
+)
+
+@encoder_benchmark.handle()
+async def _(args: Message = CommandArg()):
+    """测试各图片编码格式的耗时与体积（仅超管可用）"""
+    query = args.extract_plain_text().strip()
+    if not query:
+        await encoder_benchmark.finish("请输入用于测试的歌曲！\n例如: 舞萌编码测试 群青")
+        return
+    await wait_catalogue(encoder_benchmark)
+    song = await api.find_song(query)
+    if not song:
+        await encoder_benchmark.finish(f"未找到歌曲: {query}")
+        return
+    
+    # 使用满 20 行的示例数据，接近实际最大的排行榜图片
+    level_index = len(song.get("ds", [])) - 1
+    sample_data = [
+        {
+            "qq": str(10000 + i),
+            "nickname": f"玩家{i + 1}",
+            "achievements": 101.0 - i * 0.25,
+            "fc": ["app", "ap", "fcp", "fc", ""][i % 5],
+            "fs": ["fsdp", "fsd", "fsp", "fs", ""][i % 5],
+            "level_index": level_index,
+            "rate": "sssp",
+        }
+        for i in range(20)
+    ]
+    image_bytes = await get_renderer().render_ranking_image(song, sample_data, api, image_format="png_fast")
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(
+        None, get_renderer().benchmark_encoders, image_bytes, config.maimai_image_quality
+    )
+    
+    result = f"🖼️ 图片编码测试（20 行，质量 {config.maimai_image_quality}）\n"
+    for image_format, stats in results.items():
+        mark = "（当前）" if image_format == config.maimai_image_format else ""
+        result += f"{image_format}: {stats['ms']:.1f} ms，{stats['kb']:.1f} KB{mark}\n"
+    await encoder_benchmark.finish(result.strip())
+
+
+json_benchmark = on_command(
+    "舞萌JSON测试",
+    permission=SUPERUSER,
+    priority=5,
+    block=True,
+)
+
+@json_benchmark.handle()
+async def _():
+    """用库中最大的一份成绩数据测试各 JSON 后端的耗时（仅超管可用）"""
+    sample = db.get_sample_records_payload()
+    if not sample:
+        await json_benchmark.finish("暂无成绩数据，无法测试！")
+        return
+    
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, codec.benchmark, sample)
+    
+    result = f"🧪 JSON 编解码测试（成绩数据 {len(sample.encode('utf-8')) / 1024:.1f} KB）\n"
+    for name, stats in results.items():
+        mark = "（当前）" if name == codec.backend else ""
+        if name == "msgspec_typed":
+            result += f"msgspec 按结构解析: {stats['loads_ms']:.2f} ms\n"
+        else:
+            result += f"{name}: 解析 {stats['loads_ms']:.2f} ms，序列化 {stats['dumps_ms']:.2f} ms{mark}\n"
+    await json_benchmark.finish(result.strip())
+
+
+def _compress_records() -> Optional[dict]:
+    """训练新的压缩字典并用它重新压缩所有成绩数据，无法训练字典时返回 None"""
+    if db.compressor.algorithm == "none" or db.train_payload_dictionary() is None:
+        return None
+    return db.recompress_records()
+
+
+compress_records = on_command(
+    "压缩成绩数据",
+    permission=SUPERUSER,
+    priority=5,
+    block=True,
+)
+
+@compress_records.handle()
+async def _():
+    """重新训练压缩字典、重新压缩所有成绩数据并整理数据库文件（仅超管可用）"""
+    if db.compressor.algorithm == "none":
+        await compress_records.finish("当前配置为不压缩成绩数据（MAIMAI_RECORDS_COMPRESSION=none）")
+        return
+    
+    await compress_records.send("正在压缩成绩数据，请稍候...")
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, _compress_records)
+    if result is None:
+        await compress_records.finish("❌ 成绩数据不足或训练字典失败，请稍后重试！")
+        return
+    before, after = await loop.run_in_executor(None, db.vacuum)
+    
+    ratio = result["before"] / result["after"] if result["after"] else 0
+    await compress_records.finish(
+        f"✅ 成绩数据压缩完成！\n"
+        f"算法: {db.compressor.algorithm}，字典 {db.compressor.active_dict_id}\n"
+        f"重新压缩: {result['rows']} 份，{result['before'] / 1024 / 1024:.1f} MB → "
+        f"{result['after'] / 1024 / 1024:.1f} MB（{ratio:.1f} 倍）\n"
+        f"数据库文件: {before / 1024 / 1024:.1f} MB → {after / 1024 / 1024:.1f} MB"
+    )
+
+
+global_ranking = on_command(
+    "全局排行榜",
+    permission=SUPERUSER,
+    priority=5,
+    block=True,
+)
+
+@global_ranking.handle()
+async def _(bot: Bot, args: Message = CommandArg()):
+    """所有已启用群的全局排行榜，同一玩家只计一次（仅超管可用）"""
+    query = args.extract_plain_text().strip()
+    if not query:
+        await global_ranking.finish("请输入歌曲或 rating！\n例如: 全局排行榜 群青 紫\n全局排行榜 rating")
+        return
+    
+    if query.lower() in ("rating", "rt"):
+        leaderboard = db.get_global_rating_leaderboard()
+        if not leaderboard:
+            await global_ranking.finish("暂无玩家成绩记录！")
+            return
+        rows = [
+            {
+                "nickname": await get_group_nickname(bot, entry["qq"], entry["group_id"]),
+                "values": [entry["rating"]],
+            }
+            for entry in leaderboard
+        ]
         try:
-            records = await api.get_player_records(qq)
-            if records:
-                db.update_user_records(qq, records)
-                success_count += 1
-            else:
-                fail_count += 1
+            image_bytes = get_renderer().render_summary_image(
+                "全局 Rating 排行榜",
+                f"所有已启用群 · 前 {len(rows)} 名",
+                ["Rating"],
+                rows,
+                image_format=config.maimai_image_format,
+                quality=config.maimai_image_quality,
+            )
         except Exception as e:
-            fail_count += 1
-            logger.error(f"自动更新用户 {qq} 的成绩时出错: {e}")
+            logger.error(f"生成全局 Rating 排行榜图片时出错: {e}")
+            # 图片生成失败时改用文字排行榜
+            result = "🏆 全局 Rating 排行榜\n"
+            result += "=" * 30 + "\n"
+            for i, row in enumerate(rows, 1):
+                result += f"{i}. {row['nickname']} - {row['values'][0]}\n"
+            await global_ranking.finish(result.strip())
+            return
+        await global_ranking.finish(build_image_segment(image_bytes))
+        return
+    
+    # 解析歌曲和可选难度
+    difficulty_names = ["绿", "黄", "红", "紫", "白"]
+    parts = query.split()
+    target_difficulty = None
+    song_query = query
+    if len(parts) > 1 and parts[-1] in difficulty_names:
+        target_difficulty = difficulty_names.index(parts[-1])
+        song_query = " ".join(parts[:-1])
+    
+    await wait_catalogue(global_ranking)
+    try:
+        song = await api.find_song(song_query)
+    except Exception as e:
+        logger.error(f"查找歌曲时出错: {e}")
+        await global_ranking.finish("❌ 查询失败，请稍后重试！")
+        return
+    
+    if not song:
+        await global_ranking.finish("❌ 未找到歌曲")
+        return
+    
+    # 未指定难度时取有人游玩过的最高难度
+    levels = [target_difficulty] if target_difficulty is not None else range(len(song.ds) - 1, -1, -1)
+    leaderboard = []
+    for level_index in levels:
+        leaderboard = db.get_global_chart_leaderboard(song.id, level_index)
+        if leaderboard:
+            break
+    if not leaderboard:
+        await global_ranking.finish(f"暂无人游玩过《{song.title}》！")
+        return
+    
+    ranking_data = [
+        {**entry, "nickname": await get_group_nickname(bot, entry["qq"], entry["group_id"])}
+        for entry in leaderboard
+    ]
+    try:
+        image_bytes = await get_renderer().render_ranking_image(
+            song,
+            ranking_data,
+            api,
+            image_format=config.maimai_image_format,
+            quality=config.maimai_image_quality,
+        )
+    except Exception as e:
+        logger.error(f"生成全局排行榜图片时出错: {e}")
+        await global_ranking.finish("❌ 生成图片失败，请稍后重试！")
+        return
     
-    logger.info(f"自动更新成绩完成！成功: {success_count} 人，失败: {fail_count} 人")
+    await global_ranking.finish(build_image_segment(image_bytes))
+
 
+rebuild_leaderboards = on_command(
+    "重建排行榜",
+    permission=SUPERUSER,
+    priority=5,
+    block=True,
+)
 
-@scheduler.scheduled_job("cron", hour=0, minute=5, id="maimai_auto_update_alias")
+@rebuild_leaderboards.handle()
+async def _():
+    """从成绩数据重新生成所有群排行榜（仅超管可用）"""
+    await rebuild_leaderboards.send("正在重建群排行榜，请稍候...")
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, db.rebuild_leaderboards)
+    except Exception as e:
+        logger.error(f"重建群排行榜时出错: {e}")
+        await rebuild_leaderboards.finish("❌ 重建群排行榜失败，请查看日志！")
+        return
+    db.set_meta("leaderboards", "1")
+    await rebuild_leaderboards.finish(
+        f"✅ 群排行榜重建完成！\n"
+        f"玩家: {result['users']} 名\n"
+        f"解析失败（保留原成绩）: {result['skipped']} 名\n"
+        f"排行榜记录: {result['rows']} 条\n"
+        f"与重建前不一致: {result['mismatched']} 条"
+    )
+
+
+# ==================== 定时任务 ====================
+
+# 别名与昵称任务紧跟在刷新窗口开始之后，成绩刷新在整个窗口内分片进行
+_alias_hour, _alias_minute = offset_time(config.maimai_refresh_hour, config.maimai_refresh_minute, 5)
+_nickname_hour, _nickname_minute = offset_time(config.maimai_refresh_hour, config.maimai_refresh_minute, 10)
+
+# 定时任务的公共参数：随机延迟、禁止重叠运行、错过的触发合并为一次
+_job_options = {
+    "jitter": config.maimai_refresh_jitter,
+    "max_instances": 1,
+    "coalesce": True,
+    "misfire_grace_time": 3600,
+}
+
+
+@scheduler.scheduled_job(
+    "cron",
+    hour=config.maimai_refresh_hour,
+    minute=config.maimai_refresh_minute,
+    id="maimai_auto_update_records",
+    **_job_options,
+)
+async def auto_update_records():
+    """每天在刷新窗口内分片自动更新所有用户的成绩"""
+    if not leader.is_leader:
+        return
+    logger.info("开始自动更新舞萌排行榜数据...")
+    
+    # 按分片计划加入刷新队列，任务持久化在数据库中，重启后继续处理
+    all_users = db.get_all_users()
+    plan = refresher.plan(all_users)
+    count = refresh_queue.enqueue(
+        (qq, "nightly", PRIORITY_NIGHTLY, due) for qq, due in plan
+    )
+    logger.info(f"已将 {count} 个用户的成绩刷新任务加入队列")
+
+
+@scheduler.scheduled_job(
+    "cron",
+    hour=_alias_hour,
+    minute=_alias_minute,
+    id="maimai_auto_update_alias",
+    **_job_options,
+)
 async def auto_update_alias():
-    """每天0点05分自动更新别名数据"""
+    """每天刷新窗口开始后 5 分钟自动更新别名数据"""
+    if not leader.is_leader:
+        return
     logger.info("开始自动更新别名数据...")
     
     try:
         await api.load_alias_data_force()
         refresh_custom_alias_cache()
+        # 通知其他进程从缓存数据库重新加载别名
+        db.bump_cache_version("alias_data")
         logger.info("别名数据自动更新完成！")
     except Exception as e:
         logger.error(f"自动更新别名数据时出错: {e}")
 
 
-@scheduler.scheduled_job("cron", hour=0, minute=10, id="maimai_auto_update_nicknames")
+@scheduler.scheduled_job("interval", hours=1, id="maimai_cleanup_images")
+async def cleanup_image_cache():
+    """每小时清理过期的图片文件缓存"""
+    if config.maimai_image_transport == "bytes" or not leader.is_leader:
+        return
+    try:
+        removed = image_store.cleanup(config.maimai_image_cache_hours)
+        if removed:
+            logger.info(f"已清理 {removed} 个过期的图片缓存")
+    except Exception as e:
+        logger.warning(f"清理图片缓存失败: {e}")
+
+
+async def _update_groups_nicknames(bot: Bot, group_ids: List[str]) -> Tuple[int, int]:
+    """由同一个 bot 依次更新多个群的昵称，返回 (成功数, 失败数)"""
+    success_count = 0
+    fail_count = 0
+    for group_id in group_ids:
+        try:
+            await update_group_nicknames(bot, group_id)
+            success_count += 1
+        except Exception as e:
+            fail_count += 1
+            logger.warning(f"更新群 {group_id} 昵称失败: {e}")
+    return success_count, fail_count
+
+
+@scheduler.scheduled_job(
+    "cron",
+    hour=_nickname_hour,
+    minute=_nickname_minute,
+    id="maimai_auto_update_nicknames",
+    **_job_options,
+)
 async def auto_update_nicknames():
-    """每天0点10分自动更新所有启用群的昵称"""
+    """每天刷新窗口开始后 10 分钟自动更新所有启用群的昵称
+    
+    昵称缓存和 bot 连接都属于各个进程自身，因此每个进程都会执行，
+    只处理本进程连接的 bot 所在的群。
+    """
     logger.info("开始自动更新群昵称...")
     
     try:
@@ -1321,19 +2039,27 @@ async def auto_update_nicknames():
             logger.info("没有启用的群，跳过昵称更新")
             return
         
-        logger.info(f"开始更新 {len(enabled_groups)} 个群的用户昵称")
-        success_count = 0
-        fail_count = 0
-        
-        # 遍历所有 bot（通常只有一个）
+        # 更新群路由，获取失败时沿用连接时的群列表
         for bot_id, bot in bots.items():
-            for group_id in enabled_groups:
-                try:
-                    await update_group_nicknames(bot, group_id)
-                    success_count += 1
-                except Exception as e:
-                    fail_count += 1
-                    logger.warning(f"更新群 {group_id} 昵称失败: {e}")
+            try:
+                await group_router.refresh_bot(bot)
+            except Exception as e:
+                logger.warning(f"获取 Bot {bot_id} 的群列表失败: {e}")
+        
+        # 每个群只交给一个在群内的 bot，不同 bot 并行处理
+        assignment = group_router.assign(enabled_groups, bots)
+        assigned_count = sum(len(groups) for groups in assignment.values())
+        logger.info(
+            f"开始更新 {assigned_count}/{len(enabled_groups)} 个群的用户昵称，"
+            f"分配给 {len(assignment)} 个 bot"
+        )
+        
+        results = await asyncio.gather(*(
+            _update_groups_nicknames(bots[bot_id], groups)
+            for bot_id, groups in assignment.items()
+        ))
+        success_count = sum(success for success, _ in results)
+        fail_count = sum(fail for _, fail in results)
         
         logger.info(f"自动更新群昵称完成！成功: {success_count} 个群，失败: {fail_count} 个群")
     except Exception as e:
@@ -1342,17 +2068,138 @@ async def auto_update_nicknames():
 
 
 
+def try_become_leader():
+    """尝试成为主进程，成功后启动刷新队列"""
+    if leader.is_leader:
+        return
+    if leader.try_acquire():
+        # 启动刷新队列，继续处理上次未完成的任务
+        refresh_queue.start()
+
+
+@scheduler.scheduled_job("interval", seconds=60, id="maimai_leader_election", max_instances=1, coalesce=True)
+async def leader_election():
+    """定期尝试接管主进程（原主进程退出后由其他进程接手）"""
+    try_become_leader()
+
+
+@scheduler.scheduled_job(
+    "interval",
+    seconds=config.maimai_cache_sync_interval,
+    id="maimai_sync_shared_caches",
+    max_instances=1,
+    coalesce=True,
+)
+async def sync_shared_caches():
+    """检查其他进程对共享数据的修改，并重新加载本进程的缓存"""
+    versions = db.get_cache_versions()
+    changed = {
+        name for name, version in versions.items()
+        if _seen_cache_versions.get(name) != version
+    }
+    if not changed:
+        return
+    _seen_cache_versions.update(versions)
+    
+    try:
+        if "groups" in changed:
+            db.invalidate_group_settings()
+        if "alias_data" in changed:
+            await api.load_alias_data()
+        if "alias_data" in changed or "custom_alias" in changed:
+            refresh_custom_alias_cache()
+        logger.debug(f"已同步其他进程修改的缓存: {', '.join(sorted(changed))}")
+    except Exception as e:
+        logger.warning(f"同步共享缓存失败: {e}")
+
+
 # ==================== 启动和关闭事件 ====================
 
+# 各启动阶段的耗时（秒），在 舞萌状态 中显示
+startup_timings: Dict[str, float] = {}
+_startup_task: Optional[asyncio.Task] = None
+
+T = TypeVar("T")
+
+
+async def _timed_phase(name: str, awaitable: Awaitable[T]) -> T:
+    """执行一个启动阶段并记录耗时"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        startup_timings[name] = time.perf_counter() - start
+        logger.info(f"启动阶段 {name} 完成，耗时 {startup_timings[name]:.2f}s")
+
+
+async def _load_cached_catalogue():
+    """从本地缓存加载歌曲和别名数据"""
+    await api.load_cached_music_data()
+    api.load_cached_alias_data()
+    refresh_custom_alias_cache()
+
+
+async def _fetch_alias_data():
+    """没有别名缓存时从网络获取别名数据"""
+    if not api.alias_data:
+        await api.load_alias_data()
+        refresh_custom_alias_cache()
+
+
+async def _run_migrations():
+    """主进程执行的一次性数据迁移"""
+    loop = asyncio.get_running_loop()
+    # 旧版本数据库首次启动时从已有成绩生成群排行榜
+    if db.get_meta("leaderboards") != "1":
+        logger.info("正在根据已有成绩生成群排行榜...")
+        await loop.run_in_executor(None, db.rebuild_leaderboards)
+        db.set_meta("leaderboards", "1")
+    # 还没有压缩字典时（首次启用压缩）训练字典并压缩已有的成绩数据
+    if db.compressor.algorithm != "none" and not db.compressor.active_dict_id:
+        result = await loop.run_in_executor(None, _compress_records)
+        if result:
+            logger.info(
+                f"已压缩 {result['rows']} 份成绩数据: "
+                f"{result['before'] / 1024 / 1024:.1f} MB → {result['after'] / 1024 / 1024:.1f} MB"
+            )
+
+
+async def _background_startup():
+    """后台完成启动加载
+    
+    先读取本地缓存，有缓存时命令立即可用；随后并发从网络获取最新的歌曲数据和别名数据，
+    最后由主进程执行数据迁移。
+    """
+    start = time.perf_counter()
+    api.begin_catalogue_loading()
+    try:
+        await _timed_phase("本地缓存", _load_cached_catalogue())
+        await asyncio.gather(
+            _timed_phase("歌曲数据", api.load_music_data()),
+            _timed_phase("别名数据", _fetch_alias_data()),
+        )
+    except Exception as e:
+        logger.error(f"加载歌曲数据和别名数据时出错: {e}")
+    finally:
+        api.finish_catalogue_loading()
+    logger.info(f"歌曲数据和别名数据加载完成（{len(api.music_data)} 首歌曲，{len(api.alias_data)} 条别名）")
+    
+    if leader.is_leader:
+        try:
+            await _timed_phase("数据迁移", _run_migrations())
+        except Exception as e:
+            logger.error(f"执行数据迁移时出错: {e}")
+    startup_timings["合计"] = time.perf_counter() - start
+
+
 @driver.on_startup
 async def _():
-    """插件启动时的初始化"""
+    """插件启动时的初始化（耗时的加载在后台进行，不阻塞 Bot 启动）"""
+    global _startup_task
     logger.info("舞萌排行榜插件已加载")
-    # 预加载歌曲数据和别名数据
-    await api.load_music_data()
-    await api.load_alias_data()
-    refresh_custom_alias_cache()
-    logger.info("歌曲数据和别名数据加载完成")
+    _seen_cache_versions.update(db.get_cache_versions())
+    try_become_leader()
+    _startup_task = asyncio.create_task(_background_startup())
 
 
 @driver.on_bot_connect
@@ -1360,27 +2207,42 @@ async def _(bot: Bot):
     """Bot连接成功后的初始化"""
     logger.info("Bot已连接，开始初始化用户昵称缓存")
     
+    try:
+        await group_router.refresh_bot(bot)
+    except Exception as e:
+        logger.warning(f"获取 Bot {bot.self_id} 的群列表失败: {e}")
+        return
+    
     try:
         enabled_groups = db.get_all_enabled_groups()
         if not enabled_groups:
             logger.info("没有启用的群，跳过昵称缓存初始化")
             return
         
-        logger.info(f"开始初始化 {len(enabled_groups)} 个群的用户昵称缓存")
+        # 只处理分配给当前 bot 的群，避免多个 bot 重复调用
+        groups = group_router.assign(enabled_groups, get_bots()).get(bot.self_id, [])
+        logger.info(f"开始初始化 {len(groups)} 个群的用户昵称缓存")
         
-        for group_id in enabled_groups:
-            try:
-                await update_group_nicknames(bot, group_id)
-            except Exception as e:
-                logger.warning(f"更新群 {group_id} 昵称失败: {e}")
-                continue  # 继续处理其他群
+        await _update_groups_nicknames(bot, groups)
         
         logger.info("用户昵称缓存初始化完成")
     except Exception as e:
         logger.warning(f"初始化用户昵称缓存失败: {e}")
 
 
+@driver.on_bot_disconnect
+async def _(bot: Bot):
+    """Bot断开连接后从群路由中移除"""
+    group_router.remove_bot(bot.self_id)
+    logger.info(f"Bot {bot.self_id} 已断开，已从群路由中移除")
+
+
 @driver.on_shutdown
 async def _():
     """插件关闭时的清理"""
+    if _startup_task is not None and not _startup_task.done():
+        _startup_task.cancel()
+    await refresh_queue.stop()
+    leader.release()
+    await api.close()
     logger.info("舞萌排行榜插件已卸载")
\ No newline at end of file
@@ -1,55 +1,161 @@
 """API 模块 - 对接水鱼 API 和别名 API"""
-import httpx
-import json
+import asyncio
+import hashlib
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Awaitable, Callable, Hashable, Set, Tuple
+import numpy as np
 from nonebot.log import logger
 
+from . import codec
+from .config import Config
+from .http_client import ResilientClient, CircuitOpenError
+from .cache import BoundedCache, register_gauge, estimate_size
+from .models import Song, parse_music_data
+
 
 class MaimaiAPI:
     """舞萌 API 客户端"""
     
-    def __init__(self, developer_token: str):
+    def __init__(self, developer_token: str, config: Optional[Config] = None):
         """初始化 API 客户端
         
         Args:
             developer_token: 水鱼查分器 Developer Token
+            config: 插件配置，用于 HTTP 连接池、超时、重试和熔断参数
         """
         self.developer_token = developer_token
         self.base_url = "https://www.diving-fish.com/api/maimaidxprober"
         self.alias_url = "https://www.yuzuchan.moe/api/maimaidx/maimaidxalias"
         
         # 缓存数据
-        self.music_data: List[dict] = []
+        self.music_data: List[Song] = []
+        self._songs_by_id: Dict[int, Song] = {}
+        # 定数索引：按定数升序排列的定数数组，以及对应的 (歌曲ID, 难度)
+        self._ds_sorted = np.empty(0, dtype=np.float64)
+        self._ds_charts: List[Tuple[int, int]] = []
+        # 当前定数表的指纹，以及定数表变化时的回调
+        self.ds_fingerprint = ""
+        self._music_listeners: List[Callable[[], Awaitable[None]]] = []
         self.alias_data: List[dict] = []
         
-        # 本地缓存数据库路径
+        # 本地缓存数据库路径（第一次访问时创建目录和表结构）
         self.cache_dir = Path("data/maimai_cache")
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.cache_db_file = self.cache_dir / "cache.db"
+        self._cache_initialized = False
+        self._cache_init_lock = threading.Lock()
         
-        # 初始化缓存数据库
-        self._init_cache_database()
+        config = config or Config()
+        self.busy_timeout = config.maimai_db_busy_timeout
         
-        # HTTP 客户端
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # HTTP 客户端参数（第一次请求时创建客户端，创建 SSL 上下文较慢）
+        self._client: Optional[ResilientClient] = None
+        self._client_options = dict(
+            max_connections=config.maimai_http_max_connections,
+            max_keepalive_connections=config.maimai_http_max_keepalive,
+            keepalive_expiry=config.maimai_http_keepalive_expiry,
+            http2=config.maimai_http2,
+            timeouts={
+                "records": config.maimai_timeout_records,
+                "music_data": config.maimai_timeout_music,
+                "alias": config.maimai_timeout_alias,
+                "cover": config.maimai_timeout_cover,
+            },
+            max_retries=config.maimai_http_retries,
+            retry_backoff=config.maimai_http_retry_backoff,
+            breaker_threshold=config.maimai_breaker_threshold,
+            breaker_cooldown=config.maimai_breaker_cooldown,
+        )
         
         # 自定义别名缓存
         self.custom_alias_map: Dict[int, List[str]] = {}
+        
+        # 未命中缓存：查不到歌曲的查询词（内存）和没有封面的歌曲（cache.db），
+        # 歌曲或别名数据重新加载后失效
+        self.song_miss_ttl = config.maimai_cache_song_miss_ttl
+        self.cover_miss_ttl = config.maimai_cache_cover_miss_ttl
+        self._song_misses = BoundedCache("api.song_miss", max_items=4096, ttl=self.song_miss_ttl or None)
+        
+        # 进行中的请求（single-flight 去重）
+        self._inflight_records: Dict[str, asyncio.Future] = {}
+        self._inflight_covers: Dict[int, asyncio.Future] = {}
+        self._inflight_catalogue: Dict[str, asyncio.Future] = {}
+        
+        # 启动加载状态：加载进行中时需要歌曲数据的命令等待或提示稍后再试
+        self.catalogue_loading = False
+        self._catalogue_event: Optional[asyncio.Event] = None
+        
+        # 歌曲和别名列表是完整数据集，不参与淘汰，只在统计中显示内存占用
+        register_gauge("api.music_data", lambda: (len(self.music_data), estimate_size(self.music_data)))
+        register_gauge("api.alias_data", lambda: (len(self.alias_data), estimate_size(self.alias_data)))
+        register_gauge("api.custom_alias", lambda: (len(self.custom_alias_map), estimate_size(self.custom_alias_map)))
     
-    def _get_cache_connection(self) -> sqlite3.Connection:
-        """获取缓存数据库连接"""
-        conn = sqlite3.connect(self.cache_db_file)
+    async def _single_flight(
+        self,
+        inflight: Dict[Hashable, asyncio.Future],
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """合并同一 key 的并发请求
+        
+        同一 key 已有请求进行中时，直接等待该请求的结果，
+        否则把请求作为独立任务发起，所有调用方共同等待该任务。
+        
+        Args:
+            inflight: 进行中的请求表
+            key: 去重键
+            factory: 发起实际请求的协程工厂
+        """
+        task = inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_flight(inflight, key, done))
+        # shield 避免任何一个调用方（包括发起者）被取消时连带取消共享的请求
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    def _finish_flight(inflight: Dict[Hashable, asyncio.Future], key: Hashable, task: asyncio.Future):
+        """请求完成后移出进行中的请求表"""
+        if inflight.get(key) is task:
+            del inflight[key]
+        if not task.cancelled():
+            # 所有调用方都已取消时避免 "exception was never retrieved" 警告
+            task.exception()
+    
+    @property
+    def client(self) -> ResilientClient:
+        """HTTP 客户端（第一次使用时创建）"""
+        if self._client is None:
+            self._client = ResilientClient(**self._client_options)
+        return self._client
+    
+    def _connect_cache(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.cache_db_file, timeout=self.busy_timeout)
         conn.row_factory = sqlite3.Row
         return conn
     
+    def _get_cache_connection(self) -> sqlite3.Connection:
+        """获取缓存数据库连接（第一次调用时初始化缓存数据库）"""
+        if not self._cache_initialized:
+            with self._cache_init_lock:
+                if not self._cache_initialized:
+                    self.cache_dir.mkdir(parents=True, exist_ok=True)
+                    self._init_cache_database()
+                    self._cache_initialized = True
+        return self._connect_cache()
+    
     def _init_cache_database(self):
         """初始化缓存数据库表结构"""
-        conn = self._get_cache_connection()
+        conn = self._connect_cache()
         cursor = conn.cursor()
         
         try:
+            # WAL 模式下读写互不阻塞，适合多进程共享缓存
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             # 创建别名数据缓存表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS alias_cache (
@@ -59,6 +165,15 @@ class MaimaiAPI:
                 )
             """)
             
+            # 创建歌曲数据缓存表（启动时先从本地加载，不必等待网络）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS music_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    data BLOB NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            
             # 创建封面缓存表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS cover_cache (
@@ -68,6 +183,14 @@ class MaimaiAPI:
                 )
             """)
             
+            # 创建封面未命中表（水鱼返回 404 的封面及确认时间）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cover_misses (
+                    song_id INTEGER PRIMARY KEY,
+                    checked_at REAL NOT NULL
+                )
+            """)
+            
             conn.commit()
             logger.info("API 缓存数据库初始化完成")
         except Exception as e:
@@ -80,23 +203,128 @@ class MaimaiAPI:
         """检查是否为宴谱（ID为六位数的谱面）"""
         return song_id >= 100000
     
+    # ==================== 启动加载 ====================
+    
+    def _get_catalogue_event(self) -> asyncio.Event:
+        # 在事件循环中创建，兼容 Python 3.8/3.9 的事件循环绑定
+        if self._catalogue_event is None:
+            self._catalogue_event = asyncio.Event()
+        return self._catalogue_event
+    
+    def begin_catalogue_loading(self):
+        """标记启动加载开始"""
+        self.catalogue_loading = True
+        if self.music_data:
+            self._get_catalogue_event().set()
+    
+    def finish_catalogue_loading(self):
+        """标记启动加载结束（无论成功与否），唤醒所有等待者"""
+        self.catalogue_loading = False
+        self._get_catalogue_event().set()
+    
+    async def wait_catalogue(self, timeout: float) -> bool:
+        """等待歌曲数据可用
+        
+        Args:
+            timeout: 最长等待时间（秒），只在启动加载进行中时等待
+        
+        Returns:
+            歌曲数据是否已加载
+        """
+        if self.music_data or not self.catalogue_loading:
+            return bool(self.music_data)
+        try:
+            await asyncio.wait_for(self._get_catalogue_event().wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return bool(self.music_data)
+    
+    async def _apply_music_data(self, raw: Any):
+        """替换歌曲数据并重建索引，定数表变化时通知回调"""
+        old_ids = set(self._songs_by_id)
+        # 只保留用到的字段，原始 JSON 随即释放
+        self.music_data = parse_music_data(raw)
+        self._songs_by_id = {song.id: song for song in self.music_data}
+        self._build_ds_index()
+        self._song_misses.clear()
+        # 曲库有变化（例如新曲上线）时，之前没有封面的歌曲可能已经有了
+        if old_ids and old_ids != set(self._songs_by_id):
+            self.clear_cover_misses()
+        if self.music_data and self._catalogue_event is not None:
+            self._catalogue_event.set()
+        
+        fingerprint = self._compute_ds_fingerprint()
+        if fingerprint != self.ds_fingerprint:
+            self.ds_fingerprint = fingerprint
+            await self._notify_music_listeners()
+    
+    async def load_cached_music_data(self) -> bool:
+        """从本地缓存加载歌曲数据，返回是否加载成功"""
+        conn = self._get_cache_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT data FROM music_cache ORDER BY id DESC LIMIT 1")
+            row = cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"加载歌曲数据缓存失败: {e}")
+            return False
+        finally:
+            conn.close()
+        
+        if not row:
+            return False
+        try:
+            await self._apply_music_data(codec.loads(row["data"]))
+        except ValueError as e:
+            logger.warning(f"歌曲数据缓存已损坏: {e}")
+            return False
+        logger.info(f"从本地缓存加载 {len(self.music_data)} 首歌曲数据")
+        return bool(self.music_data)
+    
+    def _save_music_cache(self, data: bytes):
+        """保存歌曲数据原文到本地缓存（只保留最新一份）"""
+        conn = self._get_cache_connection()
+        cursor = conn.cursor()
+        
+        try:
+            from datetime import datetime
+            cursor.execute("DELETE FROM music_cache")
+            cursor.execute(
+                "INSERT INTO music_cache (data, updated_at) VALUES (?, ?)",
+                (data, datetime.now().isoformat())
+            )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"保存歌曲数据缓存失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
     async def load_music_data(self):
-        """加载歌曲数据"""
+        """从网络加载歌曲数据（同一时间只发起一个请求）"""
+        await self._single_flight(self._inflight_catalogue, "music_data", self._fetch_music_data)
+    
+    async def _fetch_music_data(self):
+        """从网络加载歌曲数据（不去重）"""
         try:
             url = f"{self.base_url}/music_data"
-            response = await self.client.get(url)
+            response = await self.client.get(url, endpoint="music_data")
             
             if response.status_code == 200:
-                self.music_data = response.json()
+                await self._apply_music_data(codec.loads(response.content))
                 logger.info(f"成功加载 {len(self.music_data)} 首歌曲数据")
+                if self.music_data:
+                    self._save_music_cache(response.content)
             else:
                 logger.error(f"加载歌曲数据失败: {response.status_code}")
+        except CircuitOpenError as e:
+            logger.warning(f"加载歌曲数据跳过: {e}，继续使用已有的 {len(self.music_data)} 首歌曲数据")
         except Exception as e:
             logger.error(f"加载歌曲数据时出错: {e}")
     
-    async def load_alias_data(self):
-        """加载别名数据（优先从数据库缓存加载）"""
-        # 1. 尝试从数据库缓存加载
+    def load_cached_alias_data(self) -> bool:
+        """从数据库缓存加载别名数据，返回是否加载成功"""
         conn = self._get_cache_connection()
         cursor = conn.cursor()
         
@@ -105,21 +333,29 @@ class MaimaiAPI:
             row = cursor.fetchone()
             
             if row:
-                self.alias_data = json.loads(row["data"])
+                self.alias_data = codec.loads(row["data"])
+                self._song_misses.clear()
                 logger.info(f"从数据库缓存加载 {len(self.alias_data)} 条别名数据")
-                conn.close()
-                return
+                return True
         except Exception as e:
             logger.warning(f"加载数据库别名缓存失败: {e}，将从API获取")
         finally:
             conn.close()
-        
-        # 2. 从API加载
+        return False
+    
+    async def load_alias_data(self):
+        """加载别名数据（优先从数据库缓存加载，同一时间只发起一个网络请求）"""
+        if self.load_cached_alias_data():
+            return
+        await self._single_flight(self._inflight_catalogue, "alias_data", self._fetch_alias_data)
+    
+    async def _fetch_alias_data(self):
+        """从网络加载别名数据并写入数据库缓存（不去重）"""
         try:
-            response = await self.client.get(self.alias_url)
+            response = await self.client.get(self.alias_url, endpoint="alias")
             
             if response.status_code == 200:
-                data = response.json()
+                data = codec.loads(response.content)
                 
                 # 处理不同的数据格式
                 if isinstance(data, list):
@@ -134,6 +370,7 @@ class MaimaiAPI:
                 else:
                     logger.warning(f"别名数据格式不正确: {type(data)}")
                     self.alias_data = []
+                self._song_misses.clear()
                 
                 # 保存到数据库缓存
                 if self.alias_data:
@@ -142,7 +379,7 @@ class MaimaiAPI:
                         cursor = conn.cursor()
                         
                         from datetime import datetime
-                        data_json = json.dumps(self.alias_data, ensure_ascii=False)
+                        data_json = codec.dumps(self.alias_data)
                         updated_at = datetime.now().isoformat()
                         
                         # 先清除旧的缓存记录，再插入新的数据
@@ -161,6 +398,8 @@ class MaimaiAPI:
             else:
                 logger.error(f"加载别名数据失败: {response.status_code}")
                 self.alias_data = []
+        except CircuitOpenError as e:
+            logger.warning(f"加载别名数据跳过: {e}")
         except Exception as e:
             logger.error(f"加载别名数据时出错: {e}")
             self.alias_data = []
@@ -169,10 +408,10 @@ class MaimaiAPI:
         """强制从网络重新加载别名数据（用于定时更新）"""
         try:
             logger.info("正在从网络强制更新别名数据...")
-            response = await self.client.get(self.alias_url)
+            response = await self.client.get(self.alias_url, endpoint="alias")
             
             if response.status_code == 200:
-                data = response.json()
+                data = codec.loads(response.content)
                 
                 # 处理不同的数据格式
                 if isinstance(data, list):
@@ -187,6 +426,7 @@ class MaimaiAPI:
                 else:
                     logger.warning(f"别名数据格式不正确: {type(data)}")
                     self.alias_data = []
+                self._song_misses.clear()
                 
                 # 保存到数据库缓存
                 if self.alias_data:
@@ -195,7 +435,7 @@ class MaimaiAPI:
                         cursor = conn.cursor()
                         
                         from datetime import datetime
-                        data_json = json.dumps(self.alias_data, ensure_ascii=False)
+                        data_json = codec.dumps(self.alias_data)
                         updated_at = datetime.now().isoformat()
                         
                         cursor.execute(
@@ -211,6 +451,8 @@ class MaimaiAPI:
                         logger.info(f"强制更新 {len(self.alias_data)} 条别名数据（未缓存）")
             else:
                 logger.error(f"强制更新别名数据失败: {response.status_code}")
+        except CircuitOpenError as e:
+            logger.warning(f"强制更新别名数据跳过: {e}，继续使用已缓存的别名数据")
         except Exception as e:
             logger.error(f"强制更新别名数据时出错: {e}")
     
@@ -239,6 +481,7 @@ class MaimaiAPI:
 
     def set_custom_aliases(self, custom_aliases: Dict[int, List[str]]):
         """覆盖自定义别名映射并同步到 alias_data"""
+        self._song_misses.clear()
         self.custom_alias_map = {}
         if not custom_aliases:
             return
@@ -269,6 +512,7 @@ class MaimaiAPI:
         if not alias_str:
             return
         song_id = int(song_id)
+        self._song_misses.clear()
         alias_list = self._ensure_alias_entry(song_id)
         if not any(self._equals_ignore_case(existing, alias_str) for existing in alias_list):
             alias_list.append(alias_str)
@@ -284,6 +528,7 @@ class MaimaiAPI:
         if not alias_str:
             return
         song_id = int(song_id)
+        self._song_misses.clear()
         if song_id in self.custom_alias_map:
             self.custom_alias_map[song_id] = [
                 existing for existing in self.custom_alias_map[song_id]
@@ -356,28 +601,90 @@ class MaimaiAPI:
         Returns:
             玩家成绩数据，失败返回 None
         """
+        return await self._single_flight(
+            self._inflight_records, str(qq),
+            lambda: self._fetch_player_records(qq)
+        )
+    
+    async def _fetch_player_records(self, qq: str) -> Optional[Dict[str, Any]]:
+        """从水鱼获取玩家完整成绩（不去重）"""
         try:
             url = f"{self.base_url}/dev/player/records"
             headers = {"Developer-Token": self.developer_token}
             params = {"qq": qq}
             
-            response = await self.client.get(url, headers=headers, params=params)
+            response = await self.client.get(url, endpoint="records", headers=headers, params=params)
             
             if response.status_code == 200:
-                return response.json()
+                return codec.loads(response.content)
             elif response.status_code == 400:
-                error_msg = response.json().get("message", "未知错误")
+                error_msg = codec.loads(response.content).get("message", "未知错误")
                 logger.warning(f"获取玩家 {qq} 成绩失败: {error_msg}")
                 return None
             else:
                 logger.error(f"获取玩家 {qq} 成绩失败: HTTP {response.status_code}")
                 return None
-                
+        
+        except CircuitOpenError as e:
+            # 熔断期间快速失败，调用方继续使用数据库中已存储的成绩
+            logger.warning(f"获取玩家 {qq} 成绩跳过: {e}")
+            return None
         except Exception as e:
             logger.error(f"获取玩家 {qq} 成绩时出错: {e}")
             return None
     
-    async def find_song(self, query: str) -> Optional[dict]:
+    def add_music_listener(self, callback: Callable[[], Awaitable[None]]):
+        """注册定数表变化（包括首次加载）后的回调"""
+        self._music_listeners.append(callback)
+    
+    async def _notify_music_listeners(self):
+        for callback in self._music_listeners:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"处理歌曲数据更新回调时出错: {e}")
+    
+    def _compute_ds_fingerprint(self) -> str:
+        """计算定数表和新曲列表的指纹"""
+        table = sorted((song.id, song.ds, song.is_new) for song in self.music_data)
+        return hashlib.sha1(repr(table).encode("utf-8")).hexdigest()
+    
+    def get_ds_table(self) -> Dict[Tuple[int, int], float]:
+        """获取 (歌曲ID, 难度) -> 定数"""
+        return {
+            (song.id, level_index): ds
+            for song in self.music_data
+            for level_index, ds in enumerate(song.ds)
+        }
+    
+    def _build_ds_index(self):
+        """按定数排序所有非宴谱谱面，用于定数区间查询"""
+        charts = sorted(
+            (ds, song.id, level_index)
+            for song in self.music_data
+            if not self.is_utage_chart(song.id)
+            for level_index, ds in enumerate(song.ds)
+        )
+        self._ds_sorted = np.fromiter((chart[0] for chart in charts), dtype=np.float64, count=len(charts))
+        self._ds_charts = [(song_id, level_index) for _, song_id, level_index in charts]
+    
+    def get_charts_in_ds_range(self, low: float, high: float) -> List[Tuple[int, int]]:
+        """获取定数在 [low, high] 区间内的所有谱面 (歌曲ID, 难度)，按定数升序"""
+        start = int(np.searchsorted(self._ds_sorted, low, side="left"))
+        end = int(np.searchsorted(self._ds_sorted, high, side="right"))
+        return self._ds_charts[start:end]
+    
+    def get_new_song_ids(self) -> Set[int]:
+        """获取当前版本新曲的歌曲 ID"""
+        return {song.id for song in self.music_data if song.is_new}
+    
+    def get_song_by_id(self, song_id: int) -> Optional[Song]:
+        """按 ID 查找歌曲（排除宴谱）"""
+        if self.is_utage_chart(song_id):
+            return None
+        return self._songs_by_id.get(song_id)
+    
+    async def find_song(self, query: str) -> Optional[Song]:
         """查找歌曲
         
         支持歌曲 ID、歌曲名、别名查询
@@ -397,31 +704,23 @@ class MaimaiAPI:
         if not self.alias_data:
             await self.load_alias_data()
         
+        # 最近查不到的查询词直接返回（匹配不区分大小写，以小写作为键）
+        miss_key = query.lower()
+        if self._song_misses.get(miss_key):
+            return None
+        
         # 1. 尝试按 ID 查找
         if query.isdigit():
-            song_id = int(query)
-            for song in self.music_data:
-                try:
-                    # 确保song["id"]是整数类型
-                    current_song_id = int(song["id"])
-                    if current_song_id == song_id:
-                        # 排除宴谱
-                        if self.is_utage_chart(current_song_id):
-                            continue
-                        return song
-                except (ValueError, TypeError):
-                    continue
+            song = self.get_song_by_id(int(query))
+            if song:
+                return song
         
         # 2. 尝试按歌曲名精确匹配
+        query_lower = query.lower()
         for song in self.music_data:
-            if song["title"].lower() == query.lower():
-                try:
-                    # 排除宴谱
-                    if self.is_utage_chart(int(song["id"])):
-                        continue
-                    return song
-                except (ValueError, TypeError):
-                    continue
+            # 排除宴谱
+            if song.title.lower() == query_lower and not self.is_utage_chart(song.id):
+                return song
         
         # 3. 尝试按别名查找
         for alias_item in self.alias_data:
@@ -438,40 +737,28 @@ class MaimaiAPI:
                             except (ValueError, TypeError):
                                 continue
                             
-                            for song in self.music_data:
-                                # 确保 song["id"] 也是整数
-                                try:
-                                    current_song_id = int(song["id"])
-                                    if current_song_id == song_id:
-                                        # 排除宴谱
-                                        if self.is_utage_chart(current_song_id):
-                                            continue
-                                        return song
-                                except (ValueError, TypeError):
-                                    continue
+                            song = self.get_song_by_id(song_id)
+                            if song:
+                                return song
         
         # 4. 收集所有模糊匹配结果并按匹配度排序
         matches = []
         
         # 4.1 按歌曲名模糊匹配
         for song in self.music_data:
-            title = song["title"].lower()
-            query_lower = query.lower()
+            title = song.title.lower()
             if query_lower in title:
-                try:
-                    # 排除宴谱
-                    if self.is_utage_chart(int(song["id"])):
-                        continue
-                    # 计算匹配度：完全匹配 > 开头匹配 > 包含匹配
-                    if title == query_lower:
-                        score = 100  # 完全匹配
-                    elif title.startswith(query_lower):
-                        score = 90   # 开头匹配
-                    else:
-                        score = 80   # 包含匹配
-                    matches.append((score, song, "title"))
-                except (ValueError, TypeError):
+                # 排除宴谱
+                if self.is_utage_chart(song.id):
                     continue
+                # 计算匹配度：完全匹配 > 开头匹配 > 包含匹配
+                if title == query_lower:
+                    score = 100  # 完全匹配
+                elif title.startswith(query_lower):
+                    score = 90   # 开头匹配
+                else:
+                    score = 80   # 包含匹配
+                matches.append((score, song, "title"))
         
         # 4.2 按别名模糊匹配
         for alias_item in self.alias_data:
@@ -527,23 +814,18 @@ class MaimaiAPI:
                             except (ValueError, TypeError):
                                 continue
                             
-                            for song in self.music_data:
-                                try:
-                                    current_song_id = int(song["id"])
-                                    if current_song_id == song_id:
-                                        # 排除宴谱
-                                        if self.is_utage_chart(current_song_id):
-                                            continue
-                                        matches.append((match_score, song, "alias"))
-                                        break
-                                except (ValueError, TypeError):
-                                    continue
+                            song = self.get_song_by_id(song_id)
+                            if song:
+                                matches.append((match_score, song, "alias"))
         
         # 按匹配度排序，返回最佳匹配
         if matches:
             matches.sort(key=lambda x: x[0], reverse=True)
             return matches[0][1]
         
+        # 歌曲数据未加载时查不到不代表查询词无效，不缓存
+        if self.music_data and self.song_miss_ttl > 0:
+            self._song_misses.set(miss_key, True)
         return None
     
     async def get_song_cover(self, song_id: int) -> Optional[bytes]:
@@ -555,12 +837,19 @@ class MaimaiAPI:
         Returns:
             封面图片字节数据，失败返回 None
         """
+        # 处理 ID 格式
+        cover_id = song_id
+        if 10000 < song_id <= 11000:
+            cover_id = song_id - 10000
+        
+        return await self._single_flight(
+            self._inflight_covers, cover_id,
+            lambda: self._fetch_song_cover(song_id, cover_id)
+        )
+    
+    async def _fetch_song_cover(self, song_id: int, cover_id: int) -> Optional[bytes]:
+        """读取缓存或从网络获取封面（不去重）"""
         try:
-            # 处理 ID 格式
-            cover_id = song_id
-            if 10000 < song_id <= 11000:
-                cover_id = song_id - 10000
-            
             # 补齐为 5 位数
             cover_id_str = f"{cover_id:05d}"
             
@@ -578,6 +867,16 @@ class MaimaiAPI:
                 if row:
                     conn.close()
                     return row["cover_data"]
+                
+                # 最近确认过水鱼没有的封面不再请求
+                if self.cover_miss_ttl > 0:
+                    cursor.execute(
+                        "SELECT checked_at FROM cover_misses WHERE song_id = ?",
+                        (cover_id,)
+                    )
+                    miss = cursor.fetchone()
+                    if miss and time.time() - miss["checked_at"] < self.cover_miss_ttl:
+                        return None
             except Exception as e:
                 logger.warning(f"读取封面缓存失败: {e}")
             finally:
@@ -585,7 +884,7 @@ class MaimaiAPI:
             
             # 从网络获取
             url = f"https://www.diving-fish.com/covers/{cover_id_str}.png"
-            response = await self.client.get(url)
+            response = await self.client.get(url, endpoint="cover")
             
             if response.status_code == 200:
                 cover_data = response.content
@@ -602,6 +901,7 @@ class MaimaiAPI:
                         "INSERT OR REPLACE INTO cover_cache (song_id, cover_data, cached_at) VALUES (?, ?, ?)",
                         (cover_id, cover_data, cached_at)
                     )
+                    cursor.execute("DELETE FROM cover_misses WHERE song_id = ?", (cover_id,))
                     
                     conn.commit()
                     conn.close()
@@ -610,15 +910,66 @@ class MaimaiAPI:
                     logger.warning(f"保存封面缓存到数据库失败: {e}")
                 
                 return cover_data
+            elif response.status_code == 404:
+                logger.debug(f"歌曲 {song_id} 没有封面")
+                self._record_cover_miss(cover_id)
+                return None
             else:
                 logger.warning(f"获取歌曲 {song_id} 封面失败: HTTP {response.status_code}")
                 return None
-                
+        
+        except CircuitOpenError as e:
+            logger.debug(f"获取歌曲 {song_id} 封面跳过: {e}")
+            return None
         except Exception as e:
             logger.error(f"获取歌曲 {song_id} 封面时出错: {e}")
             return None
     
+    def _record_cover_miss(self, cover_id: int):
+        """记录水鱼没有的封面"""
+        if self.cover_miss_ttl <= 0:
+            return
+        conn = self._get_cache_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "INSERT OR REPLACE INTO cover_misses (song_id, checked_at) VALUES (?, ?)",
+                (cover_id, time.time())
+            )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"保存封面未命中记录失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def clear_cover_misses(self):
+        """清除所有封面未命中记录，之后重新请求这些封面"""
+        conn = self._get_cache_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM cover_misses")
+            conn.commit()
+            if cursor.rowcount:
+                logger.info(f"曲库已更新，清除 {cursor.rowcount} 条封面未命中记录")
+        except Exception as e:
+            logger.warning(f"清除封面未命中记录失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def get_stats(self) -> dict:
+        """获取 API 客户端统计信息（HTTP 层、熔断器状态等）"""
+        return {
+            "http": self.client.get_stats(),
+            "music_count": len(self.music_data),
+            "alias_count": len(self.alias_data) if self.alias_data else 0,
+        }
+    
     async def close(self):
         """关闭 HTTP 客户端"""
-        await self.client.aclose()
+        if self._client is not None:
+            await self._client.aclose()
 
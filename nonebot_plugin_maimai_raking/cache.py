@@ -0,0 +1,197 @@
+"""缓存模块 - 带容量上限、过期时间和统计信息的统一内存缓存"""
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# 所有已创建的缓存，用于统一查看统计和清理
+_registry: Dict[str, "BoundedCache"] = {}
+# 不可淘汰、只需要观察占用的数据（例如歌曲列表）：名称 -> (条目数, 字节数) 的计算函数
+_gauges: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存值占用的内存（字节）
+
+    图片按像素数据计算，字节串和字符串按长度计算，
+    列表、元组和字典按前若干个元素的平均大小推算，使用 __slots__ 的对象累加各字段，
+    其余使用 sys.getsizeof。
+    """
+    # PIL 只在渲染时导入；尚未导入时缓存中不可能有图片
+    pil_image = sys.modules.get("PIL.Image")
+    if pil_image is not None and isinstance(value, pil_image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        if not value:
+            return sys.getsizeof(value)
+        sample = list(value.items())[:32]
+        per_item = sum(estimate_size(k) + estimate_size(v) for k, v in sample) / len(sample)
+        return sys.getsizeof(value) + int(per_item * len(value))
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return sys.getsizeof(value)
+        sample = value[:32]
+        per_item = sum(estimate_size(v) for v in sample) / len(sample)
+        return sys.getsizeof(value) + int(per_item * len(value))
+    slots = getattr(type(value), "__slots__", None)
+    if slots:
+        return sys.getsizeof(value) + sum(estimate_size(getattr(value, name, None)) for name in slots)
+    return sys.getsizeof(value)
+
+
+class BoundedCache:
+    """按最近使用淘汰的内存缓存
+
+    - max_bytes: 按 estimate_size 估算的总大小上限，0 表示不限
+    - max_items: 条目数量上限，0 表示不限
+    - ttl: 条目过期时间（秒），None 表示不过期
+    - 记录命中、未命中、淘汰和过期次数
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int = 0,
+        max_items: int = 0,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[Any], int] = estimate_size,
+    ):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.ttl = ttl
+        self.sizeof = sizeof
+
+        # key -> (value, 大小, 写入时间)
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self.current_bytes = 0
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        _registry[name] = self
+
+    def configure(self, max_bytes: Optional[int] = None, max_items: Optional[int] = None, ttl: Optional[float] = None):
+        """调整容量上限和过期时间，超出新上限的条目立即淘汰"""
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if max_items is not None:
+            self.max_items = max_items
+        if ttl is not None:
+            self.ttl = ttl if ttl > 0 else None
+        self._shrink()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and not self._expired(entry)
+
+    def _expired(self, entry: Tuple[Any, int, float]) -> bool:
+        return self.ttl is not None and time.monotonic() - entry[2] > self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，命中时将条目移到最近使用的位置"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if self._expired(entry):
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存，超出上限时淘汰最久未使用的条目"""
+        if key in self._data:
+            self._remove(key)
+        size = self.sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            # 单个条目超过总上限，不缓存
+            self.evictions += 1
+            return
+        self._data[key] = (value, size, time.monotonic())
+        self.current_bytes += size
+        self._shrink()
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self.current_bytes -= size
+
+    def _shrink(self):
+        while self._data and (
+            (self.max_bytes and self.current_bytes > self.max_bytes)
+            or (self.max_items and len(self._data) > self.max_items)
+        ):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """删除指定条目，返回是否存在"""
+        if key not in self._data:
+            return False
+        self._remove(key)
+        return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除所有键满足条件的条目，返回删除数量"""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        """清空缓存（保留统计）"""
+        self._data.clear()
+        self.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._data),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def register_gauge(name: str, measure: Callable[[], Tuple[int, int]]):
+    """登记一份不参与淘汰、只需要观察内存占用的数据
+
+    Args:
+        name: 名称
+        measure: 返回 (条目数, 估算字节数) 的函数
+    """
+    _gauges[name] = measure
+
+
+def get_all_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有缓存和观察数据的统计信息"""
+    stats = {name: cache.get_stats() for name, cache in _registry.items()}
+    for name, measure in _gauges.items():
+        items, size = measure()
+        stats[name] = {"items": items, "bytes": size}
+    return stats
+
+
+def clear_all(names: Optional[List[str]] = None):
+    """清空指定（默认全部）缓存"""
+    for name, cache in _registry.items():
+        if names is None or name in names:
+            cache.clear()
@@ -0,0 +1,198 @@
+"""JSON 编解码模块 - 优先使用 orjson / msgspec，未安装时回退到标准库"""
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from nonebot.log import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+JSONData = Union[str, bytes, bytearray]
+# (歌曲ID, 难度) -> (达成率, FC, FS, 评级, 难度标签)
+ChartRows = Dict[Tuple[int, int], Tuple[float, str, str, str, str]]
+
+
+def _stdlib_loads(data: JSONData) -> Any:
+    return json.loads(data)
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+_backends: Dict[str, Tuple[Callable[[JSONData], Any], Callable[[Any], str]]] = {
+    "json": (_stdlib_loads, _stdlib_dumps),
+}
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_decoder = msgspec.json.Decoder()
+
+    def _msgspec_dumps(obj: Any) -> str:
+        return _msgspec_encoder.encode(obj).decode("utf-8")
+
+    _backends["msgspec"] = (_msgspec_decoder.decode, _msgspec_dumps)
+
+if orjson is not None:
+    def _orjson_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    _backends["orjson"] = (orjson.loads, _orjson_dumps)
+
+# 自动选择时的优先级：不带类型的解析和序列化 orjson 最快
+_PREFERENCE = ("orjson", "msgspec", "json")
+
+backend = next(name for name in _PREFERENCE if name in _backends)
+_loads, _dumps = _backends[backend]
+
+
+def set_backend(name: str = "auto") -> str:
+    """选择 JSON 后端
+
+    Args:
+        name: auto / orjson / msgspec / json，指定的库未安装时自动选择
+
+    Returns:
+        实际使用的后端名称
+    """
+    global backend, _loads, _dumps
+    if name not in _backends:
+        if name != "auto":
+            logger.warning(f"JSON 后端 {name} 不可用，自动选择")
+        name = next(candidate for candidate in _PREFERENCE if candidate in _backends)
+    backend = name
+    _loads, _dumps = _backends[name]
+    return name
+
+
+def loads(data: JSONData) -> Any:
+    """解析 JSON（接受 str 或 bytes）"""
+    return _loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """序列化为 JSON 字符串（非 ASCII 字符不转义，与 ensure_ascii=False 相同）"""
+    return _dumps(obj)
+
+
+# ==================== 成绩数据 ====================
+
+if msgspec is not None:
+    class ChartRecord(msgspec.Struct, gc=False):
+        """水鱼 records 接口中的单条谱面成绩（只声明用到的字段，其余字段解析时直接跳过）"""
+        song_id: int = 0
+        level_index: int = 0
+        achievements: float = 0.0
+        fc: Optional[str] = None
+        fs: Optional[str] = None
+        rate: Optional[str] = None
+        level_label: Optional[str] = None
+
+    class RecordsPayload(msgspec.Struct):
+        """水鱼 records 接口的返回数据"""
+        rating: Optional[int] = None
+        records: Optional[List[ChartRecord]] = None
+
+    _records_decoder = msgspec.json.Decoder(RecordsPayload)
+
+
+def chart_rows(records: dict) -> ChartRows:
+    """把成绩数据展开为 (歌曲ID, 难度) -> (达成率, FC, FS, 评级, 难度标签)"""
+    rows = {}
+    for record in records.get("records", []) or []:
+        try:
+            key = (int(record.get("song_id", 0)), int(record.get("level_index", 0)))
+            rows[key] = (
+                float(record.get("achievements", 0) or 0),
+                record.get("fc", "") or "",
+                record.get("fs", "") or "",
+                record.get("rate", "") or "",
+                record.get("level_label", "") or "",
+            )
+        except (ValueError, TypeError):
+            continue
+    return rows
+
+
+def records_rating(records: dict) -> int:
+    """成绩数据中的 DX Rating"""
+    try:
+        return int(records.get("rating", 0) or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def decode_records_summary(data: JSONData) -> Tuple[int, ChartRows]:
+    """直接从成绩 JSON 解析出 Rating 和谱面成绩
+
+    安装了 msgspec 时按 RecordsPayload 结构解析，不会为未用到的字段创建对象；
+    数据不符合结构时回退为通用解析。
+
+    Raises:
+        ValueError: 不是合法的 JSON（各后端的解析异常都是 ValueError 的子类）
+    """
+    if msgspec is not None:
+        try:
+            payload = _records_decoder.decode(data)
+        except msgspec.ValidationError:
+            # 字段类型与结构不符（例如水鱼调整了接口），使用通用解析
+            pass
+        else:
+            rows = {
+                (record.song_id, record.level_index): (
+                    record.achievements,
+                    record.fc or "",
+                    record.fs or "",
+                    record.rate or "",
+                    record.level_label or "",
+                )
+                for record in payload.records or []
+            }
+            return payload.rating or 0, rows
+
+    records = loads(data)
+    return records_rating(records), chart_rows(records)
+
+
+def benchmark(sample: JSONData, rounds: int = 20) -> Dict[str, Dict[str, float]]:
+    """在真实数据上比较各 JSON 后端的解析与序列化耗时
+
+    Args:
+        sample: 用于测试的 JSON 数据（例如一份成绩数据）
+        rounds: 每项重复次数，取平均值
+
+    Returns:
+        {后端: {"loads_ms": 解析耗时, "dumps_ms": 序列化耗时}}，
+        安装了 msgspec 时额外包含 msgspec_typed（只解析成绩摘要）
+    """
+    obj = json.loads(sample)
+    results = {}
+    for name, (backend_loads, backend_dumps) in _backends.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            backend_loads(sample)
+        loads_ms = (time.perf_counter() - start) * 1000 / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            backend_dumps(obj)
+        dumps_ms = (time.perf_counter() - start) * 1000 / rounds
+        results[name] = {"loads_ms": loads_ms, "dumps_ms": dumps_ms}
+
+    if msgspec is not None:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            decode_records_summary(sample)
+        results["msgspec_typed"] = {
+            "loads_ms": (time.perf_counter() - start) * 1000 / rounds,
+            "dumps_ms": 0.0,
+        }
+    return results
@@ -0,0 +1,186 @@
+"""压缩模块 - 使用共享字典压缩成绩数据原文"""
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from nonebot.log import logger
+
+from . import codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 压缩数据头：1 字节算法 + 4 字节字典 ID（0 表示不使用字典）
+_HEADER = struct.Struct("<BI")
+_ALGORITHM_IDS = {"zlib": 1, "zstd": 2}
+_ALGORITHM_NAMES = {value: key for key, value in _ALGORITHM_IDS.items()}
+
+# 解压失败时可能抛出的异常
+_DECOMPRESS_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+# zlib 预设字典最多使用 32 KB；zstd 字典由 zstandard 训练
+ZLIB_DICT_SIZE = 32 * 1024
+ZSTD_DICT_SIZE = 112 * 1024
+
+StoredPayload = Union[str, bytes]
+
+
+def available_algorithms() -> List[str]:
+    """当前环境可用的压缩算法（优先级从高到低）"""
+    return (["zstd"] if zstandard is not None else []) + ["zlib"]
+
+
+def _build_zlib_dictionary(samples: List[str]) -> bytes:
+    """从样本生成 zlib 预设字典
+
+    成绩数据中重复最多的是热门谱面的整条记录（标题、类型、等级等字段），
+    按出现次数挑选谱面，把它们的记录片段拼接成字典，出现最多的放在末尾（离待压缩数据最近）。
+    """
+    counter: Counter = Counter()
+    fragments: Dict[Tuple[int, int], bytes] = {}
+    for sample in samples:
+        try:
+            records = codec.loads(sample).get("records") or []
+        except (ValueError, AttributeError):
+            continue
+        for record in records:
+            key = (record.get("song_id"), record.get("level_index"))
+            counter[key] += 1
+            if key not in fragments:
+                fragments[key] = codec.dumps(record).encode("utf-8")
+
+    selected: List[bytes] = []
+    size = 0
+    for key, _ in counter.most_common():
+        fragment = fragments[key]
+        if size + len(fragment) > ZLIB_DICT_SIZE:
+            break
+        selected.append(fragment)
+        size += len(fragment)
+    return b",".join(reversed(selected))
+
+
+class PayloadCompressor:
+    """成绩数据原文的压缩与解压
+
+    压缩结果带有算法和字典 ID，旧字典在重新训练后仍保留，用于解压之前写入的数据；
+    未压缩的旧数据（str）原样返回。
+    """
+
+    def __init__(self, algorithm: str = "auto", level: Optional[int] = None):
+        """初始化压缩器
+
+        Args:
+            algorithm: auto / zstd / zlib / none，指定的算法不可用时自动选择
+            level: 压缩级别，None 使用各算法的默认值（zstd 3，zlib 6）
+        """
+        if algorithm not in available_algorithms() + ["none"]:
+            if algorithm != "auto":
+                logger.warning(f"压缩算法 {algorithm} 不可用，自动选择")
+            algorithm = available_algorithms()[0]
+        self.algorithm = algorithm
+        self.level = level
+
+        # 字典 ID -> (算法, 字典数据)
+        self._dictionaries: Dict[int, Tuple[str, bytes]] = {}
+        # 写入时使用的字典（当前算法最新的字典）
+        self.active_dict_id = 0
+        self._zstd_compressors: Dict[int, object] = {}
+        self._zstd_decompressors: Dict[int, object] = {}
+
+    def load_dictionaries(self, dictionaries: Iterable[Tuple[int, str, bytes]]):
+        """加载字典 (ID, 算法, 数据)，并选择当前算法 ID 最大的字典用于写入"""
+        for dict_id, algorithm, data in dictionaries:
+            self._dictionaries[dict_id] = (algorithm, bytes(data))
+        candidates = [
+            dict_id for dict_id, (algorithm, _) in self._dictionaries.items()
+            if algorithm == self.algorithm
+        ]
+        self.active_dict_id = max(candidates, default=0)
+
+    def has_dictionary(self, dict_id: int) -> bool:
+        return dict_id == 0 or dict_id in self._dictionaries
+
+    def train(self, samples: List[str]) -> Optional[bytes]:
+        """用样本训练当前算法的字典，样本不足或训练失败时返回 None"""
+        if self.algorithm == "none" or not samples:
+            return None
+        if self.algorithm == "zlib":
+            return _build_zlib_dictionary(samples) or None
+        try:
+            dictionary = zstandard.train_dictionary(
+                ZSTD_DICT_SIZE, [sample.encode("utf-8") for sample in samples]
+            )
+            return dictionary.as_bytes()
+        except Exception as e:
+            logger.warning(f"训练 zstd 字典失败: {e}")
+            return None
+
+    def _zstd_compressor(self, dict_id: int):
+        compressor = self._zstd_compressors.get(dict_id)
+        if compressor is None:
+            kwargs = {"level": self.level if self.level is not None else 3}
+            if dict_id:
+                kwargs["dict_data"] = zstandard.ZstdCompressionDict(self._dictionaries[dict_id][1])
+            compressor = self._zstd_compressors[dict_id] = zstandard.ZstdCompressor(**kwargs)
+        return compressor
+
+    def _zstd_decompressor(self, dict_id: int):
+        decompressor = self._zstd_decompressors.get(dict_id)
+        if decompressor is None:
+            kwargs = {}
+            if dict_id:
+                kwargs["dict_data"] = zstandard.ZstdCompressionDict(self._dictionaries[dict_id][1])
+            decompressor = self._zstd_decompressors[dict_id] = zstandard.ZstdDecompressor(**kwargs)
+        return decompressor
+
+    def compress(self, text: str) -> StoredPayload:
+        """压缩成绩数据原文；算法为 none 时原样返回字符串"""
+        if self.algorithm == "none":
+            return text
+        data = text.encode("utf-8")
+        dict_id = self.active_dict_id
+        if self.algorithm == "zstd":
+            body = self._zstd_compressor(dict_id).compress(data)
+        else:
+            level = self.level if self.level is not None else 6
+            if dict_id:
+                compressor = zlib.compressobj(level, zdict=self._dictionaries[dict_id][1])
+            else:
+                compressor = zlib.compressobj(level)
+            body = compressor.compress(data) + compressor.flush()
+        return _HEADER.pack(_ALGORITHM_IDS[self.algorithm], dict_id) + body
+
+    def decompress(self, payload: StoredPayload) -> str:
+        """解压成绩数据原文
+
+        Raises:
+            KeyError: 数据使用了尚未加载的字典（其他进程刚训练的字典）
+            ValueError: 数据损坏或压缩算法不可用
+        """
+        if isinstance(payload, str):
+            return payload
+        algorithm_id, dict_id = _HEADER.unpack_from(payload)
+        body = memoryview(payload)[_HEADER.size:]
+        algorithm = _ALGORITHM_NAMES.get(algorithm_id)
+        if not self.has_dictionary(dict_id):
+            raise KeyError(dict_id)
+        try:
+            if algorithm == "zstd":
+                if zstandard is None:
+                    raise ValueError("数据使用 zstd 压缩，但未安装 zstandard")
+                data = self._zstd_decompressor(dict_id).decompress(body)
+            elif algorithm == "zlib":
+                if dict_id:
+                    decompressor = zlib.decompressobj(zdict=self._dictionaries[dict_id][1])
+                else:
+                    decompressor = zlib.decompressobj()
+                data = decompressor.decompress(body) + decompressor.flush()
+            else:
+                raise ValueError(f"未知的压缩算法: {algorithm_id}")
+        except _DECOMPRESS_ERRORS as e:
+            raise ValueError(str(e)) from e
+        return data.decode("utf-8")
@@ -19,6 +19,188 @@ class Config(BaseSettings):
         description="数据存储路径"
     )
     
+    # 多进程部署（可选）
+    maimai_db_busy_timeout: float = Field(
+        default=30.0,
+        description="数据库被其他进程锁定时的最长等待时间（秒）"
+    )
+    maimai_cache_sync_interval: int = Field(
+        default=10,
+        description="检查其他进程修改（别名、群设置）的间隔（秒）"
+    )
+    
+    # HTTP 连接池（可选）
+    maimai_http_max_connections: int = Field(
+        default=20,
+        description="HTTP 连接池最大连接数"
+    )
+    maimai_http_max_keepalive: int = Field(
+        default=10,
+        description="HTTP 连接池最大 keep-alive 连接数"
+    )
+    maimai_http_keepalive_expiry: float = Field(
+        default=30.0,
+        description="keep-alive 连接空闲过期时间（秒）"
+    )
+    maimai_http2: bool = Field(
+        default=True,
+        description="是否启用 HTTP/2（需安装 h2）"
+    )
+    
+    # 各接口超时（秒，可选）
+    maimai_timeout_records: float = Field(default=15.0, description="玩家成绩接口超时")
+    maimai_timeout_music: float = Field(default=30.0, description="歌曲数据接口超时")
+    maimai_timeout_alias: float = Field(default=20.0, description="别名接口超时")
+    maimai_timeout_cover: float = Field(default=10.0, description="封面接口超时")
+    
+    # 重试与熔断（可选）
+    maimai_http_retries: int = Field(
+        default=2,
+        description="GET 请求失败后的最大重试次数"
+    )
+    maimai_http_retry_backoff: float = Field(
+        default=0.5,
+        description="重试退避基数（秒），实际等待为 0~基数*2^n 的随机值"
+    )
+    maimai_breaker_threshold: int = Field(
+        default=5,
+        description="连续失败多少次后熔断"
+    )
+    maimai_breaker_cooldown: float = Field(
+        default=60.0,
+        description="熔断持续时间（秒）"
+    )
+    
+    # 启动加载（可选）
+    maimai_startup_wait: float = Field(
+        default=5.0,
+        description="启动时歌曲数据尚未加载完成，需要歌曲数据的命令最多等待的时间（秒），超时后提示稍后再试"
+    )
+    
+    # 每日自动刷新窗口（可选）
+    maimai_refresh_hour: int = Field(
+        default=0,
+        description="每日自动刷新窗口开始的小时"
+    )
+    maimai_refresh_minute: int = Field(
+        default=0,
+        description="每日自动刷新窗口开始的分钟"
+    )
+    maimai_refresh_window: int = Field(
+        default=120,
+        description="成绩刷新窗口长度（分钟），用户按 QQ 分片均匀分布在窗口内"
+    )
+    maimai_refresh_slices: int = Field(
+        default=24,
+        description="成绩刷新窗口的分片数量"
+    )
+    maimai_refresh_jitter: int = Field(
+        default=600,
+        description="定时任务的随机延迟上限（秒），避免多个实例同时请求水鱼"
+    )
+    
+    # 刷新队列（可选）
+    maimai_refresh_workers: int = Field(
+        default=2,
+        description="成绩刷新队列的并发 worker 数量"
+    )
+    maimai_refresh_max_attempts: int = Field(
+        default=5,
+        description="单个刷新任务的最大尝试次数"
+    )
+    maimai_refresh_retry_delay: float = Field(
+        default=300.0,
+        description="刷新失败后首次重试的等待时间（秒），之后每次翻倍"
+    )
+    maimai_refresh_wait_timeout: float = Field(
+        default=600.0,
+        description="刷新命令等待刷新结果的最长时间（秒），超时的用户按未完成处理，任务仍留在队列中"
+    )
+    
+    # 自适应刷新（可选）
+    maimai_adaptive_refresh: bool = Field(
+        default=True,
+        description="是否根据玩家活跃度降低不活跃玩家的自动刷新频率"
+    )
+    maimai_adaptive_grace: int = Field(
+        default=3,
+        description="成绩连续多少次无变化后开始降低刷新频率"
+    )
+    maimai_adaptive_max_interval: int = Field(
+        default=16,
+        description="不活跃玩家的最大刷新间隔（天）"
+    )
+    
+    # 群排行榜（可选）
+    maimai_leaderboard_size: int = Field(
+        default=20,
+        description="每个群每张谱面保留的排行榜名次数"
+    )
+    
+    # 图片输出（可选）
+    maimai_image_format: str = Field(
+        default="png",
+        description="排行榜图片编码格式：png / png_fast / png_quantized / jpeg / webp"
+    )
+    maimai_image_quality: int = Field(
+        default=85,
+        description="JPEG / WebP 的压缩质量（1-100）"
+    )
+    maimai_image_transport: str = Field(
+        default="bytes",
+        description="图片发送方式：bytes（base64 内联）/ file（本地文件路径）/ http（NoneBot HTTP 服务地址）"
+    )
+    maimai_image_base_url: str = Field(
+        default="",
+        description="http 发送方式下 OneBot 实现可访问的 NoneBot 地址，例如 http://127.0.0.1:8080"
+    )
+    maimai_image_cache_hours: float = Field(
+        default=24.0,
+        description="图片文件缓存的保留时间（小时）"
+    )
+    
+    # JSON 编解码（可选）
+    maimai_json_backend: str = Field(
+        default="auto",
+        description="JSON 后端：auto / orjson / msgspec / json（需要安装对应的库，auto 依次尝试）"
+    )
+    
+    # 成绩数据压缩（可选）
+    maimai_records_compression: str = Field(
+        default="auto",
+        description="成绩数据原文的压缩算法：auto / zstd / zlib / none（zstd 需要安装 zstandard）"
+    )
+    
+    # 内存缓存（可选）
+    maimai_cache_cover_mb: float = Field(
+        default=16,
+        description="渲染用歌曲封面缓存的内存上限（MB）"
+    )
+    maimai_cache_header_mb: float = Field(
+        default=48,
+        description="排行榜页眉图层缓存的内存上限（MB）"
+    )
+    maimai_cache_nickname_tile_mb: float = Field(
+        default=16,
+        description="昵称文字图块缓存的内存上限（MB）"
+    )
+    maimai_cache_group_nickname_size: int = Field(
+        default=50000,
+        description="群昵称缓存的最大条目数"
+    )
+    maimai_cache_group_nickname_ttl: int = Field(
+        default=0,
+        description="群昵称缓存的过期时间（秒），0 表示不过期（每日定时刷新）"
+    )
+    maimai_cache_song_miss_ttl: float = Field(
+        default=600,
+        description="查不到歌曲的查询词的缓存时间（秒），期间相同的查询直接返回未找到，0 表示不缓存"
+    )
+    maimai_cache_cover_miss_ttl: float = Field(
+        default=86400,
+        description="水鱼没有封面（HTTP 404）的歌曲的缓存时间（秒），期间不再请求该封面，0 表示不缓存"
+    )
+    
     model_config = SettingsConfigDict(
         extra="ignore",
         env_file=".env"
@@ -1,49 +1,99 @@
 """数据库模块 - 使用 SQLite 数据库存储数据"""
 import sqlite3
 import json
+import hashlib
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple, Iterable
 from datetime import datetime
 from nonebot.log import logger
 
+from . import codec
+from .cache import BoundedCache
+from .compression import PayloadCompressor, StoredPayload
+
 
 class Database:
     """数据库管理类"""
     
-    def __init__(self, data_path: Path):
+    def __init__(
+        self,
+        data_path: Path,
+        busy_timeout: float = 30.0,
+        leaderboard_size: int = 20,
+        compression: str = "auto",
+    ):
         """初始化数据库
         
         Args:
             data_path: 数据存储路径
+            busy_timeout: 数据库被其他进程锁定时的最长等待时间（秒）
+            leaderboard_size: 每个群每张谱面保留的排行榜名次数
+            compression: 成绩数据原文的压缩算法（auto / zstd / zlib / none）
         """
         self.data_path = Path(data_path)
-        self.data_path.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+        self.leaderboard_size = max(1, leaderboard_size)
         
         # 数据库文件路径
         self.db_file = self.data_path / "maimai_raking.db"
         
-        # 初始化数据库
-        self._init_database()
+        # 群组设置缓存（group_id -> (enabled, wmrt_enabled)），None 表示需要重新加载
+        self._group_settings: Optional[Dict[str, Tuple[int, Optional[int]]]] = None
+        
+        # 全局排行榜缓存（(类型, 参数, 成绩版本号) -> 结果），成绩版本号变化后自然失效
+        self._global_cache = BoundedCache("db.global_leaderboard", max_items=128)
+        
+        # 成绩数据原文的压缩器
+        self.compressor = PayloadCompressor(compression)
+        
+        # 表结构在第一次访问数据库时初始化，导入插件时不打开数据库
+        self._initialized = False
+        self._init_lock = threading.Lock()
     
-    def _get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_file)
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接
+        
+        多个进程共享同一个数据库时，写入遇到锁会等待 busy_timeout 秒而不是立即报
+        database is locked。
+        """
+        conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout)
         conn.row_factory = sqlite3.Row
         return conn
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取数据库连接（第一次调用时初始化数据库）"""
+        if not self._initialized:
+            self._ensure_initialized()
+        return self._connect()
+    
+    def _ensure_initialized(self):
+        """创建数据目录和表结构，并加载压缩字典（每个进程只执行一次）"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.data_path.mkdir(parents=True, exist_ok=True)
+            self._init_database()
+            self._load_payload_dictionaries()
+            self._initialized = True
+    
     def _init_database(self):
         """初始化数据库表结构"""
-        conn = self._get_connection()
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
+            # WAL 模式下读写互不阻塞，适合多进程共享数据库
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             # 创建群组表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS groups (
                     group_id TEXT PRIMARY KEY,
                     enabled INTEGER NOT NULL DEFAULT 1,
                     wmrt_enabled INTEGER NOT NULL DEFAULT 1,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL,
+                    scores_version INTEGER NOT NULL DEFAULT 0
                 )
             """)
             
@@ -56,6 +106,14 @@ class Database:
                 if "duplicate column name" not in str(e).lower():
                     raise e
             
+            # 检查并添加 scores_version 列（群成员或成员成绩变化时递增，用于内存索引失效）
+            try:
+                cursor.execute("ALTER TABLE groups ADD COLUMN scores_version INTEGER NOT NULL DEFAULT 0")
+                logger.info("已为groups表添加scores_version列")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    raise e
+            
             # 创建用户表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -81,10 +139,26 @@ class Database:
                     qq TEXT PRIMARY KEY,
                     data TEXT NOT NULL,
                     updated_at TEXT NOT NULL,
+                    rating INTEGER NOT NULL DEFAULT 0,
                     FOREIGN KEY (qq) REFERENCES users(qq)
                 )
             """)
             
+            # 检查并添加 rating 列（全局 Rating 排行榜不再需要解析成绩 JSON）
+            try:
+                cursor.execute("ALTER TABLE records ADD COLUMN rating INTEGER NOT NULL DEFAULT 0")
+                logger.info("已为records表添加rating列")
+                try:
+                    cursor.execute(
+                        "UPDATE records SET rating = COALESCE(CAST(json_extract(data, '$.rating') AS INTEGER), 0)"
+                    )
+                except sqlite3.OperationalError as e:
+                    # SQLite 未编译 JSON1 扩展时，等下一次刷新成绩后再补上
+                    logger.warning(f"回填records表rating列失败: {e}")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    raise e
+            
             # 创建刷新记录表（用于频率限制）
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS refresh_logs (
@@ -96,6 +170,61 @@ class Database:
                 )
             """)
             
+            # 创建自适应刷新状态表（记录成绩最后一次实际变化的时间）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS refresh_state (
+                    qq TEXT PRIMARY KEY,
+                    payload_hash TEXT NOT NULL,
+                    last_changed_at TEXT NOT NULL,
+                    last_checked_at TEXT NOT NULL,
+                    unchanged_streak INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (qq) REFERENCES users(qq)
+                )
+            """)
+            
+            # 创建刷新任务队列表（每个用户最多一条待处理任务，重启后继续处理）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS refresh_jobs (
+                    qq TEXT PRIMARY KEY,
+                    reason TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_error TEXT
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_refresh_jobs_next_attempt
+                ON refresh_jobs(next_attempt_at)
+            """)
+            
+            # 创建缓存版本表（跨进程缓存失效：修改数据时递增版本号）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cache_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            
+            # 创建键值状态表（例如已应用的定数表指纹）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            
+            # 创建成绩数据压缩字典表（旧字典保留，用于解压之前写入的数据）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS payload_dicts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    algorithm TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            
             # 创建自定义别名表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS custom_alias (
@@ -112,6 +241,47 @@ class Database:
                 ON custom_alias(song_id)
             """)
             
+            # 创建谱面成绩表（records 中每张谱面一行，用于维护排行榜）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chart_scores (
+                    qq TEXT NOT NULL,
+                    song_id INTEGER NOT NULL,
+                    level_index INTEGER NOT NULL,
+                    achievements REAL NOT NULL,
+                    fc TEXT NOT NULL DEFAULT '',
+                    fs TEXT NOT NULL DEFAULT '',
+                    rate TEXT NOT NULL DEFAULT '',
+                    level_label TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (qq, song_id, level_index)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chart_scores_chart
+                ON chart_scores(song_id, level_index, achievements DESC)
+            """)
+            
+            # 创建群排行榜表（每个群每张谱面只保留前 leaderboard_size 名）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS group_leaderboards (
+                    group_id TEXT NOT NULL,
+                    song_id INTEGER NOT NULL,
+                    level_index INTEGER NOT NULL,
+                    qq TEXT NOT NULL,
+                    achievements REAL NOT NULL,
+                    fc TEXT NOT NULL DEFAULT '',
+                    fs TEXT NOT NULL DEFAULT '',
+                    rate TEXT NOT NULL DEFAULT '',
+                    level_label TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (group_id, song_id, level_index, qq)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_group_leaderboards_qq
+                ON group_leaderboards(group_id, qq)
+            """)
+            
             # 创建索引
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_user_groups_group_id 
@@ -131,6 +301,114 @@ class Database:
         finally:
             conn.close()
     
+    # ==================== 缓存版本 ====================
+    
+    @staticmethod
+    def _bump_version(cursor: sqlite3.Cursor, name: str):
+        """在当前事务中递增缓存版本号"""
+        cursor.execute(
+            "INSERT INTO cache_versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            (name,)
+        )
+    
+    @staticmethod
+    def _bump_scores_version(cursor: sqlite3.Cursor, group_id: Optional[str] = None, qq: Optional[str] = None):
+        """在当前事务中递增群成绩版本号（指定群，或指定用户所在的所有群）"""
+        if group_id is not None:
+            cursor.execute(
+                "UPDATE groups SET scores_version = scores_version + 1 WHERE group_id = ?",
+                (group_id,)
+            )
+        else:
+            cursor.execute(
+                "UPDATE groups SET scores_version = scores_version + 1 "
+                "WHERE group_id IN (SELECT group_id FROM user_groups WHERE qq = ?)",
+                (qq,)
+            )
+    
+    def bump_cache_version(self, name: str):
+        """递增缓存版本号，通知其他进程重新加载对应缓存"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            self._bump_version(cursor, name)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"更新缓存版本 {name} 失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def get_cache_versions(self) -> Dict[str, int]:
+        """获取所有缓存版本号"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT name, version FROM cache_versions")
+            return {row["name"]: row["version"] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"获取缓存版本失败: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    def get_meta(self, key: str) -> Optional[str]:
+        """读取键值状态"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT value FROM meta WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            return row["value"] if row else None
+        except Exception as e:
+            logger.error(f"读取状态 {key} 失败: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def set_meta(self, key: str, value: str):
+        """写入键值状态"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, value)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"写入状态 {key} 失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def invalidate_group_settings(self):
+        """使群组设置缓存失效"""
+        self._group_settings = None
+    
+    def _get_group_settings(self) -> Dict[str, Tuple[int, Optional[int]]]:
+        """获取所有群组设置（带缓存）"""
+        if self._group_settings is not None:
+            return self._group_settings
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT group_id, enabled, wmrt_enabled FROM groups")
+            self._group_settings = {
+                row["group_id"]: (row["enabled"], row["wmrt_enabled"])
+                for row in cursor.fetchall()
+            }
+            return self._group_settings
+        finally:
+            conn.close()
+    
     # ==================== 群组管理 ====================
     
     def enable_group(self, group_id: str):
@@ -151,7 +429,9 @@ class Database:
                 (group_id,)
             )
             
+            self._bump_version(cursor, "groups")
             conn.commit()
+            self.invalidate_group_settings()
             logger.info(f"群组 {group_id} 功能已启用")
         except Exception as e:
             logger.error(f"启用群组 {group_id} 功能失败: {e}")
@@ -177,7 +457,9 @@ class Database:
                 (group_id,)
             )
             
+            self._bump_version(cursor, "groups")
             conn.commit()
+            self.invalidate_group_settings()
             logger.info(f"群组 {group_id} 功能已禁用")
         except Exception as e:
             logger.error(f"禁用群组 {group_id} 功能失败: {e}")
@@ -203,7 +485,9 @@ class Database:
                 (group_id,)
             )
             
+            self._bump_version(cursor, "groups")
             conn.commit()
+            self.invalidate_group_settings()
             logger.info(f"群组 {group_id} 的wmrt功能已启用")
         except Exception as e:
             logger.error(f"启用群组 {group_id} 的wmrt功能失败: {e}")
@@ -229,7 +513,9 @@ class Database:
                 (group_id,)
             )
             
+            self._bump_version(cursor, "groups")
             conn.commit()
+            self.invalidate_group_settings()
             logger.info(f"群组 {group_id} 的wmrt功能已禁用")
         except Exception as e:
             logger.error(f"禁用群组 {group_id} 的wmrt功能失败: {e}")
@@ -239,41 +525,23 @@ class Database:
     
     def is_group_enabled(self, group_id: str) -> bool:
         """检查群组是否启用"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute(
-                "SELECT enabled FROM groups WHERE group_id = ?",
-                (group_id,)
-            )
-            row = cursor.fetchone()
-            return row["enabled"] == 1 if row else False
+            settings = self._get_group_settings().get(group_id)
+            return settings[0] == 1 if settings else False
         except Exception as e:
             logger.error(f"检查群组 {group_id} 启用状态失败: {e}")
             return False
-        finally:
-            conn.close()
     
     def is_wmrt_enabled(self, group_id: str) -> bool:
         """检查群组的wmrt功能是否启用"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute(
-                "SELECT wmrt_enabled FROM groups WHERE group_id = ?",
-                (group_id,)
-            )
-            row = cursor.fetchone()
+            settings = self._get_group_settings().get(group_id)
             # 如果没有记录或者wmrt_enabled为NULL，则默认开启
-            return row["wmrt_enabled"] == 1 if row and row["wmrt_enabled"] is not None else True
+            return settings[1] == 1 if settings and settings[1] is not None else True
         except Exception as e:
             logger.error(f"检查群组 {group_id} 的wmrt功能启用状态失败: {e}")
             # 出错时默认开启
             return True
-        finally:
-            conn.close()
     
     def get_all_enabled_groups(self) -> List[str]:
         """获取所有启用的群组"""
@@ -304,6 +572,8 @@ class Database:
                     "INSERT INTO groups (group_id, enabled, created_at) VALUES (?, 1, ?)",
                     (group_id, datetime.now().isoformat())
                 )
+                self._bump_version(cursor, "groups")
+                self.invalidate_group_settings()
             
             # 确保用户存在
             cursor.execute("SELECT qq FROM users WHERE qq = ?", (qq,))
@@ -318,6 +588,18 @@ class Database:
                 "INSERT OR IGNORE INTO user_groups (qq, group_id) VALUES (?, ?)",
                 (qq, group_id)
             )
+            if cursor.rowcount:
+                # 把该用户的成绩并入群排行榜
+                cursor.execute(
+                    "INSERT OR REPLACE INTO group_leaderboards "
+                    "(group_id, song_id, level_index, qq, achievements, fc, fs, rate, level_label) "
+                    "SELECT ?, song_id, level_index, qq, achievements, fc, fs, rate, level_label "
+                    "FROM chart_scores WHERE qq = ?",
+                    (group_id, qq)
+                )
+                self._trim_leaderboards(cursor, group_id)
+                self._bump_scores_version(cursor, group_id=group_id)
+                self._bump_version(cursor, "scores")
             
             conn.commit()
             logger.info(f"用户 {qq} 已加入群组 {group_id} 的排行榜")
@@ -337,6 +619,23 @@ class Database:
                 "DELETE FROM user_groups WHERE qq = ? AND group_id = ?",
                 (qq, group_id)
             )
+            if cursor.rowcount:
+                self._bump_scores_version(cursor, group_id=group_id)
+                self._bump_version(cursor, "scores")
+            
+            # 从群排行榜中移除，并由其他成员补上空出的名次
+            cursor.execute(
+                "SELECT song_id, level_index FROM group_leaderboards WHERE group_id = ? AND qq = ?",
+                (group_id, qq)
+            )
+            charts = [(row["song_id"], row["level_index"]) for row in cursor.fetchall()]
+            cursor.execute(
+                "DELETE FROM group_leaderboards WHERE group_id = ? AND qq = ?",
+                (group_id, qq)
+            )
+            for song_id, level_index in charts:
+                self._refill_leaderboard(cursor, group_id, song_id, level_index)
+            
             conn.commit()
             logger.info(f"用户 {qq} 已从群组 {group_id} 的排行榜中退出")
         except Exception as e:
@@ -441,8 +740,9 @@ class Database:
                 # 添加到待清理记录的用户集合中
                 users_to_clean_records.update(group_users)
                 
-                # 删除群组中的用户关系
+                # 删除群组中的用户关系和群排行榜
                 cursor.execute("DELETE FROM user_groups WHERE group_id = ?", (group_id,))
+                cursor.execute("DELETE FROM group_leaderboards WHERE group_id = ?", (group_id,))
                 
                 # 删除群组记录
                 cursor.execute("DELETE FROM groups WHERE group_id = ?", (group_id,))
@@ -459,9 +759,15 @@ class Database:
             users_to_delete_records = users_to_clean_records - remaining_users
             for user_qq in users_to_delete_records:
                 cursor.execute("DELETE FROM records WHERE qq = ?", (user_qq,))
+                cursor.execute("DELETE FROM chart_scores WHERE qq = ?", (user_qq,))
+                cursor.execute("DELETE FROM refresh_state WHERE qq = ?", (user_qq,))
+                cursor.execute("DELETE FROM refresh_jobs WHERE qq = ?", (user_qq,))
                 logger.info(f"已清理用户 {user_qq} 的成绩记录")
             
+            self._bump_version(cursor, "groups")
+            self._bump_version(cursor, "scores")
             conn.commit()
+            self.invalidate_group_settings()
             logger.info(f"共清理了 {cleaned_count} 个已退出群组的数据")
             logger.info(f"共清理了 {len(users_to_delete_records)} 个用户的记录数据")
             return cleaned_count
@@ -472,24 +778,562 @@ class Database:
         finally:
             conn.close()
     
+    # ==================== 群排行榜 ====================
+    
+    # 谱面成绩中用于排行榜的字段
+    _CHART_FIELDS = "achievements, fc, fs, rate, level_label"
+    
+    def _sync_chart_scores(
+        self, cursor: sqlite3.Cursor, qq: str, records: dict
+    ) -> Tuple[Dict[Tuple[int, int], tuple], List[Tuple[int, int]]]:
+        """把用户成绩同步到 chart_scores
+        
+        Returns:
+            (新增或变化的谱面, 需要重新补全排行榜的谱面（成绩下降或被删除）)
+        """
+        cursor.execute(
+            f"SELECT song_id, level_index, {self._CHART_FIELDS} FROM chart_scores WHERE qq = ?",
+            (qq,)
+        )
+        old = {
+            (row["song_id"], row["level_index"]): (
+                row["achievements"], row["fc"], row["fs"], row["rate"], row["level_label"]
+            )
+            for row in cursor.fetchall()
+        }
+        new = codec.chart_rows(records)
+        
+        changed = {key: value for key, value in new.items() if old.get(key) != value}
+        removed = [key for key in old if key not in new]
+        refill = removed + [key for key, value in changed.items() if key in old and value[0] < old[key][0]]
+        
+        if changed:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO chart_scores (qq, song_id, level_index, {self._CHART_FIELDS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(qq, song_id, level_index, *value) for (song_id, level_index), value in changed.items()]
+            )
+        if removed:
+            cursor.executemany(
+                "DELETE FROM chart_scores WHERE qq = ? AND song_id = ? AND level_index = ?",
+                [(qq, song_id, level_index) for song_id, level_index in removed]
+            )
+        return changed, refill
+    
+    def _update_leaderboards(
+        self,
+        cursor: sqlite3.Cursor,
+        qq: str,
+        changed: Dict[Tuple[int, int], tuple],
+        refill: List[Tuple[int, int]],
+    ):
+        """在用户所在的每个群中增量更新变化谱面的排行榜"""
+        cursor.execute("SELECT group_id FROM user_groups WHERE qq = ?", (qq,))
+        group_ids = [row["group_id"] for row in cursor.fetchall()]
+        refill_keys = set(refill)
+        for group_id in group_ids:
+            # 成绩提升或新增的谱面：先写入再裁剪到前 N 名
+            upserts = [
+                (group_id, song_id, level_index, qq, *value)
+                for (song_id, level_index), value in changed.items()
+                if (song_id, level_index) not in refill_keys
+            ]
+            if upserts:
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO group_leaderboards "
+                    f"(group_id, song_id, level_index, qq, {self._CHART_FIELDS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    upserts
+                )
+                self._trim_leaderboards(cursor, group_id, [(row[1], row[2]) for row in upserts])
+            # 成绩下降或删除的谱面：重新从 chart_scores 取前 N 名
+            for song_id, level_index in refill_keys:
+                self._refill_leaderboard(cursor, group_id, song_id, level_index)
+    
+    def _refill_leaderboard(self, cursor: sqlite3.Cursor, group_id: str, song_id: int, level_index: int):
+        """重新计算某个群某张谱面的排行榜"""
+        cursor.execute(
+            "DELETE FROM group_leaderboards WHERE group_id = ? AND song_id = ? AND level_index = ?",
+            (group_id, song_id, level_index)
+        )
+        cursor.execute(
+            "INSERT INTO group_leaderboards "
+            f"(group_id, song_id, level_index, qq, {self._CHART_FIELDS}) "
+            "SELECT ug.group_id, cs.song_id, cs.level_index, cs.qq, "
+            "cs.achievements, cs.fc, cs.fs, cs.rate, cs.level_label "
+            "FROM chart_scores cs JOIN user_groups ug ON ug.qq = cs.qq "
+            "WHERE ug.group_id = ? AND cs.song_id = ? AND cs.level_index = ? "
+            "ORDER BY cs.achievements DESC, cs.qq LIMIT ?",
+            (group_id, song_id, level_index, self.leaderboard_size)
+        )
+    
+    def _trim_leaderboards(
+        self,
+        cursor: sqlite3.Cursor,
+        group_id: str,
+        keys: Optional[Iterable[Tuple[int, int]]] = None,
+    ):
+        """删除群排行榜中超出名次上限的记录
+        
+        Args:
+            keys: 只裁剪这些谱面 (song_id, level_index)；为 None 时裁剪整个群
+        """
+        if keys is not None:
+            # 按主键前缀逐张谱面裁剪，只扫描受影响谱面的前 N+1 名
+            cursor.executemany(
+                "DELETE FROM group_leaderboards "
+                "WHERE group_id = ? AND song_id = ? AND level_index = ? AND qq NOT IN ("
+                "  SELECT qq FROM group_leaderboards "
+                "  WHERE group_id = ? AND song_id = ? AND level_index = ? "
+                "  ORDER BY achievements DESC, qq LIMIT ?"
+                ")",
+                [
+                    (group_id, song_id, level_index, group_id, song_id, level_index, self.leaderboard_size)
+                    for song_id, level_index in keys
+                ]
+            )
+            return
+        cursor.execute(
+            "DELETE FROM group_leaderboards WHERE rowid IN ("
+            "  SELECT rowid FROM ("
+            "    SELECT rowid, ROW_NUMBER() OVER ("
+            "      PARTITION BY song_id, level_index ORDER BY achievements DESC, qq"
+            "    ) AS position FROM group_leaderboards WHERE group_id = ?"
+            "  ) WHERE position > ?"
+            ")",
+            (group_id, self.leaderboard_size)
+        )
+    
+    def get_group_leaderboard(self, group_id: str, song_id: int, level_index: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取群排行榜
+        
+        Args:
+            group_id: 群号
+            song_id: 歌曲 ID
+            level_index: 难度，None 表示群内有人游玩过的最高难度
+        
+        Returns:
+            按达成率降序排列的成绩列表
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            if level_index is None:
+                cursor.execute(
+                    "SELECT MAX(level_index) AS level_index FROM group_leaderboards "
+                    "WHERE group_id = ? AND song_id = ?",
+                    (group_id, song_id)
+                )
+                row = cursor.fetchone()
+                if row is None or row["level_index"] is None:
+                    return []
+                level_index = row["level_index"]
+            
+            cursor.execute(
+                f"SELECT qq, level_index, {self._CHART_FIELDS} FROM group_leaderboards "
+                "WHERE group_id = ? AND song_id = ? AND level_index = ? "
+                "ORDER BY achievements DESC, qq",
+                (group_id, song_id, level_index)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"读取群 {group_id} 的排行榜失败: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def get_group_scores_version(self, group_id: str) -> Optional[int]:
+        """获取群成绩版本号，群不存在时返回 None"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT scores_version FROM groups WHERE group_id = ?", (group_id,))
+            row = cursor.fetchone()
+            return row["scores_version"] if row else None
+        except Exception as e:
+            logger.error(f"获取群 {group_id} 的成绩版本失败: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_group_chart_scores(self, group_id: str) -> Tuple[Optional[int], List[Tuple[str, int, int, float, str]]]:
+        """获取群内所有成员的谱面达成率
+        
+        Returns:
+            (群成绩版本号, [(qq, 歌曲ID, 难度, 达成率, FC)])，在同一个读事务中读取
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT scores_version FROM groups WHERE group_id = ?", (group_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None, []
+            cursor.execute(
+                "SELECT cs.qq, cs.song_id, cs.level_index, cs.achievements, cs.fc "
+                "FROM chart_scores cs JOIN user_groups ug ON ug.qq = cs.qq "
+                "WHERE ug.group_id = ?",
+                (group_id,)
+            )
+            scores = [tuple(score) for score in cursor.fetchall()]
+            return row["scores_version"], scores
+        except Exception as e:
+            logger.error(f"获取群 {group_id} 的谱面成绩失败: {e}")
+            return None, []
+        finally:
+            conn.close()
+    
+    # 已启用群中加入排行榜的玩家（去重），附带其所在的一个群号
+    _GLOBAL_PLAYERS = (
+        "SELECT ug.qq, MIN(ug.group_id) AS group_id "
+        "FROM user_groups ug JOIN groups g ON g.group_id = ug.group_id "
+        "WHERE g.enabled = 1 GROUP BY ug.qq"
+    )
+    
+    def _get_global_cached(self, key: tuple, query: str, params: tuple) -> List[Dict[str, Any]]:
+        """执行全局排行榜查询，结果按成绩和群组版本号缓存（群组启用状态决定参与的玩家）"""
+        versions = self.get_cache_versions()
+        version = (versions.get("scores", 0), versions.get("groups", 0))
+        cache_key = key + (version,)
+        result = self._global_cache.get(cache_key)
+        if result is not None:
+            return result
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(query, params)
+            result = [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"查询全局排行榜 {key} 失败: {e}")
+            return []
+        finally:
+            conn.close()
+        
+        # 旧版本的结果不会再被命中，直接清掉
+        self._global_cache.invalidate_where(lambda cached: cached[-1] != version)
+        self._global_cache.set(cache_key, result)
+        return result
+    
+    def get_global_chart_leaderboard(self, song_id: int, level_index: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """全局谱面排行榜：所有已启用群中加入排行榜的玩家，每人只计一次
+        
+        Returns:
+            按达成率降序排列的成绩，每项额外包含玩家所在的一个群号 group_id（用于显示群昵称）
+        """
+        return self._get_global_cached(
+            ("chart", song_id, level_index, limit),
+            "SELECT cs.qq, cs.level_index, cs.achievements, cs.fc, cs.fs, cs.rate, cs.level_label, "
+            "players.group_id "
+            f"FROM chart_scores cs JOIN ({self._GLOBAL_PLAYERS}) players ON players.qq = cs.qq "
+            "WHERE cs.song_id = ? AND cs.level_index = ? "
+            "ORDER BY cs.achievements DESC, cs.qq LIMIT ?",
+            (song_id, level_index, limit)
+        )
+    
+    def get_global_rating_leaderboard(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """全局 Rating 排行榜：所有已启用群中加入排行榜的玩家，每人只计一次
+        
+        Returns:
+            按 Rating 降序排列的列表，每项包含 qq、rating 和玩家所在的一个群号 group_id
+        """
+        return self._get_global_cached(
+            ("rating", limit),
+            "SELECT r.qq, r.rating, players.group_id "
+            f"FROM records r JOIN ({self._GLOBAL_PLAYERS}) players ON players.qq = r.qq "
+            "ORDER BY r.rating DESC, r.qq LIMIT ?",
+            (limit,)
+        )
+    
+    def rebuild_leaderboards(self) -> Dict[str, int]:
+        """从 records 重新生成 chart_scores 和所有群排行榜
+        
+        Returns:
+            {"users": 用户数, "skipped": 成绩数据解析失败的用户数,
+             "rows": 排行榜记录数, "mismatched": 与重建前不一致的记录数}
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                f"SELECT group_id, song_id, level_index, qq, {self._CHART_FIELDS} FROM group_leaderboards"
+            )
+            before = {tuple(row) for row in cursor.fetchall()}
+            
+            # 只清理已没有成绩记录的用户，其余用户逐个替换，解析失败的保留原有谱面成绩
+            cursor.execute("DELETE FROM chart_scores WHERE qq NOT IN (SELECT qq FROM records)")
+            cursor.execute("SELECT qq, data FROM records")
+            rows = cursor.fetchall()
+            users = 0
+            skipped = 0
+            for row in rows:
+                # 只需要 Rating 和谱面成绩，直接按结构解析
+                try:
+                    rating, charts = codec.decode_records_summary(self._decode_payload(row["data"]))
+                except (KeyError, ValueError) as e:
+                    logger.warning(f"解析用户 {row['qq']} 的成绩数据失败，保留原有谱面成绩: {e}")
+                    skipped += 1
+                    continue
+                cursor.execute(
+                    "UPDATE records SET rating = ? WHERE qq = ?",
+                    (rating, row["qq"])
+                )
+                cursor.execute("DELETE FROM chart_scores WHERE qq = ?", (row["qq"],))
+                cursor.executemany(
+                    f"INSERT OR REPLACE INTO chart_scores (qq, song_id, level_index, {self._CHART_FIELDS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (row["qq"], song_id, level_index, *value)
+                        for (song_id, level_index), value in charts.items()
+                    ]
+                )
+                users += 1
+            
+            cursor.execute("DELETE FROM group_leaderboards")
+            cursor.execute(
+                "INSERT INTO group_leaderboards "
+                f"(group_id, song_id, level_index, qq, {self._CHART_FIELDS}) "
+                f"SELECT group_id, song_id, level_index, qq, {self._CHART_FIELDS} FROM ("
+                "  SELECT ug.group_id, cs.*, ROW_NUMBER() OVER ("
+                "    PARTITION BY ug.group_id, cs.song_id, cs.level_index "
+                "    ORDER BY cs.achievements DESC, cs.qq"
+                "  ) AS position "
+                "  FROM chart_scores cs JOIN user_groups ug ON ug.qq = cs.qq"
+                ") WHERE position <= ?",
+                (self.leaderboard_size,)
+            )
+            
+            cursor.execute(
+                f"SELECT group_id, song_id, level_index, qq, {self._CHART_FIELDS} FROM group_leaderboards"
+            )
+            after = {tuple(row) for row in cursor.fetchall()}
+            cursor.execute("UPDATE groups SET scores_version = scores_version + 1")
+            self._bump_version(cursor, "scores")
+            conn.commit()
+            
+            result = {
+                "users": users,
+                "skipped": skipped,
+                "rows": len(after),
+                "mismatched": len(before ^ after),
+            }
+            logger.info(f"群排行榜重建完成: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"重建群排行榜失败: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    # ==================== 成绩数据压缩 ====================
+    
+    def _load_payload_dictionaries(self):
+        """从数据库加载压缩字典"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT id, algorithm, data FROM payload_dicts")
+            self.compressor.load_dictionaries(
+                (row["id"], row["algorithm"], row["data"]) for row in cursor.fetchall()
+            )
+        except Exception as e:
+            logger.error(f"加载压缩字典失败: {e}")
+        finally:
+            conn.close()
+    
+    def _encode_payload(self, records: dict) -> StoredPayload:
+        """序列化并压缩成绩数据"""
+        return self.compressor.compress(codec.dumps(records))
+    
+    def _decode_payload(self, data: StoredPayload) -> str:
+        """解压成绩数据原文（未压缩的旧数据原样返回）"""
+        try:
+            return self.compressor.decompress(data)
+        except KeyError:
+            # 其他进程训练了新字典，重新加载后再试
+            self._load_payload_dictionaries()
+            return self.compressor.decompress(data)
+    
+    def train_payload_dictionary(self, sample_size: int = 300) -> Optional[int]:
+        """随机抽取成绩数据训练新的压缩字典，之后写入的数据使用新字典
+        
+        Returns:
+            新字典的 ID，样本不足或训练失败时返回 None
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT data FROM records ORDER BY RANDOM() LIMIT ?", (sample_size,))
+            samples = []
+            for row in cursor.fetchall():
+                try:
+                    samples.append(self._decode_payload(row["data"]))
+                except (KeyError, ValueError):
+                    continue
+            
+            dictionary = self.compressor.train(samples)
+            if not dictionary:
+                return None
+            cursor.execute(
+                "INSERT INTO payload_dicts (algorithm, data, created_at) VALUES (?, ?, ?)",
+                (self.compressor.algorithm, dictionary, datetime.now().isoformat())
+            )
+            dict_id = cursor.lastrowid
+            conn.commit()
+            logger.info(f"已用 {len(samples)} 份成绩数据训练压缩字典 {dict_id}（{len(dictionary) / 1024:.1f} KB）")
+        except Exception as e:
+            logger.error(f"训练压缩字典失败: {e}")
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+        
+        self._load_payload_dictionaries()
+        return dict_id
+    
+    def recompress_records(self, batch_size: int = 200) -> Dict[str, int]:
+        """用当前算法和字典重新压缩所有成绩数据
+        
+        与刷新并发时，只有读取之后没有被覆盖（updated_at 未变）的记录才会写回。
+        
+        Returns:
+            {"rows": 写回的记录数, "before": 压缩前总字节数, "after": 压缩后总字节数}
+        """
+        result = {"rows": 0, "before": 0, "after": 0}
+        after_qq = ""
+        while True:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute(
+                    "SELECT qq, data, updated_at FROM records WHERE qq > ? ORDER BY qq LIMIT ?",
+                    (after_qq, batch_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for row in rows:
+                    data = row["data"]
+                    try:
+                        text = self._decode_payload(data)
+                    except (KeyError, ValueError) as e:
+                        logger.warning(f"解压用户 {row['qq']} 的成绩数据失败: {e}")
+                        continue
+                    compressed = self.compressor.compress(text)
+                    result["before"] += len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+                    result["after"] += len(compressed.encode("utf-8")) if isinstance(compressed, str) else len(compressed)
+                    updates.append((compressed, row["qq"], row["updated_at"]))
+                cursor.executemany(
+                    "UPDATE records SET data = ? WHERE qq = ? AND updated_at = ?",
+                    updates
+                )
+                result["rows"] += len(updates)
+                conn.commit()
+                after_qq = rows[-1]["qq"]
+            except Exception as e:
+                logger.error(f"重新压缩成绩数据失败: {e}")
+                conn.rollback()
+                break
+            finally:
+                conn.close()
+        return result
+    
+    def vacuum(self) -> Tuple[int, int]:
+        """整理数据库文件，回收压缩后空出的页面
+        
+        Returns:
+            (整理前文件大小, 整理后文件大小)
+        """
+        conn = self._get_connection()
+        before = self.db_file.stat().st_size
+        try:
+            conn.execute("VACUUM")
+        except Exception as e:
+            logger.error(f"整理数据库文件失败: {e}")
+        finally:
+            conn.close()
+        return before, self.db_file.stat().st_size
+    
     # ==================== 成绩管理 ====================
     
+    @staticmethod
+    def _records_hash(records: dict) -> str:
+        """计算成绩的指纹，只包含玩家可以改变的字段（不含 ds/ra 等会随定数变化的字段）"""
+        charts = sorted(
+            (
+                record.get("song_id", 0),
+                record.get("level_index", 0),
+                record.get("achievements", 0),
+                record.get("fc", ""),
+                record.get("fs", ""),
+                record.get("dxScore", 0),
+            )
+            for record in records.get("records", []) or []
+        )
+        # 固定使用标准库序列化，切换 JSON 后端不会改变已保存的指纹
+        return hashlib.sha1(json.dumps(charts).encode("utf-8")).hexdigest()
+    
     def update_user_records(self, qq: str, records: dict):
-        """更新用户成绩"""
+        """更新用户成绩，并记录成绩是否发生了实际变化"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
         try:
-            # 将 records 转换为 JSON 字符串存储
-            data_json = json.dumps(records, ensure_ascii=False)
+            # 将 records 序列化并压缩后存储
+            payload = self._encode_payload(records)
             updated_at = datetime.now().isoformat()
             
+            rating = codec.records_rating(records)
+            cursor.execute("SELECT rating FROM records WHERE qq = ?", (qq,))
+            row = cursor.fetchone()
+            rating_changed = row is None or row["rating"] != rating
+            
             # 使用 INSERT OR REPLACE 来更新或插入
             cursor.execute(
-                "INSERT OR REPLACE INTO records (qq, data, updated_at) VALUES (?, ?, ?)",
-                (qq, data_json, updated_at)
+                "INSERT OR REPLACE INTO records (qq, data, updated_at, rating) VALUES (?, ?, ?, ?)",
+                (qq, payload, updated_at, rating)
             )
             
+            # 同步谱面成绩，并增量更新用户所在群的排行榜
+            changed, refill = self._sync_chart_scores(cursor, qq, records)
+            if changed or refill:
+                self._update_leaderboards(cursor, qq, changed, refill)
+                self._bump_scores_version(cursor, qq=qq)
+            if changed or refill or rating_changed:
+                self._bump_version(cursor, "scores")
+            
+            # 更新自适应刷新状态
+            payload_hash = self._records_hash(records)
+            cursor.execute(
+                "SELECT payload_hash FROM refresh_state WHERE qq = ?",
+                (qq,)
+            )
+            row = cursor.fetchone()
+            if row is None or row["payload_hash"] != payload_hash:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO refresh_state "
+                    "(qq, payload_hash, last_changed_at, last_checked_at, unchanged_streak) "
+                    "VALUES (?, ?, ?, ?, 0)",
+                    (qq, payload_hash, updated_at, updated_at)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE refresh_state SET last_checked_at = ?, "
+                    "unchanged_streak = unchanged_streak + 1 WHERE qq = ?",
+                    (updated_at, qq)
+                )
+            
             conn.commit()
             logger.info(f"用户 {qq} 的成绩已更新")
         except Exception as e:
@@ -510,7 +1354,7 @@ class Database:
             )
             row = cursor.fetchone()
             if row:
-                return json.loads(row["data"])
+                return codec.loads(self._decode_payload(row["data"]))
             return None
         except Exception as e:
             logger.error(f"获取用户 {qq} 的成绩失败: {e}")
@@ -518,6 +1362,104 @@ class Database:
         finally:
             conn.close()
     
+    def get_group_ratings(self, group_id: str) -> List[Tuple[str, int]]:
+        """获取群内有成绩记录的用户的 Rating"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT r.qq, r.rating FROM records r "
+                "JOIN user_groups ug ON ug.qq = r.qq WHERE ug.group_id = ?",
+                (group_id,)
+            )
+            return [(row["qq"], row["rating"]) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取群 {group_id} 的 Rating 失败: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def get_sample_records_payload(self) -> Optional[str]:
+        """获取最大的一份成绩数据原文（用于 JSON 编解码测试）"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT data FROM records ORDER BY LENGTH(data) DESC LIMIT 1")
+            row = cursor.fetchone()
+            return self._decode_payload(row["data"]) if row else None
+        except Exception as e:
+            logger.error(f"获取成绩数据样本失败: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_records_batch(self, after_qq: str = "", limit: int = 200) -> List[Tuple[str, dict, str]]:
+        """按 QQ 顺序分批读取成绩
+        
+        Args:
+            after_qq: 从该 QQ 之后开始读取
+            limit: 每批数量
+        
+        Returns:
+            (qq, 成绩数据, 更新时间) 列表
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT qq, data, updated_at FROM records WHERE qq > ? ORDER BY qq LIMIT ?",
+                (after_qq, limit)
+            )
+            result = []
+            for row in cursor.fetchall():
+                try:
+                    result.append((row["qq"], codec.loads(self._decode_payload(row["data"])), row["updated_at"]))
+                except (KeyError, ValueError):
+                    logger.warning(f"用户 {row['qq']} 的成绩数据无法解析，跳过")
+            return result
+        except Exception as e:
+            logger.error(f"批量读取成绩失败: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def update_recomputed_records(self, items: Iterable[Tuple[str, dict, str]]) -> int:
+        """写回本地重新计算的成绩
+        
+        只有在读取之后没有被刷新覆盖（updated_at 未变）的记录才会写入，
+        不改变更新时间和自适应刷新状态。
+        
+        Args:
+            items: (qq, 成绩数据, 读取时的更新时间) 列表
+        
+        Returns:
+            int: 实际写入的数量
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            count = 0
+            for qq, records, updated_at in items:
+                cursor.execute(
+                    "UPDATE records SET data = ?, rating = ? WHERE qq = ? AND updated_at = ?",
+                    (self._encode_payload(records), codec.records_rating(records), qq, updated_at)
+                )
+                count += cursor.rowcount
+            if count:
+                self._bump_version(cursor, "scores")
+            conn.commit()
+            return count
+        except Exception as e:
+            logger.error(f"写回重新计算的成绩失败: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
     def get_last_update_time(self, qq: str) -> Optional[str]:
         """获取用户成绩的最后更新时间"""
         conn = self._get_connection()
@@ -536,6 +1478,42 @@ class Database:
         finally:
             conn.close()
     
+    def get_refresh_state(self, qq: str) -> Optional[Dict[str, Any]]:
+        """获取用户的自适应刷新状态"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT last_changed_at, last_checked_at, unchanged_streak "
+                "FROM refresh_state WHERE qq = ?",
+                (qq,)
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"获取用户 {qq} 的刷新状态失败: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def reset_refresh_backoff(self, qq: str):
+        """重置用户的自适应刷新退避（手动刷新后调用）"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "UPDATE refresh_state SET unchanged_streak = 0 WHERE qq = ?",
+                (qq,)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"重置用户 {qq} 的刷新退避失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
     def get_daily_refresh_count(self, qq: str, date: str) -> int:
         """获取用户指定日期的刷新次数"""
         conn = self._get_connection()
@@ -591,6 +1569,137 @@ class Database:
         finally:
             conn.close()
 
+    # ==================== 刷新任务队列 ====================
+    
+    def enqueue_refresh_jobs(self, jobs: Iterable[Tuple[str, str, int, str]]) -> int:
+        """批量加入刷新任务
+        
+        同一用户已有待处理任务时合并：保留更高的优先级和更早的执行时间，
+        优先级提升时重置重试次数。
+        
+        Args:
+            jobs: (qq, reason, priority, next_attempt_at) 列表
+            
+        Returns:
+            int: 写入的任务数
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            now = datetime.now().isoformat()
+            rows = [(qq, reason, priority, next_attempt_at, now) for qq, reason, priority, next_attempt_at in jobs]
+            cursor.executemany(
+                """
+                INSERT INTO refresh_jobs (qq, reason, priority, attempts, next_attempt_at, created_at)
+                VALUES (?, ?, ?, 0, ?, ?)
+                ON CONFLICT(qq) DO UPDATE SET
+                    reason = CASE WHEN excluded.priority > priority THEN excluded.reason ELSE reason END,
+                    attempts = CASE WHEN excluded.priority > priority THEN 0 ELSE attempts END,
+                    priority = MAX(priority, excluded.priority),
+                    next_attempt_at = MIN(next_attempt_at, excluded.next_attempt_at)
+                """,
+                rows
+            )
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"加入刷新任务失败: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    def get_queued_refresh_users(self, users: Iterable[str]) -> Set[str]:
+        """获取在刷新队列中有任务的用户（查询失败时视为都在队列中）"""
+        users = list(users)
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            queued = set()
+            for start in range(0, len(users), 500):
+                chunk = users[start:start + 500]
+                cursor.execute(
+                    f"SELECT qq FROM refresh_jobs WHERE qq IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                queued.update(row["qq"] for row in cursor.fetchall())
+            return queued
+        except Exception as e:
+            logger.error(f"查询刷新任务失败: {e}")
+            return set(users)
+        finally:
+            conn.close()
+    
+    def get_due_refresh_jobs(self, now: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取已到执行时间的刷新任务（按优先级、执行时间排序）"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT qq, reason, priority, attempts, next_attempt_at FROM refresh_jobs "
+                "WHERE next_attempt_at <= ? ORDER BY priority DESC, next_attempt_at LIMIT ?",
+                (now, limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取刷新任务失败: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def complete_refresh_job(self, qq: str, reason: str):
+        """完成（移除）刷新任务
+        
+        只移除原因相同的任务：处理期间任务被更高优先级的请求合并时，
+        合并后的任务会保留并再次处理。
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM refresh_jobs WHERE qq = ? AND reason = ?", (qq, reason))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"移除用户 {qq} 的刷新任务失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def retry_refresh_job(self, qq: str, reason: str, next_attempt_at: str, error: str = ""):
+        """记录一次失败，并推迟刷新任务到下次重试时间"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "UPDATE refresh_jobs SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? "
+                "WHERE qq = ? AND reason = ?",
+                (next_attempt_at, error, qq, reason)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"推迟用户 {qq} 的刷新任务失败: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def get_refresh_job_counts(self) -> Dict[str, int]:
+        """按原因统计待处理的刷新任务数量"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT reason, COUNT(*) AS count FROM refresh_jobs GROUP BY reason")
+            return {row["reason"]: row["count"] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"统计刷新任务失败: {e}")
+            return {}
+        finally:
+            conn.close()
+
     # ==================== 自定义别名管理 ====================
     def add_custom_alias(self, song_id: int, alias: str) -> bool:
         """新增自定义别名"""
@@ -605,6 +1714,7 @@ class Database:
                 "INSERT INTO custom_alias (song_id, alias, created_at, updated_at) VALUES (?, ?, ?, ?)",
                 (int(song_id), alias, now, now)
             )
+            self._bump_version(cursor, "custom_alias")
             conn.commit()
             logger.info(f"为歌曲 {song_id} 新增自定义别名: {alias}")
             return True
@@ -633,6 +1743,7 @@ class Database:
             )
             removed = cursor.rowcount > 0
             if removed:
+                self._bump_version(cursor, "custom_alias")
                 conn.commit()
                 logger.info(f"移除歌曲 {song_id} 的自定义别名: {alias}")
             else:
@@ -0,0 +1,289 @@
+"""群成绩索引模块 - 按群缓存的谱面成绩内存索引"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import BoundedCache
+from .database import Database
+
+ChartKey = Tuple[int, int]
+
+# SSS+ 的达成率下限
+SSS_PLUS_ACHIEVEMENTS = 100.5
+# 计入 AP 的 FC 状态
+AP_STATUSES = ("ap", "app")
+
+
+class GroupRankIndex:
+    """群内每张谱面的有序达成率数组
+
+    每个群缓存一份 (歌曲ID, 难度) -> 升序排列的负达成率列表，
+    查询玩家在某张谱面的名次只需一次二分查找，查询玩家全部谱面的名次
+    为 O(谱面数 × log 成员数)，不再需要逐个解析成员的成绩 JSON。
+
+    群成员变化或成员成绩变化时数据库中的群成绩版本号会递增，
+    读取时版本号不一致即重新构建，多进程部署下同样有效。
+    """
+
+    def __init__(self, db: Database, max_groups: int = 64):
+        self.db = db
+        # group_id -> (版本号, 谱面 -> 有序负达成率, qq -> [(谱面, 达成率)])
+        self._cache = BoundedCache("group_index.ranks", max_items=max_groups)
+
+    def _build(self, group_id: str) -> Optional[tuple]:
+        version, scores = self.db.get_group_chart_scores(group_id)
+        if version is None:
+            return None
+        charts: Dict[ChartKey, List[float]] = {}
+        players: Dict[str, List[Tuple[ChartKey, float]]] = {}
+        for qq, song_id, level_index, achievements, _ in scores:
+            key = (song_id, level_index)
+            charts.setdefault(key, []).append(-achievements)
+            players.setdefault(qq, []).append((key, achievements))
+        for values in charts.values():
+            values.sort()
+        entry = (version, charts, players)
+        self._cache.set(group_id, entry)
+        return entry
+
+    def _get(self, group_id: str) -> Optional[tuple]:
+        entry = self._cache.get(group_id)
+        if entry is not None and entry[0] == self.db.get_group_scores_version(group_id):
+            return entry
+        return self._build(group_id)
+
+    def invalidate(self, group_id: Optional[str] = None):
+        """使指定（默认全部）群的索引失效"""
+        if group_id is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate(group_id)
+
+    def chart_rank(self, group_id: str, song_id: int, level_index: int, achievements: float) -> Tuple[int, int]:
+        """查询某个达成率在群内某张谱面的名次
+
+        Returns:
+            (名次, 游玩人数)，达成率相同的玩家名次相同
+        """
+        entry = self._get(group_id)
+        if entry is None:
+            return 0, 0
+        values = entry[1].get((song_id, level_index), [])
+        return bisect_left(values, -achievements) + 1, len(values)
+
+    def player_ranks(self, group_id: str, qq: str) -> List[Dict[str, Any]]:
+        """查询玩家在群内所有已游玩谱面的名次
+
+        Returns:
+            按名次、达成率排序的列表，每项包含 song_id、level_index、achievements、rank、total
+        """
+        entry = self._get(group_id)
+        if entry is None:
+            return []
+        _, charts, players = entry
+        result = []
+        for key, achievements in players.get(qq, []):
+            values = charts[key]
+            result.append({
+                "song_id": key[0],
+                "level_index": key[1],
+                "achievements": achievements,
+                "rank": bisect_left(values, -achievements) + 1,
+                "total": len(values),
+            })
+        result.sort(key=lambda item: (item["rank"], -item["achievements"]))
+        return result
+
+
+class ScoreMatrix:
+    """一个群的成绩矩阵（成员 × 谱面），未游玩的位置为 NaN"""
+
+    __slots__ = ("version", "members", "charts", "chart_index", "achievements", "ap")
+
+    def __init__(self, version: int, scores: List[Tuple[str, int, int, float, str]]):
+        self.version = version
+        self.members: List[str] = sorted({score[0] for score in scores})
+        self.charts: List[ChartKey] = sorted({(score[1], score[2]) for score in scores})
+        self.chart_index: Dict[ChartKey, int] = {key: i for i, key in enumerate(self.charts)}
+        member_index = {qq: i for i, qq in enumerate(self.members)}
+
+        rows = np.fromiter((member_index[score[0]] for score in scores), dtype=np.int64, count=len(scores))
+        cols = np.fromiter((self.chart_index[(score[1], score[2])] for score in scores), dtype=np.int64, count=len(scores))
+        shape = (len(self.members), len(self.charts))
+        self.achievements = np.full(shape, np.nan, dtype=np.float32)
+        self.achievements[rows, cols] = np.fromiter((score[3] for score in scores), dtype=np.float32, count=len(scores))
+        self.ap = np.zeros(shape, dtype=bool)
+        self.ap[rows, cols] = np.fromiter((score[4] in AP_STATUSES for score in scores), dtype=bool, count=len(scores))
+
+    @property
+    def nbytes(self) -> int:
+        return self.achievements.nbytes + self.ap.nbytes
+
+
+class GroupScoreMatrix:
+    """按群缓存的成绩矩阵，用于群内统计
+
+    所有统计都是对整列或整个矩阵的向量运算。缓存按最近使用淘汰，
+    只有活跃的群常驻内存；失效方式与 GroupRankIndex 相同（比较群成绩版本号）。
+    """
+
+    def __init__(self, db: Database, max_groups: int = 16):
+        self.db = db
+        self._cache = BoundedCache(
+            "group_index.matrix",
+            max_items=max_groups,
+            sizeof=lambda matrix: matrix.nbytes,
+        )
+
+    def get(self, group_id: str) -> Optional[ScoreMatrix]:
+        """获取群成绩矩阵，群不存在或没有成绩时返回 None"""
+        matrix = self._cache.get(group_id)
+        if matrix is not None and matrix.version == self.db.get_group_scores_version(group_id):
+            return matrix
+        version, scores = self.db.get_group_chart_scores(group_id)
+        if version is None or not scores:
+            self._cache.invalidate(group_id)
+            return None
+        matrix = ScoreMatrix(version, scores)
+        self._cache.set(group_id, matrix)
+        return matrix
+
+    def invalidate(self, group_id: Optional[str] = None):
+        """使指定（默认全部）群的矩阵失效"""
+        if group_id is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate(group_id)
+
+    def chart_stats(self, group_id: str, song_id: int, level_index: int) -> Optional[Dict[str, Any]]:
+        """单张谱面的群内统计：人数、平均值、分位数、SSS+ 与 AP 人数"""
+        matrix = self.get(group_id)
+        if matrix is None or (song_id, level_index) not in matrix.chart_index:
+            return None
+        column = matrix.chart_index[(song_id, level_index)]
+        values = matrix.achievements[:, column]
+        values = values[~np.isnan(values)].astype(np.float64)
+        p10, median, p90 = np.percentile(values, [10, 50, 90])
+        return {
+            "players": int(values.size),
+            "mean": float(values.mean()),
+            "median": float(median),
+            "p10": float(p10),
+            "p90": float(p90),
+            "max": float(values.max()),
+            "sss_plus": int(np.count_nonzero(values >= SSS_PLUS_ACHIEVEMENTS)),
+            "ap": int(np.count_nonzero(matrix.ap[:, column])),
+        }
+
+    def level_stats(self, group_id: str, chart_levels: Dict[ChartKey, str]) -> List[Dict[str, Any]]:
+        """按等级（例如 13+）统计游玩次数、SSS+ 与 AP 数量
+
+        Args:
+            group_id: 群号
+            chart_levels: 谱面 -> 等级，不在其中的谱面（例如宴谱）不参与统计
+
+        Returns:
+            按等级从低到高排列的列表
+        """
+        matrix = self.get(group_id)
+        if matrix is None:
+            return []
+        labels = sorted(set(chart_levels.values()), key=_level_sort_key)
+        label_index = {label: i for i, label in enumerate(labels)}
+        # 每张谱面所属等级，未知等级为 -1
+        chart_label = np.array(
+            [label_index.get(chart_levels.get(key), -1) for key in matrix.charts],
+            dtype=np.int64,
+        )
+        known = chart_label >= 0
+
+        played = ~np.isnan(matrix.achievements)
+        with np.errstate(invalid="ignore"):
+            sss_plus = matrix.achievements >= SSS_PLUS_ACHIEVEMENTS
+        plays = np.bincount(chart_label[known], weights=played.sum(axis=0)[known], minlength=len(labels))
+        sss_counts = np.bincount(chart_label[known], weights=sss_plus.sum(axis=0)[known], minlength=len(labels))
+        ap_counts = np.bincount(chart_label[known], weights=matrix.ap.sum(axis=0)[known], minlength=len(labels))
+
+        return [
+            {
+                "level": label,
+                "plays": int(plays[i]),
+                "sss_plus": int(sss_counts[i]),
+                "ap": int(ap_counts[i]),
+            }
+            for i, label in enumerate(labels)
+            if plays[i] > 0
+        ]
+
+    def range_summary(self, group_id: str, charts: List[ChartKey]) -> List[Dict[str, Any]]:
+        """统计每个成员在一组谱面（例如某个定数区间）上的成绩
+
+        Returns:
+            按 SSS+ 数量、AP 数量、游玩数量、平均达成率依次降序排列的列表，
+            每项包含 qq、sss_plus、ap、played、mean；没有游玩过其中任何谱面的成员不在列表中
+        """
+        matrix = self.get(group_id)
+        if matrix is None:
+            return []
+        columns = [matrix.chart_index[key] for key in charts if key in matrix.chart_index]
+        if not columns:
+            return []
+        selected = matrix.achievements[:, columns]
+        played = ~np.isnan(selected)
+        counts = played.sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            sss_plus = (selected >= SSS_PLUS_ACHIEVEMENTS).sum(axis=1)
+        ap = matrix.ap[:, columns].sum(axis=1)
+        means = np.nansum(selected, axis=1, dtype=np.float64) / np.maximum(counts, 1)
+
+        members = np.flatnonzero(counts > 0)
+        order = members[np.lexsort((-means[members], -counts[members], -ap[members], -sss_plus[members]))]
+        return [
+            {
+                "qq": matrix.members[i],
+                "sss_plus": int(sss_plus[i]),
+                "ap": int(ap[i]),
+                "played": int(counts[i]),
+                "mean": float(means[i]),
+            }
+            for i in order
+        ]
+
+    def top_charts(self, group_id: str, order: str = "plays", limit: int = 5, min_players: int = 3) -> List[Dict[str, Any]]:
+        """群内游玩人数最多（plays）或平均达成率最低（hardest）的谱面
+
+        Args:
+            order: plays / hardest
+            min_players: hardest 排序时至少需要的游玩人数
+        """
+        matrix = self.get(group_id)
+        if matrix is None:
+            return []
+        played = ~np.isnan(matrix.achievements)
+        counts = played.sum(axis=0)
+        means = np.nansum(matrix.achievements, axis=0, dtype=np.float64) / np.maximum(counts, 1)
+
+        if order == "hardest":
+            candidates = np.flatnonzero(counts >= min_players)
+            selected = candidates[np.argsort(means[candidates], kind="stable")[:limit]]
+        else:
+            selected = np.argsort(-counts, kind="stable")[:limit]
+
+        return [
+            {
+                "song_id": matrix.charts[i][0],
+                "level_index": matrix.charts[i][1],
+                "players": int(counts[i]),
+                "mean": float(means[i]),
+            }
+            for i in selected
+        ]
+
+
+def _level_sort_key(level: str) -> Tuple[float, str]:
+    """等级排序：13 < 13+ < 14，无法解析的排在最后"""
+    try:
+        return float(level.rstrip("+")) + (0.5 if level.endswith("+") else 0.0), level
+    except ValueError:
+        return float("inf"), level
@@ -0,0 +1,229 @@
+"""HTTP 模块 - 带连接池、重试和熔断的 HTTP 客户端"""
+import asyncio
+import importlib.util
+import random
+import time
+from typing import Dict, Optional, Any
+from urllib.parse import urlsplit
+
+import httpx
+from nonebot.log import logger
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时抛出，表示上游暂不可用"""
+
+    def __init__(self, host: str, retry_after: float):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"{host} 熔断中，{retry_after:.0f} 秒后重试")
+
+
+class CircuitBreaker:
+    """简单的熔断器
+
+    连续失败达到阈值后进入 open 状态，在冷却时间内直接拒绝请求；
+    冷却结束后进入 half_open 状态，仅放行一个试探请求，
+    成功则恢复 closed，失败则重新 open。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 60.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+        # 统计
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+
+    def before_request(self):
+        """请求前检查，熔断中则抛出 CircuitOpenError"""
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.cooldown:
+                self.total_rejected += 1
+                raise CircuitOpenError(self.name, self.cooldown - elapsed)
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                self.total_rejected += 1
+                raise CircuitOpenError(self.name, 0)
+            self._trial_in_flight = True
+
+    def record_success(self):
+        """记录一次成功请求"""
+        if self.state != self.CLOSED:
+            logger.info(f"{self.name} 已恢复，熔断器关闭")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """释放试探名额（试探请求被取消或因本地错误中止，不计入成功或失败）"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """记录一次失败请求"""
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    f"{self.name} 连续失败 {self.consecutive_failures} 次，"
+                    f"熔断 {self.cooldown:.0f} 秒"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        """获取熔断器状态"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+class ResilientClient:
+    """对 httpx.AsyncClient 的封装
+
+    - 连接池上限与 keep-alive，安装了 h2 时启用 HTTP/2
+    - 按接口区分的超时
+    - 幂等 GET 请求的指数退避重试（带随机抖动）
+    - 按域名区分的熔断器
+    """
+
+    # 可重试的状态码
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 30.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 60.0,
+    ):
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+        # 统计
+        self.total_requests = 0
+        self.total_retries = 0
+
+        self.client = httpx.AsyncClient(
+            timeout=default_timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=self.http2,
+        )
+
+    def _get_breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, self.breaker_threshold, self.breaker_cooldown)
+            self.breakers[host] = breaker
+        return breaker
+
+    def is_available(self, url: str) -> bool:
+        """上游当前是否可用（熔断器未打开）"""
+        breaker = self.breakers.get(urlsplit(url).netloc)
+        if breaker is None or breaker.state != CircuitBreaker.OPEN:
+            return True
+        return time.monotonic() - breaker.opened_at >= breaker.cooldown
+
+    def _backoff(self, attempt: int) -> float:
+        """计算第 attempt 次重试前的等待时间（full jitter）"""
+        return random.uniform(0, self.retry_backoff * (2 ** attempt))
+
+    async def get(self, url: str, endpoint: str = "default", **kwargs: Any) -> httpx.Response:
+        """发送 GET 请求
+
+        Args:
+            url: 请求地址
+            endpoint: 接口名，用于选择超时时间
+            **kwargs: 透传给 httpx 的参数
+
+        Returns:
+            最后一次请求的响应（可能为非 2xx 状态码）
+
+        Raises:
+            CircuitOpenError: 上游熔断中
+            httpx.HTTPError: 重试耗尽后的网络错误
+        """
+        breaker = self._get_breaker(url)
+        breaker.before_request()
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, self.default_timeout))
+
+        attempt = 0
+        try:
+            while True:
+                self.total_requests += 1
+                try:
+                    response = await self.client.get(url, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt >= self.max_retries:
+                        breaker.record_failure()
+                        raise
+                    logger.debug(f"请求 {endpoint} 失败: {e!r}，准备重试")
+                else:
+                    if response.status_code not in self.RETRY_STATUS:
+                        breaker.record_success()
+                        return response
+                    if attempt >= self.max_retries:
+                        breaker.record_failure()
+                        return response
+                    logger.debug(f"请求 {endpoint} 返回 HTTP {response.status_code}，准备重试")
+
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                self.total_retries += 1
+        except BaseException:
+            # 被取消或遇到非网络错误（例如 InvalidURL、TooManyRedirects）时，
+            # 释放 half_open 状态的试探名额，否则之后的请求会一直被拒绝
+            breaker.release_trial()
+            raise
+
+    def get_stats(self) -> dict:
+        """获取 HTTP 层统计信息"""
+        return {
+            "http2": self.http2,
+            "total_requests": self.total_requests,
+            "total_retries": self.total_retries,
+            "breakers": {host: b.get_stats() for host, b in self.breakers.items()},
+        }
+
+    async def aclose(self):
+        """关闭底层连接池"""
+        await self.client.aclose()
@@ -0,0 +1,125 @@
+"""图片存储模块 - 按内容寻址的渲染结果文件缓存"""
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Optional
+from nonebot.log import logger
+
+
+def _guess_suffix(data: bytes) -> str:
+    """根据文件头判断图片扩展名"""
+    if data.startswith(b"\x89PNG"):
+        return ".png"
+    if data.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".img"
+
+
+class ImageStore:
+    """渲染结果的文件缓存
+
+    文件名为内容的 SHA-256，相同的图片（例如不同群中相同的排行榜）
+    只会写入一次。发送时只传递文件路径或 URL，不再把整张图片
+    base64 编码进 OneBot 的 websocket 消息中。
+    """
+
+    # 通过 NoneBot HTTP 服务提供图片时使用的路由前缀
+    ROUTE_PREFIX = "/maimai_raking/images"
+    CONTENT_TYPES = {
+        ".png": "image/png",
+        ".jpg": "image/jpeg",
+        ".webp": "image/webp",
+    }
+
+    def __init__(self, cache_dir: Path, base_url: str = ""):
+        """初始化图片存储
+
+        Args:
+            cache_dir: 缓存目录
+            base_url: 外部可访问的 NoneBot HTTP 服务地址，例如 http://127.0.0.1:8080
+        """
+        self.cache_dir = Path(cache_dir)
+        # 目录在第一次写入图片时创建（bytes 发送方式下不会创建）
+        self._dir_ready = False
+        self.base_url = base_url.rstrip("/")
+
+        # 统计
+        self.writes = 0
+        self.reuses = 0
+
+    def put(self, data: bytes) -> Path:
+        """保存图片并返回文件路径，内容相同的图片直接复用已有文件"""
+        name = hashlib.sha256(data).hexdigest()[:32] + _guess_suffix(data)
+        path = self.cache_dir / name
+        if path.exists():
+            self.reuses += 1
+            # 更新修改时间，避免仍在使用的图片被清理
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+
+        if not self._dir_ready:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._dir_ready = True
+
+        # 先写临时文件再重命名，避免其他进程读到写了一半的文件
+        tmp_path = path.with_name(f"{name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self.writes += 1
+        return path
+
+    def url_for(self, path: Path) -> str:
+        """获取图片的 HTTP 地址（文件名放在查询参数中，兼容不支持路径参数的驱动器）"""
+        return f"{self.base_url}{self.ROUTE_PREFIX}?name={path.name}"
+
+    def resolve(self, name: str) -> Optional[Path]:
+        """根据文件名查找缓存的图片，文件名不合法或不存在时返回 None"""
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            return None
+        path = self.cache_dir / name
+        if not path.is_file():
+            return None
+        return path
+
+    def cleanup(self, max_age_hours: float) -> int:
+        """删除超过指定时间未使用的图片
+
+        Returns:
+            int: 删除的文件数
+        """
+        if not self.cache_dir.is_dir():
+            return 0
+        deadline = time.time() - max_age_hours * 3600
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            try:
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+                    removed += 1
+            except OSError as e:
+                logger.debug(f"清理图片缓存 {path.name} 失败: {e}")
+        return removed
+
+    def get_stats(self) -> dict:
+        """获取图片缓存统计信息"""
+        files = 0
+        total_bytes = 0
+        paths = self.cache_dir.iterdir() if self.cache_dir.is_dir() else []
+        for path in paths:
+            try:
+                total_bytes += path.stat().st_size
+                files += 1
+            except OSError:
+                continue
+        return {
+            "files": files,
+            "bytes": total_bytes,
+            "writes": self.writes,
+            "reuses": self.reuses,
+        }
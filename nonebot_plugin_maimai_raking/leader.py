@@ -0,0 +1,69 @@
+"""选主模块 - 多进程共享数据目录时，通过文件锁选出唯一执行定时任务的进程"""
+import os
+from pathlib import Path
+from typing import IO, Optional
+from nonebot.log import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LeaderLock:
+    """基于文件锁的选主
+
+    第一个拿到锁文件排他锁的进程成为主进程，锁随进程存活一直持有，
+    进程退出（包括崩溃）后由操作系统释放，其他进程下次尝试时接管。
+    """
+
+    def __init__(self, lock_file: Path):
+        self.lock_file = Path(lock_file)
+        self._handle: Optional[IO[str]] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._handle is not None
+
+    def try_acquire(self) -> bool:
+        """尝试成为主进程（非阻塞），返回当前是否为主进程"""
+        if self._handle is not None:
+            return True
+
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self.lock_file, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+
+        # 写入 pid 便于排查
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._handle = handle
+        logger.info(f"当前进程 (pid={os.getpid()}) 已成为主进程，负责执行定时任务")
+        return True
+
+    def release(self):
+        """释放主进程身份"""
+        if self._handle is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError as e:
+            logger.warning(f"释放主进程锁失败: {e}")
+        finally:
+            self._handle.close()
+            self._handle = None
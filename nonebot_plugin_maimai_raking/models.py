@@ -0,0 +1,88 @@
+"""数据模型 - 歌曲数据的紧凑内存表示"""
+import sys
+from typing import Any, Dict, Iterable, List, Tuple
+from nonebot.log import logger
+
+
+class Song:
+    """一首歌曲（只保留插件用到的字段）
+
+    水鱼 music_data 中每首歌还包含各谱面的物量、谱师、basic_info 等信息，
+    插件只用到 ID、标题、类型、定数、等级和是否为当前版本新曲，加载时即丢弃其余字段。
+    标题、类型和等级字符串经过 intern，相同的字符串只保存一份。
+
+    为兼容原先以字典形式传递歌曲的代码，支持 song["title"] 与 song.get("ds") 访问。
+    """
+
+    __slots__ = ("id", "title", "type", "ds", "level", "is_new")
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        type: str,
+        ds: Tuple[float, ...],
+        level: Tuple[str, ...],
+        is_new: bool = False,
+    ):
+        self.id = id
+        self.title = title
+        self.type = type
+        self.ds = ds
+        self.level = level
+        self.is_new = is_new
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Song":
+        """从水鱼 music_data 的单个条目创建
+
+        Raises:
+            KeyError / ValueError / TypeError: 条目缺少 ID 或 ID 不是数字
+        """
+        return cls(
+            id=int(data["id"]),
+            title=sys.intern(str(data.get("title", ""))),
+            type=sys.intern(str(data.get("type", "DX"))),
+            ds=tuple(float(ds) for ds in data.get("ds", [])),
+            level=tuple(sys.intern(str(level)) for level in data.get("level", [])),
+            is_new=bool((data.get("basic_info") or {}).get("is_new", False)),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "type": self.type,
+            "ds": list(self.ds),
+            "level": list(self.level),
+            "is_new": self.is_new,
+        }
+
+    def __repr__(self) -> str:
+        return f"Song(id={self.id}, title={self.title!r}, type={self.type!r})"
+
+
+def parse_music_data(raw: Iterable[Dict[str, Any]]) -> List[Song]:
+    """把水鱼 music_data 转换为 Song 列表，跳过无法解析的条目"""
+    songs = []
+    skipped = 0
+    for item in raw:
+        try:
+            songs.append(Song.from_json(item))
+        except (KeyError, ValueError, TypeError):
+            skipped += 1
+    if skipped:
+        logger.warning(f"跳过 {skipped} 条无法解析的歌曲数据")
+    return songs
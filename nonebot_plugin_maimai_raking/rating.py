@@ -0,0 +1,134 @@
+"""Rating 模块 - 定数更新后在本地重新计算玩家的单曲 Rating 与 DX Rating"""
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+# 达成率下限 -> 系数，单曲 Rating = floor(定数 × 系数 × min(达成率, 100.5) / 100)
+RANK_FACTORS: Tuple[Tuple[float, float], ...] = (
+    (0.0, 0.0),
+    (10.0, 1.6),
+    (20.0, 3.2),
+    (30.0, 4.8),
+    (40.0, 6.4),
+    (50.0, 8.0),
+    (60.0, 9.6),
+    (70.0, 11.2),
+    (75.0, 12.0),
+    (79.9999, 12.8),
+    (80.0, 13.6),
+    (90.0, 15.2),
+    (94.0, 16.8),
+    (96.9999, 17.6),
+    (97.0, 20.0),
+    (98.0, 20.3),
+    (98.9999, 20.6),
+    (99.0, 20.8),
+    (99.5, 21.1),
+    (99.9999, 21.4),
+    (100.0, 21.6),
+    (100.4999, 22.2),
+    (100.5, 22.4),
+)
+
+# 用整数计算避免浮点误差：达成率 ×10000，定数和系数 ×10
+_THRESHOLDS = np.array([round(threshold * 10000) for threshold, _ in RANK_FACTORS], dtype=np.int64)
+_FACTORS = np.array([round(factor * 10) for _, factor in RANK_FACTORS], dtype=np.int64)
+_MAX_ACHIEVEMENT = 1005000
+
+# DX Rating 取旧版本最好 35 首与当前版本最好 15 首
+BEST_OLD = 35
+BEST_NEW = 15
+
+
+def compute_ra(ds: np.ndarray, achievements: np.ndarray) -> np.ndarray:
+    """批量计算单曲 Rating
+
+    Args:
+        ds: 定数
+        achievements: 达成率（百分比，例如 100.5）
+
+    Returns:
+        与输入等长的整数数组
+    """
+    ach = np.minimum(np.rint(np.asarray(achievements, dtype=np.float64) * 10000).astype(np.int64), _MAX_ACHIEVEMENT)
+    ds_int = np.rint(np.asarray(ds, dtype=np.float64) * 10).astype(np.int64)
+    factor = _FACTORS[np.searchsorted(_THRESHOLDS, ach, side="right") - 1]
+    return ds_int * factor * ach // 100000000
+
+
+def _best_sum(ra: np.ndarray, player: np.ndarray, is_new: np.ndarray, players: int) -> np.ndarray:
+    """按玩家分别累加旧曲最好 35 首与新曲最好 15 首的单曲 Rating"""
+    if len(ra) == 0:
+        return np.zeros(players, dtype=np.int64)
+    # 依次按玩家、新旧、Rating 降序排序
+    order = np.lexsort((-ra, is_new, player))
+    group = (player * 2 + is_new)[order]
+    # 每组第一条记录的位置，用于计算组内名次
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    lengths = np.diff(np.r_[starts, len(group)])
+    rank = np.arange(len(group)) - np.repeat(starts, lengths)
+    limit = np.where(is_new[order], BEST_NEW, BEST_OLD)
+    selected = order[rank < limit]
+    return np.bincount(player[selected], weights=ra[selected], minlength=players).astype(np.int64)
+
+
+def recompute_ratings(
+    players: List[Tuple[str, Dict[str, Any]]],
+    ds_table: Dict[Tuple[int, int], float],
+    new_songs: Set[int],
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """按新的定数表重新计算一批玩家的成绩
+
+    Args:
+        players: (qq, 成绩数据) 列表，成绩数据为水鱼 records 接口的返回格式
+        ds_table: (歌曲ID, 难度) -> 定数
+        new_songs: 当前版本新曲的歌曲 ID
+
+    Returns:
+        发生变化的 (qq, 更新后的成绩数据)；成绩数据原地修改
+    """
+    flat_records: List[Dict[str, Any]] = []
+    player_index: List[int] = []
+    ds_values: List[float] = []
+    achievements: List[float] = []
+    new_flags: List[bool] = []
+    old_ds: List[float] = []
+    old_ra: List[int] = []
+    for index, (_, data) in enumerate(players):
+        for record in data.get("records") or []:
+            try:
+                key = (int(record.get("song_id", 0)), int(record.get("level_index", 0)))
+                record_ds = float(record.get("ds", 0) or 0)
+                record_achievements = float(record.get("achievements", 0) or 0)
+                record_ra = int(record.get("ra", 0) or 0)
+            except (ValueError, TypeError):
+                continue
+            flat_records.append(record)
+            player_index.append(index)
+            ds_values.append(ds_table.get(key, record_ds))
+            achievements.append(record_achievements)
+            new_flags.append(key[0] in new_songs)
+            old_ds.append(record_ds)
+            old_ra.append(record_ra)
+
+    player = np.array(player_index, dtype=np.int64)
+    ds = np.array(ds_values, dtype=np.float64)
+    is_new = np.array(new_flags, dtype=np.int64)
+    ra = compute_ra(ds, np.array(achievements, dtype=np.float64))
+    rating = _best_sum(ra, player, is_new, len(players))
+
+    # 定数或单曲 Rating 有变化的谱面
+    record_changed = (ra != np.array(old_ra, dtype=np.int64)) | (ds != np.array(old_ds, dtype=np.float64))
+    for position in np.flatnonzero(record_changed):
+        record = flat_records[position]
+        record["ds"] = float(ds[position])
+        record["ra"] = int(ra[position])
+    player_changed = np.bincount(player[record_changed], minlength=len(players)) > 0
+
+    changed = []
+    for index, (qq, data) in enumerate(players):
+        new_rating = int(rating[index])
+        if player_changed[index] or data.get("rating") != new_rating:
+            data["rating"] = new_rating
+            changed.append((qq, data))
+    return changed
@@ -0,0 +1,273 @@
+"""刷新队列模块 - 持久化在 SQLite 中的成绩刷新任务队列"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from nonebot.log import logger
+
+from .database import Database
+
+# 任务优先级：用户主动刷新 > 管理员刷新整群 > 每日自动刷新
+PRIORITY_MANUAL = 100
+PRIORITY_GROUP = 50
+PRIORITY_NIGHTLY = 0
+
+
+class RefreshQueue:
+    """成绩刷新任务队列
+
+    任务保存在数据库的 refresh_jobs 表中，由若干后台 worker 按
+    优先级和执行时间依次处理。成功或跳过后移除任务，失败则按指数退避
+    推迟重试，超过最大次数后放弃。机器人重启后未完成的任务会继续处理。
+    多进程部署时只有主进程启动 worker。
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        handler: Callable[[str, str], Awaitable[Optional[bool]]],
+        workers: int = 2,
+        max_attempts: int = 5,
+        retry_delay: float = 300.0,
+        poll_interval: float = 30.0,
+        wait_timeout: float = 600.0,
+    ):
+        """初始化刷新队列
+
+        Args:
+            db: 数据库实例
+            handler: 处理单个任务的回调 (qq, reason)，返回 True 成功、False 失败、None 跳过
+            workers: 并发 worker 数量
+            max_attempts: 单个任务的最大尝试次数
+            retry_delay: 首次重试的等待时间（秒），之后每次翻倍
+            poll_interval: 队列为空时检查新任务的间隔（秒）
+            wait_timeout: submit / submit_many 等待结果的最长时间（秒）
+        """
+        self.db = db
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # 正在处理中的任务，避免多个 worker 重复领取
+        self._claimed: Set[str] = set()
+        # 等待任务结果的调用方：qq -> [(优先级, future)]
+        self._waiters: Dict[str, List[Tuple[int, asyncio.Future]]] = {}
+
+        # 统计（本次启动以来）
+        self.processed = 0
+        self.success = 0
+        self.fail = 0
+        self.skipped = 0
+
+    def start(self):
+        """启动后台 worker"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"成绩刷新队列已启动，worker 数量: {self.workers}")
+
+    async def stop(self):
+        """停止后台 worker，未完成的任务保留在数据库中"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def enqueue(self, jobs: Iterable[Tuple[str, str, int, datetime]]) -> int:
+        """批量加入任务
+
+        Args:
+            jobs: (qq, reason, priority, 执行时间) 列表
+
+        Returns:
+            int: 写入的任务数
+        """
+        count = self.db.enqueue_refresh_jobs(
+            (qq, reason, priority, due.isoformat()) for qq, reason, priority, due in jobs
+        )
+        self._notify()
+        return count
+
+    async def submit(self, qq: str, reason: str, priority: int) -> Optional[bool]:
+        """加入一个立即执行的任务并等待首次处理结果"""
+        results = await self.submit_many([qq], reason, priority)
+        return results[0]
+
+    async def submit_many(self, users: List[str], reason: str, priority: int) -> List[Optional[bool]]:
+        """加入一批立即执行的任务并等待它们的首次处理结果
+
+        失败的任务仍会留在队列中按退避策略重试，
+        但等待方只关心首次结果，不会被重试阻塞。
+        未启动 worker 时（非主进程）直接处理，不写入队列。
+        
+        Returns:
+            每个用户的结果；任务写入数据库失败时为 False，
+            超过 wait_timeout 仍未处理或任务被移出队列时为 None
+        """
+        if not users:
+            return []
+        if not self._tasks:
+            semaphore = asyncio.Semaphore(self.workers)
+            return list(await asyncio.gather(*(self._run_inline(semaphore, qq, reason) for qq in users)))
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for qq in users:
+            future = loop.create_future()
+            self._waiters.setdefault(qq, []).append((priority, future))
+            futures.append(future)
+        now = datetime.now()
+        if not self.enqueue((qq, reason, priority, now) for qq in users):
+            # 任务没有写入数据库，不会被处理
+            for qq, future in zip(users, futures):
+                self._discard_waiter(qq, future)
+            return [False] * len(users)
+
+        try:
+            await asyncio.wait(futures, timeout=self.wait_timeout)
+        finally:
+            # 超时或调用方被取消时移除仍在等待的 future，任务本身留在队列中继续处理
+            for qq, future in zip(users, futures):
+                if not future.done():
+                    self._discard_waiter(qq, future)
+        pending = sum(1 for future in futures if not future.done())
+        if pending:
+            logger.warning(f"等待刷新结果超时，{pending} 名用户的任务仍在队列中")
+        return [future.result() if future.done() else None for future in futures]
+
+    async def _run_inline(self, semaphore: asyncio.Semaphore, qq: str, reason: str) -> Optional[bool]:
+        async with semaphore:
+            try:
+                return await self.handler(qq, reason)
+            except Exception as e:
+                logger.error(f"处理用户 {qq} 的刷新任务（{reason}）时出错: {e}")
+                return False
+
+    def _discard_waiter(self, qq: str, future: asyncio.Future):
+        """移除一个等待方"""
+        remaining = [waiter for waiter in self._waiters.get(qq, []) if waiter[1] is not future]
+        if remaining:
+            self._waiters[qq] = remaining
+        else:
+            self._waiters.pop(qq, None)
+
+    def release_orphaned_waiters(self) -> int:
+        """结束任务已不在队列中（例如被 清理数据库 删除）的等待方，结果为 None
+
+        Returns:
+            int: 结束的等待方数量
+        """
+        pending = [qq for qq in self._waiters if qq not in self._claimed]
+        if not pending:
+            return 0
+        queued = self.db.get_queued_refresh_users(pending)
+        released = 0
+        for qq in pending:
+            if qq in queued:
+                continue
+            for _, future in self._waiters.pop(qq, []):
+                if not future.done():
+                    future.set_result(None)
+                    released += 1
+        if released:
+            logger.info(f"{released} 个刷新任务已被移出队列，结束对应的等待")
+        return released
+
+    def _resolve(self, qq: str, priority: int, result: Optional[bool]):
+        """通知优先级不高于已处理任务的等待方"""
+        waiters = self._waiters.pop(qq, [])
+        remaining = []
+        for waiter_priority, future in waiters:
+            if waiter_priority > priority:
+                # 等待的是处理期间合并进来的更高优先级任务
+                remaining.append((waiter_priority, future))
+            elif not future.done():
+                future.set_result(result)
+        if remaining:
+            self._waiters[qq] = remaining
+
+    def _claim(self) -> Optional[Dict[str, object]]:
+        """领取一个已到期且未被其他 worker 处理的任务"""
+        now = datetime.now().isoformat()
+        for job in self.db.get_due_refresh_jobs(now, limit=self.workers + 20):
+            if job["qq"] not in self._claimed:
+                self._claimed.add(job["qq"])
+                return job
+        return None
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job = self._claim()
+                if job is None:
+                    # 队列空闲时检查是否有任务被其他进程删除
+                    if self._waiters:
+                        self.release_orphaned_waiters()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                try:
+                    await self._process(job)
+                finally:
+                    self._claimed.discard(job["qq"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"刷新队列 worker {index} 出错: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, job: Dict[str, object]):
+        qq = str(job["qq"])
+        reason = str(job["reason"])
+        priority = int(job["priority"])
+        attempts = int(job["attempts"]) + 1
+        error = ""
+        try:
+            result = await self.handler(qq, reason)
+        except Exception as e:
+            logger.error(f"处理用户 {qq} 的刷新任务（{reason}）时出错: {e}")
+            result = False
+            error = str(e)
+
+        self.processed += 1
+        if result is None:
+            self.skipped += 1
+        elif result:
+            self.success += 1
+        else:
+            self.fail += 1
+
+        if result is False and attempts < self.max_attempts:
+            delay = self.retry_delay * (2 ** (attempts - 1))
+            next_attempt_at = datetime.now() + timedelta(seconds=delay)
+            self.db.retry_refresh_job(qq, reason, next_attempt_at.isoformat(), error)
+            logger.info(f"用户 {qq} 的刷新任务失败（第 {attempts} 次），{delay:.0f} 秒后重试")
+        else:
+            if result is False:
+                logger.warning(f"用户 {qq} 的刷新任务已失败 {attempts} 次，放弃")
+            self.db.complete_refresh_job(qq, reason)
+
+        self._resolve(qq, priority, result)
+
+    def get_stats(self) -> Dict[str, object]:
+        """获取队列统计信息"""
+        return {
+            "pending": self.db.get_refresh_job_counts(),
+            "running": len(self._claimed),
+            "processed": self.processed,
+            "success": self.success,
+            "fail": self.fail,
+            "skipped": self.skipped,
+        }
@@ -1,29 +1,65 @@
 """图片渲染模块 - 生成排行榜图片"""
 from io import BytesIO
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 import os
+import time
 from pathlib import Path
 from nonebot.log import logger
 from functools import lru_cache
 import asyncio
 
+from .cache import BoundedCache
+
 # 图标文件夹路径
 ICON_DIR = Path(__file__).parent / "icon"
-# 自定义字体文件夹路径
+# 自定义字体文件夹路径（不存在时使用系统字体，不在包目录中创建）
 FONT_DIR = Path(__file__).parent / "fonts"
-# 确保字体文件夹存在
-FONT_DIR.mkdir(exist_ok=True)
 
 # 缓存配置
 CACHE_SIZE = 100  # 缓存大小
-COVER_CACHE_SIZE = 50  # 封面缓存大小
+COVER_CACHE_BYTES = 16 * 1024 * 1024  # 封面缓存上限（可通过配置调整）
+HEADER_CACHE_BYTES = 48 * 1024 * 1024  # 页眉图层缓存上限
+NICKNAME_CACHE_BYTES = 16 * 1024 * 1024  # 昵称文字图块缓存上限
+
+# 图片布局
+WIDTH = 850
+HEADER_HEIGHT = 240  # 增加高度以容纳所有难度定数显示
+ROW_HEIGHT = 70
+FOOTER_HEIGHT = 70
+TABLE_HEADER_HEIGHT = 50
+SUMMARY_HEADER_HEIGHT = 120  # 汇总排行榜（无封面）的标题区高度
+CANVAS_COLOR = (250, 250, 252)
+
+# 昵称列
+NICKNAME_X = 200  # 昵称列中心位置
+NICKNAME_MAX_WIDTH = 200  # 每行昵称的最大像素宽度
+NICKNAME_FONT_SIZE = 24
+NICKNAME_SMALL_FONT_SIZE = 17  # 长昵称换行时使用的字体大小
+NICKNAME_COLOR = (50, 50, 70)
+
+# 支持的图片编码格式
+IMAGE_FORMATS = ("png", "png_fast", "png_quantized", "jpeg", "webp")
+
+# 图标及其渲染尺寸
+FC_FS_ICON_SIZE = (35, 35)  # 正方形图标
+RATE_ICON_SIZE = (80, 36)  # 保持原始比例
+ICON_SIZES = {
+    FC_FS_ICON_SIZE: ("ap", "app", "fc", "fcp", "fs", "fsp", "fsd", "fsdp"),
+    RATE_ICON_SIZE: ("d", "c", "b", "bb", "bbb", "a", "aa", "aaa", "s", "sp", "ss", "ssp", "sss", "sssp"),
+}
 
 # 全局缓存字典
-_icon_cache = {}
-_font_cache = {}
-_cover_cache = {}
-_rounded_mask_cache = {}
+_font_cache = BoundedCache("render.font", max_items=32)
+_cover_cache = BoundedCache("render.cover", max_bytes=COVER_CACHE_BYTES)
+_rounded_mask_cache = BoundedCache("render.mask", max_items=16)
+_header_cache = BoundedCache("render.header", max_bytes=HEADER_CACHE_BYTES)  # (song_id, level_index) -> 页眉图层
+_row_strip_cache = {}  # 奇偶 -> 空白行背景（固定两张，不需要淘汰）
+_footer_layer: Optional[Image.Image] = None
+# (昵称, 字体大小) -> 昵称文字遮罩
+_nickname_tile_cache = BoundedCache("render.nickname", max_bytes=NICKNAME_CACHE_BYTES)
+# 仅用于测量文字宽度
+_measure_draw = ImageDraw.Draw(Image.new("L", (1, 1)))
 
 
 @lru_cache(maxsize=CACHE_SIZE)
@@ -45,9 +81,9 @@ def _get_font_path() -> Optional[str]:
 
 def _get_font(size: int) -> ImageFont.FreeTypeFont:
     """获取字体对象（带缓存）"""
-    cache_key = f"{size}"
-    if cache_key in _font_cache:
-        return _font_cache[cache_key]
+    font = _font_cache.get(size)
+    if font is not None:
+        return font
     
     font_path = _get_font_path()
     try:
@@ -56,50 +92,170 @@ def _get_font(size: int) -> ImageFont.FreeTypeFont:
         else:
             font = ImageFont.load_default()
         
-        _font_cache[cache_key] = font
+        _font_cache.set(size, font)
         return font
     except:
         font = ImageFont.load_default()
-        _font_cache[cache_key] = font
+        _font_cache.set(size, font)
         return font
 
 
-def _get_icon(icon_name: str, size: tuple) -> Optional[Image.Image]:
-    """获取图标（带缓存）"""
-    cache_key = f"{icon_name}_{size[0]}x{size[1]}"
-    if cache_key in _icon_cache:
-        return _icon_cache[cache_key]
+def _build_icon_atlas() -> Tuple[Optional[Image.Image], Dict[Tuple[str, Tuple[int, int]], Tuple[int, int, int, int]]]:
+    """把所有图标按渲染时的尺寸缩放后拼成一张图集
     
-    icon_path = ICON_DIR / f"mmd_player_rtsong_{icon_name}.png"
-    if not icon_path.exists():
-        return None
+    每种尺寸占一行，图标之间留 1 像素间隔防止缩放后的边缘互相影响。
     
-    try:
-        icon = Image.open(icon_path).convert("RGBA")
-        icon = icon.resize(size, Image.Resampling.LANCZOS)
-        _icon_cache[cache_key] = icon
-        return icon
-    except Exception:
+    Returns:
+        (图集, (图标名, 尺寸) -> 图集中的区域)
+    """
+    rows = []
+    for size, names in ICON_SIZES.items():
+        icons = []
+        for name in names:
+            icon_path = ICON_DIR / f"mmd_player_rtsong_{name}.png"
+            if not icon_path.exists():
+                continue
+            try:
+                with Image.open(icon_path) as icon:
+                    icons.append((name, icon.convert("RGBA").resize(size, Image.Resampling.LANCZOS)))
+            except Exception as e:
+                logger.warning(f"加载图标 {icon_path.name} 失败: {e}")
+        if icons:
+            rows.append((size, icons))
+    
+    if not rows:
+        return None, {}
+    
+    atlas_width = max(len(icons) * (size[0] + 1) for size, icons in rows)
+    atlas_height = sum(size[1] + 1 for size, _ in rows)
+    atlas = Image.new("RGBA", (atlas_width, atlas_height), (0, 0, 0, 0))
+    offsets = {}
+    y = 0
+    for size, icons in rows:
+        x = 0
+        for name, icon in icons:
+            atlas.paste(icon, (x, y))
+            offsets[(name, size)] = (x, y, x + size[0], y + size[1])
+            x += size[0] + 1
+        y += size[1] + 1
+    return atlas, offsets
+
+
+def _get_icon(icon_name: str, size: tuple) -> Optional[Image.Image]:
+    """从图集中取出图标"""
+    box = _icon_offsets.get((icon_name, tuple(size)))
+    if box is None or _icon_atlas is None:
         return None
+    return _icon_atlas.crop(box)
+
+
+# 导入时构建图集，首次渲染无需再逐个打开和缩放图标
+_icon_atlas, _icon_offsets = _build_icon_atlas()
 
 
 def _get_rounded_mask(size: int) -> Image.Image:
     """获取圆角遮罩（带缓存）"""
-    if size in _rounded_mask_cache:
-        return _rounded_mask_cache[size]
+    mask = _rounded_mask_cache.get(size)
+    if mask is not None:
+        return mask
     
     mask = Image.new("L", (size, size), 0)
     mask_draw = ImageDraw.Draw(mask)
     mask_draw.rounded_rectangle([(0, 0), (size, size)], radius=12, fill=255)
     
-    _rounded_mask_cache[size] = mask
+    _rounded_mask_cache.set(size, mask)
     return mask
 
 
+def _text_width(text: str, font: ImageFont.FreeTypeFont) -> float:
+    """使用字形度量计算文字的像素宽度"""
+    return _measure_draw.textlength(text, font=font)
+
+
+def _truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: float) -> str:
+    """截断文字使其不超过最大宽度，截断时添加省略号"""
+    if _text_width(text, font) <= max_width:
+        return text
+    end = len(text)
+    while end > 0 and _text_width(text[:end] + "...", font) > max_width:
+        end -= 1
+    return text[:end] + "..."
+
+
+def _layout_nickname(nickname: str, font_size: int) -> Tuple[List[str], int]:
+    """按实际像素宽度排版昵称
+    
+    放得下时使用正常字体单行显示；否则使用小字体分两行，
+    尽量在视觉中点附近的分隔符处换行，第二行仍放不下时添加省略号。
+    
+    Returns:
+        (各行文字, 使用的字体大小)
+    """
+    if _text_width(nickname, _get_font(font_size)) <= NICKNAME_MAX_WIDTH:
+        return [nickname], font_size
+    
+    font = _get_font(NICKNAME_SMALL_FONT_SIZE)
+    # 前缀宽度，prefix_widths[i] 为 nickname[:i] 的宽度
+    prefix_widths = [_text_width(nickname[:i], font) for i in range(len(nickname) + 1)]
+    half_width = prefix_widths[-1] / 2
+    
+    # 第一行最多能放下的字符数
+    max_split = max(i for i, width in enumerate(prefix_widths) if width <= NICKNAME_MAX_WIDTH)
+    max_split = max(1, max_split)
+    # 视觉中点对应的位置（不超过第一行的容量）
+    split_point = min(
+        range(1, len(nickname)),
+        key=lambda i: abs(prefix_widths[i] - half_width),
+        default=1,
+    )
+    split_point = min(split_point, max_split)
+    
+    # 寻找中点附近的分隔符
+    for i in range(max(1, split_point - 2), min(max_split, split_point + 2) + 1):
+        if i < len(nickname) and nickname[i] in ' -_':
+            split_point = i
+            break
+    
+    line1 = nickname[:split_point].strip()
+    line2 = nickname[split_point:].strip()
+    if not line2 or not line1:
+        return [_truncate_text(nickname.strip(), font, NICKNAME_MAX_WIDTH)], NICKNAME_SMALL_FONT_SIZE
+    return [line1, _truncate_text(line2, font, NICKNAME_MAX_WIDTH)], NICKNAME_SMALL_FONT_SIZE
+
+
+def _get_nickname_tile(nickname: str, font_size: int = NICKNAME_FONT_SIZE) -> Image.Image:
+    """获取排版并光栅化后的昵称遮罩（L 模式，与行等高，文字在图块中居中）
+    
+    同一个群的昵称在每次查询中都会重复出现，缓存后只需粘贴。
+    """
+    cache_key = (nickname, font_size)
+    tile = _nickname_tile_cache.get(cache_key)
+    if tile is not None:
+        return tile
+    
+    lines, line_font_size = _layout_nickname(nickname, font_size)
+    font = _get_font(line_font_size)
+    # 左右留出余量，容纳字形超出度量宽度的部分
+    tile_width = NICKNAME_MAX_WIDTH + 20
+    tile = Image.new("L", (tile_width, ROW_HEIGHT), 0)
+    draw = ImageDraw.Draw(tile)
+    center_x = tile_width // 2
+    center_y = ROW_HEIGHT // 2
+    if len(lines) == 1:
+        draw.text((center_x, center_y), lines[0], font=font, fill=255, anchor="mm")
+    else:
+        draw.text((center_x, center_y - 8), lines[0], font=font, fill=255, anchor="mm")
+        draw.text((center_x, center_y + 8), lines[1], font=font, fill=255, anchor="mm")
+    
+    _nickname_tile_cache.set(cache_key, tile)
+    return tile
+
+
 async def _get_cached_cover(api, song_id: int) -> Optional[bytes]:
     """获取缓存的封面数据"""
-    if song_id in _cover_cache:
-        return _cover_cache[song_id]
+    cover_data = _cover_cache.get(song_id)
+    if cover_data is not None:
+        return cover_data
     
     if not api:
         return None
@@ -107,13 +263,7 @@ async def _get_cached_cover(api, song_id: int) -> Optional[bytes]:
     try:
         cover_data = await api.get_song_cover(song_id)
         if cover_data:
-            # 限制缓存大小
-            if len(_cover_cache) >= COVER_CACHE_SIZE:
-                # 移除最旧的缓存项
-                oldest_key = next(iter(_cover_cache))
-                del _cover_cache[oldest_key]
-            
-            _cover_cache[song_id] = cover_data
+            _cover_cache.set(song_id, cover_data)
             return cover_data
     except Exception as e:
         logger.warning(f"获取封面失败: {e}")
@@ -149,64 +299,48 @@ RATE_COLORS = {
 }
 
 
-async def render_ranking_image(song: dict, ranking_data: List[Dict[str, Any]], api=None) -> bytes:
-    """渲染排行榜图片
+def _render_header_layer(song: dict, current_level_index: int, cover_data: Optional[bytes]) -> Image.Image:
+    """绘制页眉图层（封面、标题、ID、类型标签、定数方块和表头）
     
     Args:
         song: 歌曲信息
-        ranking_data: 排行榜数据列表
-        api: MaimaiAPI实例，用于获取封面
-        
-    Returns:
-        图片字节数据
+        current_level_index: 当前查询的难度索引（用于高亮显示），-1 表示不高亮
+        cover_data: 封面图片字节数据
     """
-    # 图片尺寸
-    width = 850
-    header_height = 240 # 增加高度以容纳所有难度定数显示
-    row_height = 70
-    footer_height = 70
-    table_header_height = 50
-    height = header_height + table_header_height + len(ranking_data) * row_height + footer_height
-    
-    # 创建图片
-    img = Image.new("RGB", (width, height), color=(250, 250, 252))
+    # 表头矩形包含下边界，多出的一行像素与首行的空白边距重叠
+    img = Image.new("RGB", (WIDTH, HEADER_HEIGHT + TABLE_HEADER_HEIGHT + 1), color=CANVAS_COLOR)
     draw = ImageDraw.Draw(img)
     
-    # 使用缓存的字体
     font_title = _get_font(32)
     font_normal = _get_font(24)
     font_small = _get_font(18)
-    font_tiny = _get_font(17)
     
     # 简洁的背景设计
     song_type = song.get("type", "DX")
     
     # 使用浅色背景
     bg_color = (245, 245, 250)
-    draw.rectangle([(0, 0), (width, header_height)], fill=bg_color)
+    draw.rectangle([(0, 0), (WIDTH, HEADER_HEIGHT)], fill=bg_color)
     
     # 获取并绘制歌曲封面（简洁风格）
     cover_size = 197 # 封面大小（增大以与右边信息区域平齐）
     cover_x = 25      # 封面X位置
     cover_y = 25      # 封面Y位置
     
-    if api:
+    if cover_data:
         try:
-            song_id = int(song.get("id", 0))
-            cover_data = await _get_cached_cover(api, song_id)
-            if cover_data:
-                cover_img = Image.open(BytesIO(cover_data)).convert("RGBA")
-                # 调整封面大小
-                cover_img = cover_img.resize((cover_size, cover_size), Image.Resampling.LANCZOS)
-                
-                # 使用缓存的圆角遮罩
-                mask = _get_rounded_mask(cover_size)
-                
-                # 应用圆角遮罩
-                cover_img.putalpha(mask)
-                
-                # 粘贴封面（无阴影，简洁风格）
-                img.paste(cover_img, (cover_x, cover_y), cover_img)
+            cover_img = Image.open(BytesIO(cover_data)).convert("RGBA")
+            # 调整封面大小
+            cover_img = cover_img.resize((cover_size, cover_size), Image.Resampling.LANCZOS)
+            
+            # 使用缓存的圆角遮罩
+            mask = _get_rounded_mask(cover_size)
+            
+            # 应用圆角遮罩
+            cover_img.putalpha(mask)
+            
+            # 粘贴封面（无阴影，简洁风格）
+            img.paste(cover_img, (cover_x, cover_y), cover_img)
         except Exception as e:
             logger.warning(f"绘制封面失败: {e}")
     
@@ -285,11 +419,6 @@ async def render_ranking_image(song: dict, ranking_data: List[Dict[str, Any]], a
         (150, 70, 150),   # Re:Master - 深粉紫
     ]
     
-    # 获取当前查询的难度索引（用于高亮显示）
-    current_level_index = -1
-    if ranking_data and len(ranking_data) > 0:
-        current_level_index = ranking_data[0].get("level_index", -1)
-    
     # 绘制所有难度（Basic, Advanced, Expert, Master, Re:Master）
     for i in range(min(5, len(ds_values))):
         if i < len(ds_values) and ds_values[i]:
@@ -323,104 +452,176 @@ async def render_ranking_image(song: dict, ranking_data: List[Dict[str, Any]], a
                      ds_text, font=font_normal, fill=text_color, anchor="mm")
     
     # 绘制表头背景
-    y_offset = header_height
-    draw.rectangle([(0, y_offset), (width, y_offset + table_header_height)], fill=(240, 240, 245))
+    y_offset = HEADER_HEIGHT
+    draw.rectangle([(0, y_offset), (WIDTH, y_offset + TABLE_HEADER_HEIGHT)], fill=(240, 240, 245))
     
     # 绘制表头文字（移除了难度列）
-    header_y = y_offset + table_header_height // 2
+    header_y = y_offset + TABLE_HEADER_HEIGHT // 2
     draw.text((70, header_y), "排名", font=font_normal, fill=(80, 80, 100), anchor="mm")
     draw.text((200, header_y), "玩家", font=font_normal, fill=(80, 80, 100), anchor="mm")
     draw.text((450, header_y), "成绩", font=font_normal, fill=(80, 80, 100), anchor="mm")
     draw.text((620, header_y), "FC/FS", font=font_normal, fill=(80, 80, 100), anchor="mm")
     draw.text((750, header_y), "评级", font=font_normal, fill=(80, 80, 100), anchor="mm")
     
-    y_offset += table_header_height
+    return img
+
+
+def _get_footer_layer() -> Image.Image:
+    """获取页脚图层（与歌曲无关，只绘制一次）"""
+    global _footer_layer
+    if _footer_layer is not None:
+        return _footer_layer
+    
+    img = Image.new("RGB", (WIDTH, FOOTER_HEIGHT), color=CANVAS_COLOR)
+    draw = ImageDraw.Draw(img)
+    font_small = _get_font(18)
+    
+    # 绘制页脚（带装饰线）
+    footer_y = 0
+    draw.line([(50, footer_y + 15), (WIDTH - 50, footer_y + 15)], fill=(200, 200, 220), width=1)
+    
+    draw.text(
+        (WIDTH // 2, footer_y + 40),
+        "舞萌排行榜 | Geneted by @MaiMaiRankingBot",
+        font=font_small,
+        fill=(150, 150, 170),
+        anchor="mm"
+    )
+    
+    _footer_layer = img
+    return img
+
+
+def _get_row_strip(i: int) -> Image.Image:
+    """获取空白行背景（奇偶行交替两种背景色）"""
+    parity = i % 2
+    if parity in _row_strip_cache:
+        return _row_strip_cache[parity]
+    
+    # 背景色（渐变交替 + 边框）
+    if parity == 0:
+        bg_color = (255, 255, 255)
+    else:
+        bg_color = (248, 248, 252)
+    
+    strip = Image.new("RGB", (WIDTH, ROW_HEIGHT), color=CANVAS_COLOR)
+    draw = ImageDraw.Draw(strip)
+    
+    # 绘制行背景（带圆角）
+    margin = 15
+    draw.rounded_rectangle(
+        [(margin, 5), (WIDTH - margin, ROW_HEIGHT - 5)],
+        radius=8,
+        fill=bg_color,
+        outline=(220, 220, 230),
+        width=1
+    )
+    
+    # 首行像素是画布底色，裁掉以免覆盖表头下边界
+    strip = strip.crop((0, 1, WIDTH, ROW_HEIGHT))
+    _row_strip_cache[parity] = strip
+    return strip
+
+
+def _draw_rank_and_nickname(
+    img: Image.Image,
+    draw: ImageDraw.ImageDraw,
+    rank: int,
+    nickname: str,
+    y_offset: int,
+    font: ImageFont.FreeTypeFont,
+):
+    """绘制一行的排名和玩家昵称"""
+    # 排名（前三名特殊显示）
+    rank_x = 70
+    rank_y = y_offset + ROW_HEIGHT // 2
+    
+    if rank == 1:
+        # 金色第一名
+        draw.text((rank_x, rank_y), "1st", font=font, fill=(255, 215, 0), anchor="mm")
+    elif rank == 2:
+        # 银色第二名
+        draw.text((rank_x, rank_y), "2nd", font=font, fill=(192, 192, 192), anchor="mm")
+    elif rank == 3:
+        # 铜色第三名
+        draw.text((rank_x, rank_y), "3rd", font=font, fill=(205, 127, 50), anchor="mm")
+    else:
+        # 普通排名
+        draw.text((rank_x, rank_y), str(rank), font=font, fill=(100, 100, 120), anchor="mm")
+    
+    # 玩家昵称（按像素宽度排版，使用缓存的文字图块）
+    nickname_tile = _get_nickname_tile(nickname)
+    img.paste(NICKNAME_COLOR, (NICKNAME_X - nickname_tile.width // 2, y_offset), nickname_tile)
+
+
+async def _get_header_layer(song: dict, current_level_index: int, api=None) -> Image.Image:
+    """获取页眉图层（按 (歌曲ID, 难度) 缓存）"""
+    try:
+        song_id = int(song.get("id", 0))
+    except (ValueError, TypeError):
+        song_id = 0
+    cache_key = (song_id, current_level_index)
+    layer = _header_cache.get(cache_key)
+    if layer is not None:
+        return layer
+    
+    cover_data = await _get_cached_cover(api, song_id) if api else None
+    layer = _render_header_layer(song, current_level_index, cover_data)
+    
+    # 封面获取失败时不缓存，下次请求再尝试补上封面
+    if cover_data or not api:
+        _header_cache.set(cache_key, layer)
+    return layer
+
+
+async def render_ranking_image(
+    song: dict,
+    ranking_data: List[Dict[str, Any]],
+    api=None,
+    image_format: str = "png",
+    quality: int = 85,
+) -> bytes:
+    """渲染排行榜图片
+    
+    页眉、页脚和行背景使用预先绘制好的图层，每次只绘制各行的文字和图标。
+    
+    Args:
+        song: 歌曲信息
+        ranking_data: 排行榜数据列表
+        api: MaimaiAPI实例，用于获取封面
+        image_format: 输出格式，见 IMAGE_FORMATS
+        quality: JPEG / WebP 的压缩质量（1-100）
+        
+    Returns:
+        图片字节数据
+    """
+    height = HEADER_HEIGHT + TABLE_HEADER_HEIGHT + len(ranking_data) * ROW_HEIGHT + FOOTER_HEIGHT
+    
+    # 获取当前查询的难度索引（用于高亮显示）
+    current_level_index = -1
+    if ranking_data and len(ranking_data) > 0:
+        current_level_index = ranking_data[0].get("level_index", -1)
+    
+    # 创建图片并粘贴页眉、页脚图层
+    img = Image.new("RGB", (WIDTH, height), color=CANVAS_COLOR)
+    img.paste(_get_footer_layer(), (0, height - FOOTER_HEIGHT))
+    img.paste(await _get_header_layer(song, current_level_index, api), (0, 0))
+    draw = ImageDraw.Draw(img)
+    
+    # 使用缓存的字体
+    font_normal = _get_font(24)
+    
+    y_offset = HEADER_HEIGHT + TABLE_HEADER_HEIGHT
     
     # 直接按成绩排名（因为传入的数据已经是单一难度且已排序）
     for i, data in enumerate(ranking_data):
         rank = i + 1
         
-        # 背景色（渐变交替 + 边框）
-        if i % 2 == 0:
-            bg_color = (255, 255, 255)
-        else:
-            bg_color = (248, 248, 252)
-        
-        # 绘制行背景（带圆角）
-        margin = 15
-        draw.rounded_rectangle(
-            [(margin, y_offset + 5), (width - margin, y_offset + row_height - 5)],
-            radius=8,
-            fill=bg_color,
-            outline=(220, 220, 230),
-            width=1
-        )
-        
-        # 排名（前三名特殊显示）
-        rank_x = 70
-        rank_y = y_offset + row_height // 2
-        
-        if rank == 1:
-            # 金色第一名
-            draw.text((rank_x, rank_y), "1st", font=font_normal, fill=(255, 215, 0), anchor="mm")
-        elif rank == 2:
-            # 银色第二名
-            draw.text((rank_x, rank_y), "2nd", font=font_normal, fill=(192, 192, 192), anchor="mm")
-        elif rank == 3:
-            # 铜色第三名
-            draw.text((rank_x, rank_y), "3rd", font=font_normal, fill=(205, 127, 50), anchor="mm")
-        else:
-            # 普通排名
-            draw.text((rank_x, rank_y), str(rank), font=font_normal, fill=(100, 100, 120), anchor="mm")
-        
-        # 玩家昵称（根据长度调整字体和换行）
-        nickname = data.get("nickname", "未知")
-        nickname_x = 200
-        nickname_y = y_offset + row_height // 2
+        # 粘贴预先绘制好的行背景
+        img.paste(_get_row_strip(i), (0, y_offset + 1))
         
-        # 优化：预计算昵称长度
-        nickname_len = len(nickname)
-        
-        if nickname_len > 8:
-            # 长名字：使用小字体并换行
-            if nickname_len <= 16:
-                # 如果总长度不超过16，尝试平均分配
-                mid_point = nickname_len // 2
-                # 寻找最佳分割点（避免在字符中间分割）
-                split_point = mid_point
-                for i in range(max(1, mid_point - 2), min(nickname_len, mid_point + 3)):
-                    if nickname[i] in ' -_':
-                        split_point = i
-                        break
-                
-                line1 = nickname[:split_point].strip()
-                line2 = nickname[split_point:].strip()
-                
-                # 确保第一行不超过8个字符
-                if len(line1) > 8:
-                    line1 = nickname[:8]
-                    line2 = nickname[8:]
-            else:
-                # 如果总长度超过16，第一行取8个字符
-                line1 = nickname[:8]
-                line2 = nickname[8:]
-            
-            # 如果第二行为空，则不分割
-            if not line2.strip():
-                line1 = nickname[:8] + "..." if nickname_len > 8 else nickname
-                line2 = ""
-            
-            # 绘制第一行
-            draw.text((nickname_x, nickname_y - 8), line1, font=font_tiny, fill=(50, 50, 70), anchor="mm")
-            # 绘制第二行（如果存在）
-            if line2:
-                # 如果第二行仍然超过8个字符，添加省略号
-                if len(line2) > 8:
-                    line2 = line2[:8] + "..."
-                draw.text((nickname_x, nickname_y + 8), line2, font=font_tiny, fill=(50, 50, 70), anchor="mm")
-        else:
-            # 短名字：使用正常字体
-            draw.text((nickname_x, nickname_y), nickname, font=font_normal, fill=(50, 50, 70), anchor="mm")
+        # 排名和玩家昵称
+        _draw_rank_and_nickname(img, draw, rank, data.get("nickname", "未知"), y_offset, font_normal)
         
         # 成绩
         achievements = data.get("achievements", 0)
@@ -429,10 +630,10 @@ async def render_ranking_image(song: dict, ranking_data: List[Dict[str, Any]], a
         
         # 成绩文本（加粗显示）
         score_text = f"{achievements:.4f}%"
-        draw.text((450, y_offset + row_height // 2), score_text, font=font_normal, fill=(50, 50, 70), anchor="mm")
+        draw.text((450, y_offset + ROW_HEIGHT // 2), score_text, font=font_normal, fill=(50, 50, 70), anchor="mm")
         
         # FC/FS 图标（新列）
-        icon_size = (35, 35)  # 正方形图标
+        icon_size = FC_FS_ICON_SIZE
         fc_fs_x = 620  # FC/FS 列的中心位置
         
         # 计算需要显示的图标数量和起始位置
@@ -450,62 +651,187 @@ async def render_ranking_image(song: dict, ranking_data: List[Dict[str, Any]], a
             if fc:
                 fc_icon = _get_icon(fc, icon_size)
                 if fc_icon:
-                    img.paste(fc_icon, (icon_x, y_offset + row_height // 2 - icon_size[1] // 2), fc_icon)
+                    img.paste(fc_icon, (icon_x, y_offset + ROW_HEIGHT // 2 - icon_size[1] // 2), fc_icon)
                     icon_x += icon_size[0] + 5
             
             if fs:
                 fs_icon = _get_icon(fs, icon_size)
                 if fs_icon:
-                    img.paste(fs_icon, (icon_x, y_offset + row_height // 2 - icon_size[1] // 2), fs_icon)
+                    img.paste(fs_icon, (icon_x, y_offset + ROW_HEIGHT // 2 - icon_size[1] // 2), fs_icon)
         
         # 评级图标
         rate = data.get("rate", "").lower()
         if rate:
-            rate_icon_size = (80, 36)  # 保持原始比例
+            rate_icon_size = RATE_ICON_SIZE
             rate_icon = _get_icon(rate, rate_icon_size)
             if rate_icon:
                 # 粘贴图标（居中）
-                img.paste(rate_icon, (750 - rate_icon_size[0] // 2, y_offset + row_height // 2 - rate_icon_size[1] // 2), rate_icon)
+                img.paste(rate_icon, (750 - rate_icon_size[0] // 2, y_offset + ROW_HEIGHT // 2 - rate_icon_size[1] // 2), rate_icon)
         
-        y_offset += row_height
+        y_offset += ROW_HEIGHT
     
-    # 绘制页脚（带装饰线）
-    footer_y = height - footer_height
-    draw.line([(50, footer_y + 15), (width - 50, footer_y + 15)], fill=(200, 200, 220), width=1)
+    return encode_image(img, image_format, quality)
+
+
+def _render_summary_header(title: str, subtitle: str, columns: List[str]) -> Image.Image:
+    """绘制汇总排行榜的标题区和表头（与歌曲排行榜相同的配色和表头样式）"""
+    img = Image.new("RGB", (WIDTH, SUMMARY_HEADER_HEIGHT + TABLE_HEADER_HEIGHT + 1), color=CANVAS_COLOR)
+    draw = ImageDraw.Draw(img)
     
-    draw.text(
-        (width // 2, footer_y + 40),
-        "舞萌排行榜 | Geneted by @MaiMaiRankingBot",
-        font=font_small,
-        fill=(150, 150, 170),
-        anchor="mm"
-    )
+    font_title = _get_font(32)
+    font_normal = _get_font(24)
+    font_small = _get_font(18)
+    
+    draw.rectangle([(0, 0), (WIDTH, SUMMARY_HEADER_HEIGHT)], fill=(245, 245, 250))
+    draw.text((40, 45), title, font=font_title, fill=(40, 40, 40), anchor="lm")
+    draw.text((40, 88), subtitle, font=font_small, fill=(120, 120, 140), anchor="lm")
+    
+    y_offset = SUMMARY_HEADER_HEIGHT
+    draw.rectangle([(0, y_offset), (WIDTH, y_offset + TABLE_HEADER_HEIGHT)], fill=(240, 240, 245))
+    header_y = y_offset + TABLE_HEADER_HEIGHT // 2
+    draw.text((70, header_y), "排名", font=font_normal, fill=(80, 80, 100), anchor="mm")
+    draw.text((NICKNAME_X, header_y), "玩家", font=font_normal, fill=(80, 80, 100), anchor="mm")
+    for x, label in zip(_summary_column_xs(len(columns)), columns):
+        draw.text((x, header_y), label, font=font_normal, fill=(80, 80, 100), anchor="mm")
+    return img
+
+
+def _summary_column_xs(count: int) -> List[int]:
+    """汇总排行榜数据列的中心位置（在昵称列右侧均分）"""
+    left, right = 330, WIDTH - 30
+    return [int(left + (i + 0.5) * (right - left) / count) for i in range(count)]
+
+
+def render_summary_image(
+    title: str,
+    subtitle: str,
+    columns: List[str],
+    rows: List[Dict[str, Any]],
+    image_format: str = "png",
+    quality: int = 85,
+) -> bytes:
+    """渲染不针对单张谱面的汇总排行榜（例如定数区间排行）
+    
+    排名、昵称、行背景和页脚与歌曲排行榜相同，标题区只有标题和副标题。
+    
+    Args:
+        title: 标题
+        subtitle: 副标题
+        columns: 昵称右侧各数据列的表头
+        rows: 已排序的行数据，每行包含 nickname 和与 columns 等长的 values（已格式化的文本）
+        image_format: 输出格式，见 IMAGE_FORMATS
+        quality: JPEG / WebP 的压缩质量（1-100）
+    """
+    height = SUMMARY_HEADER_HEIGHT + TABLE_HEADER_HEIGHT + len(rows) * ROW_HEIGHT + FOOTER_HEIGHT
+    img = Image.new("RGB", (WIDTH, height), color=CANVAS_COLOR)
+    img.paste(_get_footer_layer(), (0, height - FOOTER_HEIGHT))
+    img.paste(_render_summary_header(title, subtitle, columns), (0, 0))
+    draw = ImageDraw.Draw(img)
+    
+    font_normal = _get_font(24)
+    column_xs = _summary_column_xs(len(columns))
     
-    # 转换为字节（优化保存性能）
+    y_offset = SUMMARY_HEADER_HEIGHT + TABLE_HEADER_HEIGHT
+    for i, data in enumerate(rows):
+        img.paste(_get_row_strip(i), (0, y_offset + 1))
+        _draw_rank_and_nickname(img, draw, i + 1, data.get("nickname", "未知"), y_offset, font_normal)
+        for x, value in zip(column_xs, data.get("values", [])):
+            draw.text((x, y_offset + ROW_HEIGHT // 2), str(value), font=font_normal, fill=(50, 50, 70), anchor="mm")
+        y_offset += ROW_HEIGHT
+    
+    return encode_image(img, image_format, quality)
+
+
+def encode_image(img: Image.Image, image_format: str = "png", quality: int = 85) -> bytes:
+    """把图片编码为字节
+    
+    Args:
+        img: RGB 图片
+        image_format: 编码格式
+            - png: 无损 PNG，optimize=True，体积较小但最慢（默认，与旧版一致）
+            - png_fast: 无损 PNG，不做 optimize，低压缩级别
+            - png_quantized: 量化为 256 色调色板后的 PNG
+            - jpeg: 有损 JPEG
+            - webp: 有损 WebP
+        quality: JPEG / WebP 的压缩质量（1-100）
+    
+    Returns:
+        编码后的图片字节数据
+    """
     bio = BytesIO()
-    # 使用optimize=True和适当的压缩级别
-    img.save(bio, format="PNG", optimize=True, compress_level=6)
+    if image_format == "png_fast":
+        img.save(bio, format="PNG", compress_level=1)
+    elif image_format == "png_quantized":
+        # FASTOCTREE 比默认的中位切分快得多，画面以纯色块和文字为主，效果足够
+        img.quantize(colors=256, method=Image.FASTOCTREE).save(bio, format="PNG", compress_level=6)
+    elif image_format == "jpeg":
+        img.save(bio, format="JPEG", quality=quality)
+    elif image_format == "webp":
+        img.save(bio, format="WEBP", quality=quality, method=4)
+    else:
+        if image_format != "png":
+            logger.warning(f"未知的图片格式 {image_format}，使用 PNG")
+        img.save(bio, format="PNG", optimize=True, compress_level=6)
     return bio.getvalue()
 
 
+def benchmark_encoders(image_bytes: bytes, quality: int = 85, rounds: int = 3) -> Dict[str, Dict[str, float]]:
+    """测试各编码格式的耗时与体积
+    
+    Args:
+        image_bytes: 用于测试的已渲染图片
+        quality: JPEG / WebP 的压缩质量
+        rounds: 每种格式重复编码的次数
+    
+    Returns:
+        格式 -> {"ms": 平均耗时（毫秒）, "kb": 输出大小（KB）}
+    """
+    img = Image.open(BytesIO(image_bytes)).convert("RGB")
+    results = {}
+    for image_format in IMAGE_FORMATS:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            data = encode_image(img, image_format, quality)
+        elapsed = (time.perf_counter() - start) / rounds
+        results[image_format] = {"ms": elapsed * 1000, "kb": len(data) / 1024}
+    return results
+
+
 def clear_cache():
     """清理所有缓存"""
-    global _icon_cache, _font_cache, _cover_cache, _rounded_mask_cache
-    _icon_cache.clear()
+    global _footer_layer
     _font_cache.clear()
     _cover_cache.clear()
     _rounded_mask_cache.clear()
+    _header_cache.clear()
+    _row_strip_cache.clear()
+    _nickname_tile_cache.clear()
+    _footer_layer = None
     _get_font_path.cache_clear()
     logger.info("已清理所有渲染缓存")
 
 
+def configure_caches(cover_bytes: int, header_bytes: int, nickname_bytes: int):
+    """按配置调整渲染缓存的内存上限（字节）"""
+    _cover_cache.configure(max_bytes=cover_bytes)
+    _header_cache.configure(max_bytes=header_bytes)
+    _nickname_tile_cache.configure(max_bytes=nickname_bytes)
+
+
+def invalidate_headers():
+    """歌曲数据（标题、定数）更新后清除页眉图层缓存"""
+    _header_cache.clear()
+
+
 def get_cache_stats() -> dict:
     """获取缓存统计信息"""
     return {
-        "icon_cache_size": len(_icon_cache),
+        "icon_atlas_size": len(_icon_offsets),
         "font_cache_size": len(_font_cache),
         "cover_cache_size": len(_cover_cache),
         "mask_cache_size": len(_rounded_mask_cache),
+        "header_cache_size": len(_header_cache),
+        "nickname_cache_size": len(_nickname_tile_cache),
         "font_path_cache_info": _get_font_path.cache_info()
     }
 
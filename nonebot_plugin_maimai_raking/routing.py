@@ -0,0 +1,63 @@
+"""路由模块 - 维护群与 Bot 的对应关系，多账号部署时每个群只由一个 Bot 处理"""
+from typing import Dict, List, Set
+from nonebot.adapters.onebot.v11 import Bot
+from nonebot.log import logger
+
+
+class GroupRouter:
+    """群 -> Bot 路由表
+
+    通过每个 Bot 的 get_group_list 维护其所在的群，在 Bot 连接/断开时更新。
+    分配任务时每个群只交给一个在该群中的 Bot，并尽量让各 Bot 分到的群数量均衡。
+    """
+
+    def __init__(self):
+        # bot self_id -> 所在群号集合
+        self._bot_groups: Dict[str, Set[str]] = {}
+
+    async def refresh_bot(self, bot: Bot) -> Set[str]:
+        """重新获取某个 Bot 所在的群列表
+
+        Raises:
+            获取群列表失败时抛出 OneBot 调用的异常
+        """
+        groups = await bot.get_group_list()
+        group_ids = {str(group["group_id"]) for group in groups}
+        self._bot_groups[bot.self_id] = group_ids
+        logger.debug(f"Bot {bot.self_id} 所在群数量: {len(group_ids)}")
+        return group_ids
+
+    def remove_bot(self, self_id: str):
+        """移除已断开的 Bot"""
+        self._bot_groups.pop(self_id, None)
+
+    def all_groups(self) -> Set[str]:
+        """所有已知 Bot 所在群的并集"""
+        result: Set[str] = set()
+        for groups in self._bot_groups.values():
+            result |= groups
+        return result
+
+    def assign(self, group_ids: List[str], bots: Dict[str, Bot]) -> Dict[str, List[str]]:
+        """把群分配给 Bot
+
+        Args:
+            group_ids: 需要处理的群
+            bots: 当前连接的 Bot（self_id -> Bot）
+
+        Returns:
+            self_id -> 分配到的群列表；没有任何 Bot 在其中的群不会出现在结果里
+        """
+        assignment: Dict[str, List[str]] = {self_id: [] for self_id in bots}
+        for group_id in group_ids:
+            candidates = [
+                self_id for self_id in bots
+                if group_id in self._bot_groups.get(self_id, set())
+            ]
+            if not candidates:
+                logger.debug(f"没有已连接的 Bot 在群 {group_id} 中，跳过")
+                continue
+            # 选择当前分配最少的 Bot，使各 Bot 负载均衡
+            chosen = min(candidates, key=lambda self_id: len(assignment[self_id]))
+            assignment[chosen].append(group_id)
+        return {self_id: groups for self_id, groups in assignment.items() if groups}
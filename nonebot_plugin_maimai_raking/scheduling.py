@@ -0,0 +1,105 @@
+"""调度模块 - 每日成绩刷新的分片调度与自适应刷新策略"""
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def offset_time(hour: int, minute: int, delta_minutes: int) -> Tuple[int, int]:
+    """计算某个时刻向后偏移若干分钟后的 (小时, 分钟)，跨天时回绕"""
+    total = (hour * 60 + minute + delta_minutes) % (24 * 60)
+    return total // 60, total % 60
+
+
+class AdaptiveRefreshPolicy:
+    """自适应刷新策略
+
+    成绩连续若干次刷新都没有变化的玩家视为不活跃，
+    刷新间隔按 2, 4, 8... 天指数增长，直到上限；
+    成绩一旦变化（或玩家手动刷新）即恢复每日刷新。
+    """
+
+    def __init__(self, grace: int = 3, max_interval_days: int = 16):
+        """初始化刷新策略
+
+        Args:
+            grace: 连续多少次无变化后开始退避
+            max_interval_days: 刷新间隔上限（天）
+        """
+        self.grace = max(0, grace)
+        self.max_interval_days = max(1, max_interval_days)
+
+    def interval_days(self, unchanged_streak: int) -> int:
+        """根据连续无变化次数计算刷新间隔（天）"""
+        if unchanged_streak < self.grace:
+            return 1
+        return min(2 ** (unchanged_streak - self.grace + 1), self.max_interval_days)
+
+    def is_due(self, state: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> bool:
+        """判断玩家当前是否需要刷新
+
+        Args:
+            state: Database.get_refresh_state 返回的刷新状态，None 表示从未记录
+            now: 当前时间，默认为 datetime.now()
+        """
+        if not state:
+            return True
+        now = now or datetime.now()
+        try:
+            last_checked = datetime.fromisoformat(state["last_checked_at"])
+        except (KeyError, TypeError, ValueError):
+            return True
+        interval = self.interval_days(int(state.get("unchanged_streak") or 0))
+        # 按自然日比较，避免刷新时间在窗口内浮动导致多等一天
+        return now.date() >= (last_checked + timedelta(days=interval)).date()
+
+
+class ShardedRefresher:
+    """分片刷新计划
+
+    按 crc32(qq) 把用户稳定地分到若干时间片中，每个时间片依次开始，
+    同一时间片内的用户再均匀错开，使上游请求在整个窗口内保持平稳。
+    """
+
+    def __init__(self, window_minutes: int = 120, slices: int = 24):
+        """初始化分片刷新计划
+
+        Args:
+            window_minutes: 刷新窗口长度（分钟）
+            slices: 时间片数量
+        """
+        self.window_seconds = max(1, window_minutes) * 60
+        self.slices = max(1, slices)
+        self.slice_seconds = self.window_seconds / self.slices
+
+    def slice_of(self, qq: str) -> int:
+        """获取用户所在的时间片（跨进程、跨重启稳定）"""
+        return zlib.crc32(str(qq).encode("utf-8")) % self.slices
+
+    def build_slices(self, users: List[str]) -> List[List[str]]:
+        """把用户分配到各个时间片"""
+        buckets: List[List[str]] = [[] for _ in range(self.slices)]
+        for qq in users:
+            buckets[self.slice_of(qq)].append(qq)
+        return buckets
+
+    def plan(self, users: List[str], start: Optional[datetime] = None) -> List[Tuple[str, datetime]]:
+        """计算每个用户在窗口内的刷新时间
+
+        Args:
+            users: 待刷新的用户列表
+            start: 窗口开始时间，默认为当前时间
+
+        Returns:
+            (qq, 刷新时间) 列表，按时间排序
+        """
+        start = start or datetime.now()
+        schedule: List[Tuple[str, datetime]] = []
+        for index, bucket in enumerate(self.build_slices(users)):
+            if not bucket:
+                continue
+            slice_start = index * self.slice_seconds
+            # 时间片内的用户均匀错开
+            spacing = self.slice_seconds / len(bucket)
+            for position, qq in enumerate(bucket):
+                schedule.append((qq, start + timedelta(seconds=slice_start + position * spacing)))
+        return schedule
@@ -0,0 +1,7 @@
+"""测试配置 - 导入插件前初始化 NoneBot"""
+import nonebot
+
+
+def pytest_configure(config):
+    # 插件在导入时读取配置并注册命令，需要先初始化 NoneBot（不需要真正的驱动器）
+    nonebot.init(driver="~none")
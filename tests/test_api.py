@@ -0,0 +1,51 @@
+"""API 请求合并测试"""
+import asyncio
+
+import pytest
+
+from nonebot_plugin_maimai_raking.api import MaimaiAPI
+
+
+def test_single_flight_survives_leader_cancel():
+    api = MaimaiAPI("token")
+    inflight = {}
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "data"
+
+    async def main():
+        leader = asyncio.ensure_future(api._single_flight(inflight, "key", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(api._single_flight(inflight, "key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == "data"
+    assert calls == [1]
+    assert inflight == {}
+
+
+def test_single_flight_shares_errors():
+    api = MaimaiAPI("token")
+    inflight = {}
+
+    async def fetch():
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            api._single_flight(inflight, "key", fetch),
+            api._single_flight(inflight, "key", fetch),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert inflight == {}
@@ -0,0 +1,64 @@
+"""数据库排行榜维护测试"""
+import sqlite3
+
+from nonebot_plugin_maimai_raking.database import Database
+
+
+def _records(rating, achievements):
+    return {
+        "rating": rating,
+        "records": [
+            {
+                "song_id": 100,
+                "level_index": 3,
+                "achievements": achievements,
+                "fc": "",
+                "fs": "",
+                "rate": "sss",
+                "level_label": "Master",
+            }
+        ],
+    }
+
+
+def test_rebuild_keeps_undecodable_users(tmp_path):
+    db = Database(tmp_path)
+    for qq, achievements in (("1", 100.5), ("2", 99.0)):
+        db.add_user_to_group(qq, "g")
+        db.update_user_records(qq, _records(15000, achievements))
+
+    conn = sqlite3.connect(tmp_path / "maimai_raking.db")
+    conn.execute("UPDATE records SET data = ? WHERE qq = '2'", ("not json",))
+    conn.commit()
+    conn.close()
+
+    result = db.rebuild_leaderboards()
+    assert result["users"] == 1
+    assert result["skipped"] == 1
+    assert result["mismatched"] == 0
+    assert [row["qq"] for row in db.get_group_leaderboard("g", 100, 3)] == ["1", "2"]
+
+
+def test_upsert_trims_changed_charts(tmp_path):
+    db = Database(tmp_path, leaderboard_size=2)
+    for qq, achievements in (("1", 99.0), ("2", 98.0), ("3", 97.0)):
+        db.add_user_to_group(qq, "g")
+        db.update_user_records(qq, _records(15000, achievements))
+    assert [row["qq"] for row in db.get_group_leaderboard("g", 100, 3)] == ["1", "2"]
+
+    db.update_user_records("3", _records(15100, 100.5))
+    assert [row["qq"] for row in db.get_group_leaderboard("g", 100, 3)] == ["3", "1"]
+
+
+def test_disabled_group_leaves_global_leaderboards(tmp_path):
+    db = Database(tmp_path)
+    for qq, group_id, achievements in (("1", "g1", 100.5), ("2", "g2", 99.0)):
+        db.enable_group(group_id)
+        db.add_user_to_group(qq, group_id)
+        db.update_user_records(qq, _records(15000, achievements))
+    assert [row["qq"] for row in db.get_global_rating_leaderboard()] == ["1", "2"]
+    assert [row["qq"] for row in db.get_global_chart_leaderboard(100, 3)] == ["1", "2"]
+
+    db.disable_group("g1")
+    assert [row["qq"] for row in db.get_global_rating_leaderboard()] == ["2"]
+    assert [row["qq"] for row in db.get_global_chart_leaderboard(100, 3)] == ["2"]
@@ -0,0 +1,88 @@
+"""HTTP 客户端熔断器测试"""
+import asyncio
+
+import httpx
+
+from nonebot_plugin_maimai_raking.http_client import CircuitBreaker, ResilientClient
+
+URL = "https://example.com/api"
+
+
+def _make_client(handler) -> ResilientClient:
+    """熔断阈值为 1、冷却时间为 0 的客户端：一次失败即熔断，下一次请求就是 half_open 试探"""
+    client = ResilientClient(max_retries=0, breaker_threshold=1, breaker_cooldown=0)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+async def _open_breaker(client: ResilientClient, responses: list):
+    responses.append(httpx.Response(503))
+    await client.get(URL)
+    assert client._get_breaker(URL).state == CircuitBreaker.OPEN
+
+
+def test_cancelled_trial_releases_half_open_slot():
+    responses = []
+
+    async def scenario():
+        trial_started = asyncio.Event()
+
+        async def handler(request):
+            response = responses.pop(0)
+            if response is None:
+                # 试探请求一直挂起，直到被取消
+                trial_started.set()
+                await asyncio.sleep(3600)
+            return response
+
+        client = _make_client(handler)
+        await _open_breaker(client, responses)
+
+        responses.append(None)
+        trial = asyncio.ensure_future(client.get(URL))
+        await trial_started.wait()
+        trial.cancel()
+        try:
+            await trial
+        except asyncio.CancelledError:
+            pass
+
+        breaker = client._get_breaker(URL)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        responses.append(httpx.Response(200))
+        response = await client.get(URL)
+        assert response.status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_non_transport_error_releases_half_open_slot():
+    responses = []
+
+    async def scenario():
+        async def handler(request):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        client = _make_client(handler)
+        await _open_breaker(client, responses)
+
+        responses.append(httpx.TooManyRedirects("too many redirects"))
+        try:
+            await client.get(URL)
+        except httpx.TooManyRedirects:
+            pass
+        else:
+            raise AssertionError("TooManyRedirects 应当继续抛出")
+
+        responses.append(httpx.Response(200))
+        response = await client.get(URL)
+        assert response.status_code == 200
+        assert client._get_breaker(URL).state == CircuitBreaker.CLOSED
+        await client.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+"""插件导入耗时测试 - 导入时不应加载 PIL、打开数据库或创建 HTTP 客户端"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PACKAGE = "nonebot_plugin_maimai_raking"
+# 插件包自身（含 numpy、httpx 等依赖）的累计导入耗时上限（微秒）
+IMPORT_BUDGET_US = 1_500_000
+
+# 在子进程中记录导入期间的 sqlite3.connect 和 httpx.AsyncClient 创建
+_SCRIPT = f"""
+import json, sqlite3, sys
+import httpx
+import nonebot
+
+calls = []
+_connect = sqlite3.connect
+def connect(*args, **kwargs):
+    calls.append("sqlite3.connect")
+    return _connect(*args, **kwargs)
+sqlite3.connect = connect
+
+_client_init = httpx.AsyncClient.__init__
+def client_init(self, *args, **kwargs):
+    calls.append("httpx.AsyncClient")
+    _client_init(self, *args, **kwargs)
+httpx.AsyncClient.__init__ = client_init
+
+nonebot.init(driver="~none")
+import {PACKAGE}
+print(json.dumps({{"calls": calls, "pil": "PIL" in sys.modules}}))
+"""
+
+
+def _parse_importtime(stderr: str) -> dict:
+    """解析 -X importtime 输出：模块名 -> 累计耗时（微秒）"""
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        result[parts[2].strip()] = int(parts[1])
+    return result
+
+
+def test_import_is_lazy_and_within_budget(tmp_path: Path):
+    root = Path(__file__).resolve().parents[1]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(root), env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert report["calls"] == [], f"导入插件时执行了 {report['calls']}"
+    assert not report["pil"], "导入插件时加载了 PIL"
+
+    timings = _parse_importtime(proc.stderr)
+    assert not [name for name in timings if name == "PIL" or name.startswith("PIL.")]
+    assert PACKAGE in timings
+    assert timings[PACKAGE] <= IMPORT_BUDGET_US, f"导入耗时 {timings[PACKAGE] / 1000:.0f} ms"
+
+    # 导入时不应在工作目录中创建数据目录
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,76 @@
+"""刷新队列等待方测试"""
+import asyncio
+
+from nonebot_plugin_maimai_raking.database import Database
+from nonebot_plugin_maimai_raking.refresh_queue import PRIORITY_GROUP, RefreshQueue
+
+
+def _run_with_queue(tmp_path, handler, scenario, **kwargs):
+    db = Database(tmp_path)
+
+    async def main():
+        queue = RefreshQueue(db, handler, poll_interval=0.05, **kwargs)
+        queue.start()
+        try:
+            return await scenario(db, queue)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(main())
+
+
+def test_results_are_delivered(tmp_path):
+    async def handler(qq, reason):
+        return qq != "2"
+
+    async def scenario(db, queue):
+        return await queue.submit_many(["1", "2"], "group", PRIORITY_GROUP)
+
+    assert _run_with_queue(tmp_path, handler, scenario) == [True, False]
+
+
+def test_enqueue_failure_fails_waiters(tmp_path):
+    async def handler(qq, reason):
+        return True
+
+    async def scenario(db, queue):
+        db.enqueue_refresh_jobs = lambda jobs: 0
+        results = await queue.submit_many(["1", "2"], "group", PRIORITY_GROUP)
+        return results, queue._waiters
+
+    assert _run_with_queue(tmp_path, handler, scenario) == ([False, False], {})
+
+
+def test_removed_job_releases_waiter(tmp_path):
+    blocker = {}
+
+    async def handler(qq, reason):
+        await blocker["event"].wait()
+        return True
+
+    async def scenario(db, queue):
+        blocker["event"] = asyncio.Event()
+        # 唯一的 worker 领取 1 号用户后阻塞，2 号用户的任务留在队列中
+        waiting = asyncio.ensure_future(queue.submit_many(["1", "2"], "group", PRIORITY_GROUP))
+        await asyncio.sleep(0.1)
+        # 模拟 清理数据库 删除了 2 号用户的任务
+        conn = db._get_connection()
+        conn.execute("DELETE FROM refresh_jobs WHERE qq = '2'")
+        conn.commit()
+        conn.close()
+        assert queue.release_orphaned_waiters() == 1
+        blocker["event"].set()
+        return await waiting
+
+    assert _run_with_queue(tmp_path, handler, scenario, workers=1) == [True, None]
+
+
+def test_wait_timeout_returns_none(tmp_path):
+    async def handler(qq, reason):
+        await asyncio.sleep(3600)
+
+    async def scenario(db, queue):
+        results = await queue.submit_many(["1"], "group", PRIORITY_GROUP)
+        return results, queue._waiters
+
+    assert _run_with_queue(tmp_path, handler, scenario, workers=1, wait_timeout=0.2) == ([None], {})